@@ -1,3 +1,3 @@
-from agents.agents_pool import DEFAULT_AGENT, get_agent, get_all_agent_info
+from agents.agents_pool import DEFAULT_AGENT, get_agent, get_agent_model, get_all_agent_info
 
-__all__ = ["get_agent", "get_all_agent_info", "DEFAULT_AGENT"]
+__all__ = ["get_agent", "get_agent_model", "get_all_agent_info", "DEFAULT_AGENT"]
@@ -2,11 +2,14 @@ from dataclasses import dataclass
 
 from langgraph.pregel import Pregel
 
+from core import settings
+
 from agents.chatbot import agent as chatbot
 from agents.workflow_planner_chatbot import workflow_planner_chatbot_agent
 from agents.workflow_explain_chatbot import workflow_explain_chatbot_agent
-from agents.workflow_config_generator_agent import workflow_config_generator_agent
+from agents.workflow_config_generator_agent import GENERATOR_MODEL, workflow_config_generator_agent
 from schema import AgentInfo
+from schema.models import AllModelEnum
 
 DEFAULT_AGENT = "simple_chatbot"
 
@@ -15,6 +18,8 @@ DEFAULT_AGENT = "simple_chatbot"
 class Agent:
     description: str
     graph: Pregel
+    # Model the agent calls, None for settings.DEFAULT_MODEL
+    model: AllModelEnum | None = None
 
 
 agents: dict[str, Agent] = {
@@ -29,7 +34,8 @@ agents: dict[str, Agent] = {
     ),
     "workflow_config_generator": Agent(
         description="An intelligent n8n workflow configuration generator that combines workflow plans with existing templates to create complete, working n8n workflow JSON configurations for banking/fintech applications.",
-        graph=workflow_config_generator_agent
+        graph=workflow_config_generator_agent,
+        model=GENERATOR_MODEL,
     ),
 }
 
@@ -38,6 +44,10 @@ def get_agent(agent_id: str) -> Pregel:
     return agents[agent_id].graph
 
 
+def get_agent_model(agent_id: str) -> AllModelEnum:
+    return agents[agent_id].model or settings.DEFAULT_MODEL
+
+
 def get_all_agent_info() -> list[AgentInfo]:
     return [
         AgentInfo(key=agent_id, description=agent.description) for agent_id, agent in agents.items()
@@ -0,0 +1,291 @@
+import json
+import logging
+import re
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+JSON_FENCE = "```json"
+FENCE = "```"
+
+
+class _Container:
+    __slots__ = ("kind", "start", "key", "expect_key", "key_start")
+
+    def __init__(self, kind: str, start: int):
+        self.kind = kind  # "{" or "["
+        self.start = start
+        self.key: str | None = None
+        self.expect_key = kind == "{"
+        self.key_start = -1
+
+
+class IncrementalWorkflowParser:
+    """Follow the ```json block of a streamed LLM response and emit n8n elements as they close.
+
+    Feed it text chunks as they arrive; `feed` returns the events completed by
+    that chunk:
+
+    - `("node", index, node)` when an element of the top-level `nodes` array closes
+    - `("connection", source, outputs)` when an entry of the top-level `connections` object closes
+
+    The scanner is a single pass over the characters of the fenced block, aware
+    of strings and escapes, so the total cost is linear in the response size.
+    """
+
+    def __init__(self):
+        self._pending = ""  # text seen before the opening fence
+        self._text = ""
+        self._pos = 0
+        self._stack: List[_Container] = []
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self.done = False
+        self.nodes_emitted = 0
+
+    def feed(self, chunk: str) -> List[Tuple[Any, ...]]:
+        if self.done or not chunk:
+            return []
+        if not self._started:
+            self._pending += chunk
+            fence = self._pending.find(JSON_FENCE)
+            if fence < 0:
+                # Keep only what could be the beginning of a split fence
+                self._pending = self._pending[-len(JSON_FENCE):]
+                return []
+            self._started = True
+            chunk = self._pending[fence + len(JSON_FENCE):]
+            self._pending = ""
+        self._text += chunk
+        return self._scan()
+
+    def _scan(self) -> List[Tuple[Any, ...]]:
+        events: List[Tuple[Any, ...]] = []
+        text, stack = self._text, self._stack
+        pos, end = self._pos, len(text)
+        while pos < end:
+            char = text[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    top = stack[-1] if stack else None
+                    if top is not None and top.expect_key and top.key_start >= 0:
+                        top.key = json.loads(text[top.key_start:pos + 1])
+                        top.key_start = -1
+                        top.expect_key = False
+                pos += 1
+                continue
+
+            if char == '"':
+                self._in_string = True
+                top = stack[-1] if stack else None
+                if top is not None and top.expect_key:
+                    top.key_start = pos
+            elif char in "{[":
+                stack.append(_Container(char, pos))
+            elif char in "}]":
+                if not stack:
+                    self.done = True
+                    break
+                closed = stack.pop()
+                events.extend(self._on_close(closed, text[closed.start:pos + 1]))
+                if not stack:
+                    self.done = True
+                    pos += 1
+                    break
+            elif char == ",":
+                if stack and stack[-1].kind == "{":
+                    stack[-1].expect_key = True
+            elif char == "`" and not stack and text.startswith(FENCE, pos):
+                self.done = True
+                break
+            pos += 1
+        self._pos = pos
+        self._trim()
+        return events
+
+    def _trim(self) -> None:
+        """Drop scanned text that no open element or key still needs, so feeding stays linear."""
+        keep = self._pos
+        for depth, container in enumerate(self._stack):
+            if depth >= 2:
+                keep = min(keep, container.start)
+            if container.key_start >= 0:
+                keep = min(keep, container.key_start)
+        if keep <= 0:
+            return
+        self._text = self._text[keep:]
+        self._pos -= keep
+        for container in self._stack:
+            container.start -= keep
+            if container.key_start >= 0:
+                container.key_start -= keep
+
+    def _on_close(self, closed: _Container, raw: str) -> List[Tuple[Any, ...]]:
+        depth = len(self._stack)
+        # depth 2 = inside the top-level object and one of its values
+        if depth != 2 or self._stack[0].kind != "{":
+            return []
+        parent = self._stack[1]
+        top_key = self._stack[0].key
+        try:
+            if top_key == "nodes" and parent.kind == "[" and closed.kind == "{":
+                node = json.loads(raw)
+                self.nodes_emitted += 1
+                return [("node", self.nodes_emitted - 1, node)]
+            if top_key == "connections" and parent.kind == "{" and closed.kind == "{" and parent.key:
+                return [("connection", parent.key, json.loads(raw))]
+        except json.JSONDecodeError as e:
+            logger.debug(f"Skipping malformed streamed element: {e}")
+        return []
+
+
+_OPEN_BRACKET = re.compile(r"[{\[]")
+_STRUCTURAL = re.compile(r'["{}\[\]`]')
+_STRING_END = re.compile(r'["\\]')
+
+# First non-blank character allowed after an opening bracket
+_OBJECT_START = frozenset('"}')
+_ARRAY_START = frozenset('"{[]-0123456789')
+# Literals an array may start with, matched in full so prose like `[note: ...]` is skipped
+_ARRAY_LITERAL = re.compile(r"(?:true|false|null)\s*[,\]]")
+
+
+def _looks_like_json_start(text: str, pos: int) -> bool:
+    """Whether the bracket at `pos` opens JSON rather than prose like `[Step Title]`."""
+    allowed = _OBJECT_START if text[pos] == "{" else _ARRAY_START
+    end = len(text)
+    pos += 1
+    while pos < end and text[pos] in " \t\r\n":
+        pos += 1
+    if pos < end and text[pos] in allowed:
+        return True
+    return allowed is _ARRAY_START and _ARRAY_LITERAL.match(text, pos) is not None
+
+
+def find_json_candidates(text: str) -> List[Any]:
+    """Return every balanced top-level JSON object/array of `text` that parses, in order.
+
+    Single pass, aware of strings and escapes; regex searches jump straight to the
+    next structural character so the scan runs at C speed. Brackets of the
+    surrounding prose are skipped, and a markdown fence always ends the current
+    candidate, so an unbalanced brace cannot swallow the rest of the response.
+    """
+    candidates: List[Any] = []
+    depth = 0
+    start = pos = 0
+    end = len(text)
+    while pos < end:
+        if depth == 0:
+            match = _OPEN_BRACKET.search(text, pos)
+            if not match:
+                break
+            pos = match.start()
+            if _looks_like_json_start(text, pos):
+                depth, start = 1, pos
+            pos += 1
+            continue
+
+        match = _STRUCTURAL.search(text, pos)
+        if not match:
+            break
+        pos = match.start()
+        char = text[pos]
+        if char == '"':
+            pos += 1
+            while True:
+                match = _STRING_END.search(text, pos)
+                if not match:
+                    pos = end
+                    break
+                pos = match.end() + (1 if match.group() == "\\" else 0)
+                if match.group() == '"':
+                    break
+            continue
+        if char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                try:
+                    candidates.append(json.loads(text[start:pos + 1]))
+                except json.JSONDecodeError as e:
+                    logger.debug(f"Skipping unparsable JSON candidate: {e}")
+        elif text.startswith(FENCE, pos):
+            depth = 0
+        pos += 1
+    return candidates
+
+
+def n8n_score(value: Any) -> int:
+    """How much a parsed JSON value looks like an n8n workflow (0 = not at all)."""
+    if not isinstance(value, dict):
+        return 0
+    score = 0
+    nodes = value.get("nodes")
+    if isinstance(nodes, list):
+        score += 4
+        if nodes and all(isinstance(n, dict) and "type" in n for n in nodes):
+            score += 2
+    if isinstance(value.get("connections"), dict):
+        score += 4
+    if "name" in value:
+        score += 1
+    return score
+
+
+def rank_json_candidates(text: str) -> List[Tuple[int, Any]]:
+    """JSON candidates of `text` ranked by `n8n_score`, best first (ties keep the later one first)."""
+    candidates = [(n8n_score(value), i, value) for i, value in enumerate(find_json_candidates(text))]
+    candidates.sort(key=lambda c: (c[0], c[1]), reverse=True)
+    return [(score, value) for score, _, value in candidates]
+
+
+def benchmark_json_extraction(target_kb: int = 120, repeat: int = 5) -> Dict[str, Any]:
+    """Compare the single-pass extractor with the previous regex cascade on a large response."""
+    import time
+
+    workflow = json.load(open(
+        "example_workflow/AI_Automated_HR_Workflow_for_CV_Analysis_and_Candidate_Evaluation.json", "r"
+    ))
+    nodes = workflow["nodes"]
+    while len(json.dumps(workflow)) < target_kb * 1024:
+        workflow["nodes"] = workflow["nodes"] + [dict(n, name=f"{n['name']} {len(workflow['nodes'])}") for n in nodes]
+    # Unfenced on purpose, this is the case the regex cascade falls back on
+    response = (
+        "Here is the workflow {for your plan}. It uses [Step 1] to [Step 7].\n\n"
+        + json.dumps(workflow, indent=2)
+        + "\n\nEach node is explained below."
+    )
+
+    def regex_extract(text: str) -> Dict[str, Any]:
+        for pattern in (r"```json\s*(.*?)\s*```", r"```\s*(.*?)\s*```", r"\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}"):
+            for match in re.finditer(pattern, text, re.DOTALL):
+                try:
+                    parsed = json.loads(match.group(1) if "```" in pattern else match.group(0))
+                    if isinstance(parsed, dict) and ("nodes" in parsed or "name" in parsed):
+                        return parsed
+                except json.JSONDecodeError:
+                    continue
+        return {}
+
+    results: Dict[str, Any] = {"response_kb": round(len(response) / 1024, 1)}
+    for label, extract in (
+        ("regex_cascade", regex_extract),
+        ("single_pass", lambda text: next((v for s, v in rank_json_candidates(text) if s), {})),
+    ):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            extracted = extract(response)
+        results[f"{label}_ms"] = round((time.perf_counter() - start) * 1000 / repeat, 2)
+        results[f"{label}_nodes"] = len(extracted.get("nodes", []))
+    return results
+
+
+if __name__ == "__main__":
+    print(benchmark_json_extraction())
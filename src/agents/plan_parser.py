@@ -0,0 +1,253 @@
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_WORKFLOW_NAME = re.compile(r"###\s*Workflow Plan:\s*(.+)")
+_SECTION = re.compile(r"\*\*(Description|Steps|Flow Connections|Additional Requirements):\*\*\s*(.*)")
+_STEP_HEADER = re.compile(r"^[\s#*]*Step (\d+):\s*(.*)")
+_STEP_FIELD = re.compile(r"^\s*-\s*(Description|Node Type|Details):\s*(.*)")
+_CONNECTION = re.compile(r"^\s*-\s*Step\s*(\d+)\s*→\s*Step\s*(\d+):\s*(.*)")
+_BULLET = re.compile(r"^\s*-\s*(.*)")
+
+_STEP_FIELDS = {"Description": "description", "Node Type": "node_type", "Details": "details"}
+
+
+def _empty_plan(plan: str = "") -> Dict[str, Any]:
+    return {
+        "plan": plan,
+        "workflow_name": "",
+        "description": "",
+        "steps": [],
+        "flow_connections": [],
+        "additional_requirements": [],
+        "steps_count": 0,
+    }
+
+
+class IncrementalPlanParser:
+    """Line-oriented state machine over a streamed workflow plan.
+
+    Feed it text chunks as they arrive; `feed` returns the steps whose block was
+    closed by that chunk (by the next `Step N:` line or the next section), so
+    they can be shown before the planner finishes. `finish` flushes the last
+    open element and returns the same structure as `regex_parse_workflow_plan`.
+
+    Every line is matched once against anchored patterns, so the total cost is
+    linear in the response size. Sections end at the next `**Section:**`
+    marker, markdown heading or code fence, so trailing content such as an n8n
+    JSON block never leaks into the last requirement.
+    """
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        self._partial = ""
+        self._section: Optional[str] = None
+        self._description: List[str] = []
+        self._step: Optional[Dict[str, Any]] = None
+        self._field: Optional[str] = None
+        self._item: Optional[List[str]] = None  # open connection/requirement lines
+        self._connection: Optional[Dict[str, Any]] = None
+        self._in_fence = False
+        self.result = _empty_plan()
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        if not chunk:
+            return []
+        self._chunks.append(chunk)
+        if "\n" not in chunk:
+            self._partial += chunk
+            return []
+        lines = (self._partial + chunk).split("\n")
+        self._partial = lines.pop()
+        closed: List[Dict[str, Any]] = []
+        for line in lines:
+            self._line(line, closed)
+        return closed
+
+    def finish(self) -> Dict[str, Any]:
+        """Flush the pending line and open elements, and return the parsed plan."""
+        closed: List[Dict[str, Any]] = []
+        if self._partial:
+            self._line(self._partial, closed)
+            self._partial = ""
+        self._close_section(closed)
+        self.result["plan"] = "".join(self._chunks)
+        self.result["steps_count"] = len(self.result["steps"])
+        return self.result
+
+    def _line(self, line: str, closed: List[Dict[str, Any]]) -> None:
+        stripped = line.strip()
+        if self._in_fence:
+            # Code blocks (e.g. the n8n JSON) carry nothing of the plan
+            self._in_fence = not stripped.startswith("```")
+            return
+        if self._section == "Steps" and _STEP_HEADER.match(line):
+            self._step_line(line, closed)
+            return
+        if stripped.startswith("#") or stripped.startswith("```"):
+            self._close_section(closed)
+            self._in_fence = stripped.startswith("```")
+            if not self.result["workflow_name"]:
+                match = _WORKFLOW_NAME.match(stripped)
+                if match:
+                    self.result["workflow_name"] = match.group(1).strip()
+            return
+
+        section = _SECTION.search(line)
+        if section:
+            self._close_section(closed)
+            self._section = section.group(1)
+            rest = section.group(2)
+            if self._section == "Description":
+                self._description_line(rest)
+            elif rest:
+                self._line(rest, closed)
+            return
+
+        if self._section == "Description":
+            self._description_line(line)
+        elif self._section == "Steps":
+            self._step_line(line, closed)
+        elif self._section == "Flow Connections":
+            self._connection_line(line)
+        elif self._section == "Additional Requirements":
+            self._requirement_line(line)
+
+    def _description_line(self, line: str) -> None:
+        # The description ends at a blank line or the next bold marker
+        if self.result["description"]:
+            return
+        text, bold, _ = line.partition("**")
+        if text.strip():
+            self._description.append(text)
+        if bold or (not line.strip() and self._description):
+            self._flush_description()
+
+    def _flush_description(self) -> None:
+        if self._description and not self.result["description"]:
+            self.result["description"] = "\n".join(self._description).strip()
+        self._description = []
+
+    def _step_line(self, line: str, closed: List[Dict[str, Any]]) -> None:
+        header = _STEP_HEADER.match(line)
+        if header:
+            self._close_step(closed)
+            self._step = {
+                "step_number": int(header.group(1)),
+                "title": header.group(2).strip().rstrip("*").strip(),
+                "description": [],
+                "node_type": [],
+                "details": [],
+            }
+            self._field = None
+            return
+        if self._step is None:
+            return
+        field = _STEP_FIELD.match(line)
+        if field:
+            self._field = _STEP_FIELDS[field.group(1)]
+            self._step[self._field] = [field.group(2)]
+        elif self._field:
+            self._step[self._field].append(line)
+
+    def _close_step(self, closed: List[Dict[str, Any]]) -> None:
+        if self._step is None:
+            return
+        step = {
+            key: "\n".join(value).strip() if isinstance(value, list) else value
+            for key, value in self._step.items()
+        }
+        self.result["steps"].append(step)
+        closed.append(step)
+        self._step = None
+        self._field = None
+
+    def _connection_line(self, line: str) -> None:
+        match = _CONNECTION.match(line)
+        if match:
+            self._close_item()
+            self._connection = {"from_step": int(match.group(1)), "to_step": int(match.group(2))}
+            self._item = [match.group(3)]
+        elif _BULLET.match(line):
+            self._close_item()
+        elif self._item is not None:
+            self._item.append(line)
+
+    def _requirement_line(self, line: str) -> None:
+        match = _BULLET.match(line)
+        if match:
+            self._close_item()
+            self._item = [match.group(1)]
+        elif self._item is not None:
+            self._item.append(line)
+
+    def _close_item(self) -> None:
+        if self._item is None:
+            return
+        text = "\n".join(self._item).strip()
+        if self._connection is not None:
+            self.result["flow_connections"].append({**self._connection, "description": text})
+        elif text:
+            self.result["additional_requirements"].append(text)
+        self._item = None
+        self._connection = None
+
+    def _close_section(self, closed: List[Dict[str, Any]]) -> None:
+        self._flush_description()
+        self._close_step(closed)
+        self._close_item()
+        self._section = None
+
+
+def parse_workflow_plan(plan: str) -> Dict[str, Any]:
+    """Parse a complete plan in one go with `IncrementalPlanParser`."""
+    parser = IncrementalPlanParser()
+    parser.feed(plan)
+    return parser.finish()
+
+
+def benchmark_plan_parsing(repeat: int = 200, chunk_size: int = 16) -> Dict[str, Any]:
+    """Compare the incremental parser with `regex_parse_workflow_plan` on example_workflow/plan.json."""
+    import json
+    import time
+
+    from agents.workflow_planner_chatbot import regex_parse_workflow_plan
+
+    plan = json.load(open("example_workflow/plan.json", "r"))["plan"]
+    chunks = [plan[i:i + chunk_size] for i in range(0, len(plan), chunk_size)]
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        expected = regex_parse_workflow_plan(plan)
+    regex_ms = (time.perf_counter() - start) * 1000 / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parser = IncrementalPlanParser()
+        first_step_chunk = None
+        for i, chunk in enumerate(chunks):
+            if parser.feed(chunk) and first_step_chunk is None:
+                first_step_chunk = i
+        parsed = parser.finish()
+    incremental_ms = (time.perf_counter() - start) * 1000 / repeat
+
+    return {
+        "plan_chars": len(plan),
+        "regex_ms": round(regex_ms, 3),
+        "incremental_ms": round(incremental_ms, 3),
+        "same_steps": parsed["steps"] == expected["steps"],
+        "same_flow_connections": parsed["flow_connections"] == expected["flow_connections"],
+        "same_additional_requirements": parsed["additional_requirements"] == expected["additional_requirements"],
+        # How far into the stream the UI gets its first step
+        "first_step_at": round((first_step_chunk + 1) / len(chunks), 3) if first_step_chunk is not None else None,
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+    print(benchmark_plan_parsing())
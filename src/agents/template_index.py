@@ -0,0 +1,176 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import zlib
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_N_FEATURES = 2**13
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_CAMEL_CASE_PATTERN = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+# Words that carry no signal to pick a template
+_STOP_WORDS = frozenset(
+    "a an and are as at be by for from in into is it of on or so that the then this to "
+    "with via will node nodes workflow step steps n8n base langchain description type".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, with camelCase n8n identifiers split (`chainLlm` -> chain, llm)."""
+    text = _CAMEL_CASE_PATTERN.sub(" ", text or "")
+    return [t for t in _TOKEN_PATTERN.findall(text.lower()) if t not in _STOP_WORDS and len(t) > 1]
+
+
+def template_document(template: Dict[str, Any]) -> str:
+    """Text indexed for a template: its description plus the names and types of its nodes."""
+    config = template.get("config", {})
+    nodes = [n for n in config.get("nodes", []) if n.get("type") != "n8n-nodes-base.stickyNote"]
+    parts = [template.get("name", ""), template.get("description", "")]
+    parts += [node.get("name", "") for node in nodes]
+    parts += [node.get("type", "").rsplit(".", 1)[-1] for node in nodes]
+    return "\n".join(parts)
+
+
+class TemplateIndex:
+    """Hashing-vectorizer index over workflow templates with cosine scoring.
+
+    Each document is hashed into a fixed number of features (sublinear tf,
+    L2-normalized), so adding a template never changes existing rows and the
+    index can be extended incrementally and persisted as a single `.npz` file.
+    """
+
+    def __init__(self, n_features: int = DEFAULT_N_FEATURES):
+        self.n_features = n_features
+        self.names: List[str] = []
+        self.fingerprints: List[str] = []
+        self._matrix = np.zeros((0, n_features), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.names
+
+    def vectorize(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.n_features, dtype=np.float32)
+        for token in tokenize(text):
+            vector[zlib.crc32(token.encode("utf-8")) % self.n_features] += 1.0
+        np.log1p(vector, out=vector)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def add(self, name: str, text: str) -> bool:
+        """Add or refresh a document. Returns False if it is already indexed unchanged."""
+        fingerprint = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        vector = self.vectorize(text)
+        if name in self.names:
+            row = self.names.index(name)
+            if self.fingerprints[row] == fingerprint:
+                return False
+            self._matrix[row] = vector
+            self.fingerprints[row] = fingerprint
+            return True
+        self._matrix = np.vstack([self._matrix, vector[None, :]])
+        self.names.append(name)
+        self.fingerprints.append(fingerprint)
+        return True
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[str, float]]:
+        """Return the `k` best matching document names with their cosine score."""
+        if not self.names:
+            return []
+        scores = self._matrix @ self.vectorize(query)
+        k = min(k, len(self.names))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.names[i], float(scores[i])) for i in top]
+
+    def save(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            matrix=self._matrix,
+            meta=np.array(json.dumps({
+                "n_features": self.n_features,
+                "names": self.names,
+                "fingerprints": self.fingerprints,
+            })),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "TemplateIndex":
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            index = cls(n_features=meta["n_features"])
+            index._matrix = data["matrix"].astype(np.float32, copy=False)
+        index.names = meta["names"]
+        index.fingerprints = meta["fingerprints"]
+        return index
+
+
+def build_template_index(
+    templates: Dict[str, Dict[str, Any]], path: str | None = None
+) -> TemplateIndex:
+    """Load the persisted index from `path` and add any new or changed templates to it."""
+    index = None
+    if path and os.path.exists(path):
+        try:
+            index = TemplateIndex.load(path)
+        except Exception as e:
+            logger.warning(f"Could not load template index from {path}, rebuilding: {e}")
+    if index is None:
+        index = TemplateIndex()
+
+    changed = [name for name, t in templates.items() if index.add(name, template_document(t))]
+    if changed:
+        logger.info(f"Indexed {len(changed)} workflow template(s): {', '.join(changed)}")
+        if path:
+            index.save(path)
+    return index
+
+
+def benchmark_template_selection(workflow_plan: str, top_k: int = 1, repeat: int = 200) -> Dict[str, Any]:
+    """Compare the prompt size of dumping every template with top-k retrieval."""
+    from core.tokens import estimate_tokens
+    from agents.workflow_config_generator_agent import WORKFLOW_TEMPLATES, format_templates_for_prompt
+
+    index = build_template_index(WORKFLOW_TEMPLATES)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        selected = index.search(workflow_plan, k=top_k)
+    latency_ms = (time.perf_counter() - start) * 1000 / repeat
+
+    all_templates = format_templates_for_prompt(WORKFLOW_TEMPLATES)
+    top_templates = format_templates_for_prompt({name: WORKFLOW_TEMPLATES[name] for name, _ in selected})
+    all_tokens, top_tokens = estimate_tokens(all_templates), estimate_tokens(top_templates)
+    return {
+        "templates": len(WORKFLOW_TEMPLATES),
+        "selected": selected,
+        "all_templates_tokens": all_tokens,
+        "selected_templates_tokens": top_tokens,
+        "token_reduction": round(1 - top_tokens / all_tokens, 3) if all_tokens else 0.0,
+        "selection_latency_ms": round(latency_ms, 4),
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+    plan = json.load(open("example_workflow/plan.json", "r"))["plan"]
+    print(benchmark_template_selection(plan))
@@ -0,0 +1,124 @@
+import json
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+STICKY_NOTE_TYPE = "n8n-nodes-base.stickyNote"
+
+# Node fields that change how n8n runs a node, everything else (id, position,
+# webhookId, credentials...) is instance specific and useless to the LLM
+NODE_FIELDS = (
+    "name",
+    "type",
+    "typeVersion",
+    "parameters",
+    "disabled",
+    "alwaysOutputData",
+    "executeOnce",
+    "retryOnFail",
+    "onError",
+)
+
+# Sticky notes are kept as short hints only
+STICKY_NOTE_MAX_CHARS = 200
+
+# Parameter blocks shorter than this are cheaper to repeat than to reference
+DEDUPE_MIN_CHARS = 64
+
+
+def _canonical(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def _minify_connections(connections: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop empty outputs and branches while keeping the n8n connections format."""
+    minified: Dict[str, Any] = {}
+    for source, outputs in (connections or {}).items():
+        if not isinstance(outputs, dict):
+            continue
+        kept_outputs = {}
+        for connection_type, branches in outputs.items():
+            kept_branches = [
+                [{"node": t["node"], "type": t.get("type", connection_type), "index": t.get("index", 0)}
+                 for t in branch or [] if isinstance(t, dict) and t.get("node")]
+                for branch in branches or []
+            ]
+            while kept_branches and not kept_branches[-1]:
+                kept_branches.pop()
+            if kept_branches:
+                kept_outputs[connection_type] = kept_branches
+        if kept_outputs:
+            minified[source] = kept_outputs
+    return minified
+
+
+def minify_workflow(workflow: Dict[str, Any]) -> Dict[str, Any]:
+    """Canonical minimal form of an n8n workflow for use in prompts.
+
+    Keeps the workflow name, node names/types/parameters and connections. Drops
+    positions, ids, webhook ids, credentials, pinData, meta and versionId, truncates
+    sticky notes and replaces repeated parameter blocks by `parameters_ref`, the
+    name of the first node with the same parameters.
+    """
+    nodes: List[Dict[str, Any]] = []
+    seen_parameters: Dict[str, str] = {}
+    for node in workflow.get("nodes", []):
+        minified = {key: node[key] for key in NODE_FIELDS if key in node}
+        parameters = minified.get("parameters")
+        if node.get("type") == STICKY_NOTE_TYPE:
+            content = (parameters or {}).get("content", "")
+            if len(content) > STICKY_NOTE_MAX_CHARS:
+                content = content[:STICKY_NOTE_MAX_CHARS].rstrip() + "..."
+            minified["parameters"] = {"content": content}
+        elif not parameters:
+            minified.pop("parameters", None)
+        else:
+            key = _canonical(parameters)
+            if len(key) >= DEDUPE_MIN_CHARS and key in seen_parameters:
+                del minified["parameters"]
+                minified["parameters_ref"] = seen_parameters[key]
+            else:
+                seen_parameters.setdefault(key, node.get("name", ""))
+        nodes.append(minified)
+
+    return {
+        "name": workflow.get("name", ""),
+        "nodes": nodes,
+        "connections": _minify_connections(workflow.get("connections", {})),
+    }
+
+
+def serialize_template(workflow: Dict[str, Any]) -> str:
+    """Compact JSON used to embed a minified template in a prompt."""
+    return json.dumps(workflow, separators=(",", ":"), ensure_ascii=False)
+
+
+def template_token_report(templates: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Token count of each template file before and after minification."""
+    from core.tokens import estimate_tokens
+
+    report = []
+    for name, template in templates.items():
+        original = json.load(open(template["file_path"], "r"))
+        original_tokens = estimate_tokens(json.dumps(original, indent=2))
+        minified_tokens = estimate_tokens(serialize_template(minify_workflow(original)))
+        report.append({
+            "template": name,
+            "file_path": template["file_path"],
+            "original_tokens": original_tokens,
+            "minified_tokens": minified_tokens,
+            "saving": round(1 - minified_tokens / original_tokens, 3) if original_tokens else 0.0,
+        })
+    return report
+
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+    from agents.workflow_config_generator_agent import WORKFLOW_TEMPLATES
+
+    for row in template_token_report(WORKFLOW_TEMPLATES):
+        print(row)
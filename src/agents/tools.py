@@ -1,52 +1,25 @@
 import json
-import requests
-import aiohttp
 
 from langgraph.types import StreamWriter
 
 from agents.utils import send_custom_stream_data
+from agents.workflow_layout import layout_workflow
 from core.settings import logger, settings
 
 def workflow_config_positioning(workflow: dict):
     """Auto positioning of workflow configuration in n8n.
-    """
-    url = "https://api.ia2s.app/webhook/workflow/magic/position"
-
-    # Replace this with your actual workflow data
-    payload = {
-        "workflow": workflow,
-    }
-
-    headers = {
-        "Content-Type": "application/json"
-    }
 
-    logger.info("Sending request to n8n positioning endpoint...")
-    response = requests.post(url, json=payload, headers=headers)
-
-    return json.loads(response.text)
+    Positions are computed in-process by the layered layout engine in
+    `agents.workflow_layout`, no request leaves the service.
+    """
+    logger.info("Computing workflow node positions...")
+    return layout_workflow(workflow)
 
 
 async def aworkflow_config_positioning(workflow: dict):
     """Auto positioning of workflow configuration in n8n.
     """
-    url = "https://api.ia2s.app/webhook/workflow/magic/position"
-
-    # Replace this with your actual workflow data
-    payload = {
-        "workflow": workflow,
-    }
-
-    headers = {
-        "Content-Type": "application/json"
-    }
-
-    logger.info("Sending request to n8n positioning endpoint...")
-    
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=payload, headers=headers) as response:
-            text = await response.text()
-            return json.loads(text)
+    return workflow_config_positioning(workflow)
 
 # async def get_user_features(writer: StreamWriter) -> dict:
 #     """Return the release date of Langgraph."""
@@ -125,10 +98,12 @@ def test_posisioning_workflow():
     """Test the workflow configuration positioning."""
     
     import json
-    sample_workflow = json.load(open("../example_workflow/Sample_for_positioning.json", "r"))
+    sample_workflow = json.load(open("example_workflow/workflow.json", "r"))
     sample_workflow = json.loads(json.dumps(sample_workflow))  # Ensure it's a proper dict
     
-    workflow_config_positioning(sample_workflow)
+    positioned = workflow_config_positioning(sample_workflow)
+    for node in positioned["nodes"]:
+        print(node["name"], node["position"])
     
 if __name__ == "__main__":
     # Example workflow configuration
@@ -46,7 +46,7 @@ class CustomDataAI(BaseModel):
 
 
 def send_custom_stream_data_workflow_config(
-    writer: StreamWriter, data: dict[str, Any]
+    writer: StreamWriter, data: dict[str, Any], role: str = "workflow_config"
 ) -> None:
     """
     Put custom data into the stream writer.
@@ -54,10 +54,11 @@ def send_custom_stream_data_workflow_config(
     Args:
         writer (StreamWriter): The stream writer to dispatch the custom data.
         data (dict[str, Any]): The custom data to be sent.
-        type (str): The type of the custom data, default is "current_state".
+        role (str): The role of the custom data, "workflow_config" for the complete
+            config or "workflow_config_delta" for a node/connection streamed early.
     """
     custom_data = CustomDataAI(data=data)
-    custom_data.dispatch(writer, role="workflow_config")
+    custom_data.dispatch(writer, role=role)
     
 def send_custom_stream_data_workflow_plan(
     writer: StreamWriter, data: dict[str, Any]
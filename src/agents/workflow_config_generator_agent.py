@@ -1,50 +1,80 @@
 import logging
 import json
-import re
 import sys
 import os
-from typing import Dict, Any, List, Optional
+from typing import Annotated, Dict, Any, List, Optional
 from pathlib import Path
 
-from langgraph.graph import StateGraph
+from langgraph.graph import END, START, StateGraph
 from langgraph.graph.message import MessagesState
 from langchain_core.runnables import RunnableConfig
 from langchain_core.messages import AIMessage, HumanMessage, AIMessageChunk, BaseMessage
-from langgraph.types import StreamWriter
+from langgraph.types import Command, StreamWriter
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.store.memory import InMemoryStore
 
 import sys
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
-from core.llm import get_model
+from core.llm import ModelT, get_model
 from core.settings import settings
+from core.tracing import span
 from agents.utils import send_custom_stream_data_workflow_config
 from agents.workflow_information import WORKFLOW_EXAMPLE_METADATA
+from agents.template_index import build_template_index
+from agents.template_minifier import minify_workflow, serialize_template
+from agents.json_parsing import IncrementalWorkflowParser, find_json_candidates, rank_json_candidates
+from agents.workflow_layout import layout_workflow, place_new_nodes
+from agents.workflow_validator import validate_and_repair_workflow
+from agents.workflow_patch import PatchError, apply_workflow_patch, is_patch
+from agents.workflow_parallel_generation import (
+    add_fragments,
+    generate_step_fragment,
+    merge_workflow_fragments,
+    merged_config_message,
+    route_config_generation,
+)
+from agents.plan_parser import parse_workflow_plan
+from schema.models import OpenAIModelName
 
 logger = logging.getLogger(__name__)
 
 class WorkflowConfigGeneratorState(MessagesState, total=False):
     generated_config: Dict[str, Any]
+    fragments: Annotated[List[Dict[str, Any]], add_fragments]
 
 # Load workflow templates from the file system
 def load_workflow_templates() -> Dict[str, Dict[str, Any]]:
-    """Load all workflow templates from the example_workflow directory."""
+    """Load all workflow templates from the example_workflow directory.
+
+    Templates are minified once here, `prompt_config` is the compact JSON put in prompts.
+    """
     workflow_templates = {}
     for workflow in WORKFLOW_EXAMPLE_METADATA:
         name = workflow["name"]
         description = workflow["description"]
         file_path = workflow["file_path"]
+        config = minify_workflow(json.load(open(file_path, 'r')))
         workflow_templates[name] = {
             "name": name,
             "description": description,
             "file_path": file_path,
-            "config": json.load(open(file_path, 'r')),
+            "config": config,
+            "prompt_config": serialize_template(config),
         }
     return workflow_templates
 
+
+def format_templates_for_prompt(templates: Dict[str, Dict[str, Any]]) -> str:
+    """Render selected templates for the generator prompt."""
+    return "\n\n".join(
+        f"Template: {name}\nDescription: {template['description'].strip()}\nConfig: {template['prompt_config']}"
+        for name, template in templates.items()
+    )
+
 # Global template cache
 WORKFLOW_TEMPLATES = load_workflow_templates()
+TEMPLATE_INDEX = build_template_index(WORKFLOW_TEMPLATES, path=settings.TEMPLATE_INDEX_PATH)
 
 WORKFLOW_CONFIG_GENERATOR_PROMPT = '''
 You are an expert n8n workflow configuration generator specializing in banking and financial technology solutions. You will receive a workflow plan and a set of relevant templates, and your task is to create complete, functional n8n workflow configurations with PROPER NODE CONNECTIONS. 
@@ -59,18 +89,12 @@ Your expertise includes:
 Current Context:
 Workflow Plan from Message: {workflow_plan}
 
-Workflow Templates Selected: 
+Workflow Templates Selected (minified: positions, ids and credentials removed; `parameters_ref` means the node uses the same parameters as the named node): 
 {selected_templates}
 
 Current Configuration Context:
 {current_config_context}
 
-🚨🚨🚨 **ABSOLUTE CRITICAL REQUIREMENT - THIS IS MANDATORY** 🚨🚨🚨
-‼️ EVERY SINGLE AI/LangChain Agent node MUST be connected to an LLM Chat Model node via `ai_languageModel` connection ‼️
-🔥 NO EXCEPTIONS! The workflow will COMPLETELY FAIL without these connections! 🔥
-⛔ DO NOT generate any AI/LangChain nodes without corresponding LLM model connections ⛔
-🛑 This is the #1 cause of broken workflows - ALWAYS verify LLM connections 🛑
-
 Your task is to generate a complete n8n workflow configuration JSON that:
 
 1. **Follows the workflow plan structure** - Implement all steps and logic from the plan
@@ -78,18 +102,9 @@ Your task is to generate a complete n8n workflow configuration JSON that:
 3. **Maintains n8n best practices** - Proper node configuration, connections, and data flow
 4. **Includes banking/fintech specifics** - Security, compliance, error handling
 5. **Generates working configuration** - Valid JSON that can be imported into n8n
-6. **🔥 ENSURES ALL AI NODES HAVE LLM CONNECTIONS** - This is MANDATORY for workflow functionality
-
-**🚨 MANDATORY AI/LANGCHAIN CONNECTION RULES (NO EXCEPTIONS):**
+6. **Connects every AI node to an LLM** - via an `ai_languageModel` connection
 
-**🔴 CRITICAL ERROR TO AVOID: AI Nodes Without LLM Connections 🔴**
-The most common workflow generation error is creating AI/LangChain nodes (like informationExtractor, chainLlm) without connecting them to LLM Chat Model nodes. This causes the workflow to completely fail during execution.
-
-**✅ REQUIRED PATTERN FOR EVERY AI NODE:**
-1. Create an LLM Chat Model node (e.g., Google Gemini Chat Model)
-2. Create your AI/LangChain node (e.g., CV Information Extractor)  
-3. Connect the LLM model TO the AI node using `ai_languageModel` connection type
-4. Verify the connection exists in the `connections` section
+**AI/LangChain connection rules:**
 
 **Rule 1: Every AI Agent/Chain Node REQUIRES an LLM Model Connection**
 - **Agent/Chain Nodes that REQUIRE LLM connections:**
@@ -203,28 +218,6 @@ The most common workflow generation error is creating AI/LangChain nodes (like i
 }}
 ```
 
-**❌ WHAT WILL BREAK THE WORKFLOW:**
-- Missing `ai_languageModel` connections from LLM models to AI agents
-- AI agents without any LLM model connected
-- Wrong connection types (using "main" instead of "ai_languageModel")
-- Missing LLM Chat Model nodes entirely
-
-**✅ MANDATORY VALIDATION CHECKLIST - CHECK EVERY SINGLE ITEM:**
-🔍 **BEFORE generating the workflow, VERIFY these requirements:**
-1. ✅ Count AI/LangChain nodes: Every `@n8n/n8n-nodes-langchain.*` agent/chain node has a corresponding LLM model node
-2. ✅ Verify LLM connections: Every LLM model node has `ai_languageModel` connection to its agent/chain node
-3. ✅ Check connection names: Connection names match node names exactly (case-sensitive)
-4. ✅ Validate connection types: All connections use correct types: `ai_languageModel`, `ai_outputParser`, `main`
-5. ✅ No orphaned nodes: No AI agent nodes exist without LLM connections
-6. ✅ Required LLM models: At least one `@n8n/n8n-nodes-langchain.lmChatGoogleGemini` or `@n8n/n8n-nodes-langchain.lmChatOpenAi` node exists if any AI agents are present
-
-**🚨 DOUBLE-CHECK: If you create ANY of these nodes, you MUST create an LLM model and connection:**
-- `@n8n/n8n-nodes-langchain.chainLlm` ➜ REQUIRES LLM MODEL CONNECTION
-- `@n8n/n8n-nodes-langchain.informationExtractor` ➜ REQUIRES LLM MODEL CONNECTION  
-- `@n8n/n8n-nodes-langchain.chainSummarization` ➜ REQUIRES LLM MODEL CONNECTION
-- `@n8n/n8n-nodes-langchain.agentExecutor` ➜ REQUIRES LLM MODEL CONNECTION
-- ANY `@n8n/n8n-nodes-langchain.*` node that processes text ➜ REQUIRES LLM MODEL CONNECTION
-
 **N8N Workflow Structure:**
 ```json
 {{
@@ -272,76 +265,64 @@ The most common workflow generation error is creating AI/LangChain nodes (like i
 3. **AI Node Dependencies**: ALWAYS ensure AI/LangChain nodes have proper LLM model connections
 4. **Parameter Mapping**: Map workflow plan requirements to template node parameters
 5. **Credential Management**: Include proper credential configurations
-6. **Position Layout**: Organize nodes in a logical visual flow
-
-**MANDATORY REQUIREMENTS - READ BEFORE GENERATING:**
-🔥 **CRITICAL**: Every `@n8n/n8n-nodes-langchain.chainLlm` and `@n8n/n8n-nodes-langchain.informationExtractor` node MUST have a connection to LLM Model (`@n8n/n8n-nodes-langchain.lmChatGoogleGemini`) connected via `ai_languageModel`
-🔥 **CRITICAL**: Output parsers MUST connect to their target chain nodes via `ai_outputParser`  
-🔥 **CRITICAL**: Main data flow connections use `"type": "main"`
-🔥 **CRITICAL**: Never create AI/LangChain nodes without corresponding LLM model connections
 
-**🚨 FINAL REMINDER BEFORE GENERATION:**
-- AI nodes without LLM connections = BROKEN WORKFLOW
-- Missing `ai_languageModel` connections = EXECUTION FAILURE
-- Always create LLM Chat Model nodes for every AI agent
-- Verify connections section includes all AI-to-LLM relationships
+**Connection types:** output parsers connect to their chain node via `ai_outputParser`, data flow uses `"type": "main"`.
 
 When generating the configuration:
 - Provide working JSON that follows n8n standards
 - Explain each part of the configuration
 - Respond the config in a code block with `json` syntax highlighting
-- VERIFY all AI/LangChain nodes have proper LLM model connections
 - Include complete connections section with all node dependencies
 '''
-from langchain_openai import AzureChatOpenAI, ChatOpenAI
 
-async def workflow_config_generator(state: WorkflowConfigGeneratorState, config: RunnableConfig, writer: StreamWriter) -> WorkflowConfigGeneratorState:
-    """Generate n8n workflow configuration based on plans and templates."""
-    
-    llm = ChatOpenAI(
-        # model_name="o4-mini",
-        model_name="gpt-4o-mini",
-        temperature=0,
-        streaming=True,
-    )
-    
-    # Get metadata from config if available (from service)
-    workflow_plan = config["metadata"].get("workflow_plan", "")
-    current_config = config["metadata"].get("workflow_config", {})
-    # If this is the first interaction, analyze templates and extract plan
-    
-    selected_templates = await suggest_relevant_templates_with_llm(workflow_plan)
-    
-    # Create the prompt with context
-    prompt = WORKFLOW_CONFIG_GENERATOR_PROMPT.format(
-        workflow_plan=workflow_plan if len(workflow_plan) > 0 else "No specific workflow plan provided yet",
-        selected_templates=json.dumps(selected_templates, indent=2) if selected_templates else "No templates selected",
-        current_config_context=json.dumps(current_config, indent=2) if len(current_config) > 0 else "No current configuration context provided"
-    )
-    
-    # Prepare messages for the LLM
-    input_messages = [{"role": "system", "content": prompt}]
-    input_messages += [{"role": "user", "content": "Generate the configuration for me based on the provided plan and templates."}]
-    # input_messages += [i for i in state.get("messages", []) if i.type == "human" or i.type == "ai"]
-    
-    # Add the latest user message
-    
-    # Stream the response
+WORKFLOW_CONFIG_EDIT_PROMPT = '''
+You are an expert n8n workflow configuration editor specializing in banking and financial technology solutions. The user already has a workflow configuration and asks for a change. Do NOT re-emit the whole workflow: answer with a patch against the current configuration.
 
-    stream = llm.astream(input=input_messages)
-    
-    response_parts = []
-    async for chunk in stream:
-        response_parts.append(chunk.content)
-    
-    response_content = "".join(response_parts)
-    
-    # Try to extract generated configuration from response
-    updated_config = current_config
-    if "```json" in response_content or "{" in response_content:
-        updated_config = extract_json_config_from_response(response_content)
-        if not updated_config:
-            updated_config = current_config
+Workflow Plan from Message: {workflow_plan}
+
+Current Configuration (positions, ids and credentials omitted, node order is preserved):
+```json
+{current_config}
+```
+
+Respond with a short explanation and a single ```json code block containing a JSON array of operations. Supported operations:
+- RFC 6902 JSON Patch on the configuration: `{{"op": "replace", "path": "/nodes/2/parameters/url", "value": "..."}}`, also `add`, `remove`, `move`, `copy`, `test`
+- `{{"op": "add_node", "node": {{...full n8n node...}}}}`
+- `{{"op": "replace_node", "name": "Node Name", "node": {{...fields to overwrite...}}}}`
+- `{{"op": "remove_node", "name": "Node Name"}}` (also removes its connections)
+- `{{"op": "set_connections", "source": "Node Name", "connections": {{"main": [[{{"node": "Target", "type": "main", "index": 0}}]]}}}}`
+- `{{"op": "remove_connections", "source": "Node Name"}}`
+
+Prefer node-level operations when adding or removing nodes. Every `@n8n/n8n-nodes-langchain.*` chain/agent node needs a chat model node connected to it via `ai_languageModel`.
+'''
+
+# The generator calls this model whatever DEFAULT_MODEL is
+GENERATOR_MODEL = OpenAIModelName.GPT_4O_MINI
+
+
+def _config_prompt_view(workflow: Dict[str, Any]) -> str:
+    """Compact view of the current config for the edit prompt, node indexes unchanged."""
+    hidden = ("position", "id", "webhookId", "credentials")
+    return json.dumps({
+        "name": workflow.get("name", ""),
+        "nodes": [{k: v for k, v in node.items() if k not in hidden} for node in workflow.get("nodes", [])],
+        "connections": workflow.get("connections", {}),
+    }, separators=(",", ":"), ensure_ascii=False)
+
+
+def get_generator_llm() -> ModelT:
+    # Shared, cached model so admission, budgets and metrics see the generator's real provider/model
+    return get_model(GENERATOR_MODEL)
+
+
+def _finalize_config(
+    updated_config: Dict[str, Any], writer: StreamWriter, previous: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Trim, repair and lay out a workflow config, then stream it to the client.
+
+    A config edited from `previous` keeps the positions of its existing nodes, only
+    the nodes added by the edit are placed.
+    """
     # Limit the config to only the nodes and connections
     updated_config = {
         "name": updated_config.get("name", "Generated Workflow"),
@@ -350,11 +331,108 @@ async def workflow_config_generator(state: WorkflowConfigGeneratorState, config:
         "settings": updated_config.get("settings", {}),
         "staticData": updated_config.get("staticData", {}),
     }
+    # Repair structural mistakes locally instead of asking the LLM again
+    with span("validate"):
+        updated_config, validation = validate_and_repair_workflow(updated_config)
+    if validation.repairs or validation.issues:
+        send_custom_stream_data_workflow_config(writer, data=validation.to_dict(), role="workflow_validation")
+    # Assign canvas positions locally instead of trusting the LLM's coordinates
+    with span("layout", nodes=len(updated_config["nodes"])):
+        updated_config = place_new_nodes(updated_config, previous) if previous else layout_workflow(updated_config)
         
     send_custom_stream_data_workflow_config(
         writer,
         data=updated_config
     )
+    return updated_config
+
+
+async def _stream_completion(llm, input_messages: list, writer: StreamWriter, stream_deltas: bool) -> str:
+    """Run the LLM and return the full response, optionally streaming config deltas."""
+    stream = llm.astream(input=input_messages)
+    
+    response_parts = []
+    parser = IncrementalWorkflowParser()
+    async for chunk in stream:
+        response_parts.append(chunk.content)
+        if not stream_deltas:
+            continue
+        # Stream nodes and connections to the UI as soon as each one is complete
+        for event in parser.feed(chunk.content):
+            if event[0] == "node":
+                delta = {"kind": "node", "index": event[1], "node": event[2]}
+            else:
+                delta = {"kind": "connection", "source": event[1], "connection": event[2]}
+            send_custom_stream_data_workflow_config(writer, data=delta, role="workflow_config_delta")
+    
+    return "".join(response_parts)
+
+
+async def workflow_config_generator(state: WorkflowConfigGeneratorState, config: RunnableConfig, writer: StreamWriter) -> WorkflowConfigGeneratorState:
+    """Generate n8n workflow configuration based on plans and templates.
+
+    When a current configuration is supplied, the LLM is asked for a patch against it
+    (edit mode) and full regeneration is only used if the patch does not apply.
+    """
+    
+    llm = get_generator_llm()
+    
+    # Get metadata from config if available (from service)
+    workflow_plan = config["metadata"].get("workflow_plan", "")
+    current_config = config["metadata"].get("workflow_config", {})
+    
+    updated_config = None
+    edited = False
+    if current_config.get("nodes"):
+        user_messages = [m for m in state.get("messages", []) if m.type == "human" and m.content]
+        instruction = user_messages[-1].content if user_messages else "Improve the workflow according to the plan."
+        with span("template_serialization", mode="edit"):
+            prompt = WORKFLOW_CONFIG_EDIT_PROMPT.format(
+                workflow_plan=workflow_plan if len(workflow_plan) > 0 else "No specific workflow plan provided",
+                current_config=_config_prompt_view(current_config),
+            )
+        input_messages = [{"role": "system", "content": prompt}, {"role": "user", "content": instruction}]
+        response_content = await _stream_completion(llm, input_messages, writer, stream_deltas=False)
+        with span("json_extraction", chars=len(response_content), mode="edit"):
+            patch = extract_patch_from_response(response_content)
+        if patch:
+            try:
+                updated_config = apply_workflow_patch(current_config, patch)
+                edited = True
+                logger.info(f"Applied {len(patch)} patch operation(s) to the current workflow config")
+            except PatchError as e:
+                logger.warning(f"Patch could not be applied, regenerating the full config: {e}")
+        else:
+            logger.warning("No patch found in the edit response, regenerating the full config")
+    
+    if updated_config is None:
+        user_messages = [m for m in state.get("messages", []) if m.type == "human" and m.content]
+        selected_templates = await suggest_relevant_templates_with_llm(
+            workflow_plan, fallback_query=user_messages[-1].content if user_messages else ""
+        )
+        
+        # Create the prompt with context
+        with span("template_serialization", templates=len(selected_templates)):
+            prompt = WORKFLOW_CONFIG_GENERATOR_PROMPT.format(
+                workflow_plan=workflow_plan if len(workflow_plan) > 0 else "No specific workflow plan provided yet",
+                selected_templates=format_templates_for_prompt(selected_templates) if selected_templates else "No templates selected",
+                current_config_context=json.dumps(current_config, indent=2) if len(current_config) > 0 else "No current configuration context provided"
+            )
+        
+        # Prepare messages for the LLM
+        input_messages = [{"role": "system", "content": prompt}]
+        input_messages += [{"role": "user", "content": "Generate the configuration for me based on the provided plan and templates."}]
+        
+        response_content = await _stream_completion(llm, input_messages, writer, stream_deltas=True)
+        
+        # Try to extract generated configuration from response
+        updated_config = current_config
+        if "```json" in response_content or "{" in response_content:
+            with span("json_extraction", chars=len(response_content)):
+                updated_config = extract_json_config_from_response(response_content)
+            if not updated_config:
+                updated_config = current_config
+    updated_config = _finalize_config(updated_config, writer, previous=current_config if edited else None)
     
     # Send completion status
     return {
@@ -363,49 +441,80 @@ async def workflow_config_generator(state: WorkflowConfigGeneratorState, config:
     }
 
 
-async def suggest_relevant_templates_with_llm(workflow_plan: str) -> dict[str, Any]:
-    """Use LLM to suggest relevant templates based on workflow plan and metadata."""
-    # Build comprehensive template descriptions using both metadata and analysis
-    return WORKFLOW_TEMPLATES
+async def merge_config_fragments(
+    state: WorkflowConfigGeneratorState, config: RunnableConfig, writer: StreamWriter
+) -> WorkflowConfigGeneratorState | Command:
+    """Merge the step fragments generated in parallel into one workflow config.
+
+    If a step cluster could not be generated, the plan is generated in one call instead.
+    """
+    fragments = state.get("fragments", [])
+    if failed := [f["steps"] for f in fragments if f.get("failed")]:
+        logger.warning(f"Steps {failed} could not be generated, falling back to single-call generation")
+        return Command(goto="config_generation", update={"fragments": None})
+    plan = parse_workflow_plan(config["metadata"].get("workflow_plan", ""))
+    merged = merge_workflow_fragments(fragments, plan["flow_connections"], plan["workflow_name"])
+    updated_config = _finalize_config(merged, writer)
+    return {
+        "messages": [AIMessage(content=merged_config_message(updated_config, len(fragments)))],
+        "generated_config": updated_config,
+        "fragments": None,
+    }
+
+
+async def suggest_relevant_templates_with_llm(workflow_plan: str, fallback_query: str = "") -> dict[str, Any]:
+    """Suggest the templates most relevant to the workflow plan.
+
+    Templates are ranked locally against the template index (descriptions, node names
+    and node types), so only the top `TEMPLATE_TOP_K` of them end up in the prompt.
+    Without a plan, free-form requests are ranked on `fallback_query` (the latest user
+    message); when nothing matches, the first `TEMPLATE_TOP_K` templates are used.
+    """
+    query = workflow_plan or fallback_query
+    selected = TEMPLATE_INDEX.search(query, k=settings.TEMPLATE_TOP_K) if query.strip() else []
+    logger.info(f"Selected workflow templates: {selected}")
+    templates = {name: WORKFLOW_TEMPLATES[name] for name, score in selected if score > 0 and name in WORKFLOW_TEMPLATES}
+    # Free-form requests still get example configs to follow
+    return templates or dict(list(WORKFLOW_TEMPLATES.items())[: settings.TEMPLATE_TOP_K])
 
 
 def extract_json_config_from_response(response: str) -> Dict[str, Any]:
-    """Extract JSON configuration from the LLM response."""
-    
-    # Try to find JSON code blocks
-    json_patterns = [
-        r"```json\s*(.*?)\s*```",
-        r"```\s*(.*?)\s*```",
-        r"\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}",
-    ]
-    
-    for pattern in json_patterns:
-        matches = re.finditer(pattern, response, re.DOTALL)
-        for match in matches:
-            try:
-                json_str = match.group(1) if "```" in pattern else match.group(0)
-                # Clean up the JSON string
-                json_str = json_str.strip()
-                parsed = json.loads(json_str)
-                # Validate it looks like an n8n workflow
-                if isinstance(parsed, dict) and ("nodes" in parsed or "name" in parsed):
-                    return parsed
-            except (json.JSONDecodeError, AttributeError) as e:
-                logger.debug(f"Failed to parse JSON from match: {e}")
-                continue
-    
+    """Extract JSON configuration from the LLM response.
+
+    Every balanced JSON object/array of the response is found in one pass and the
+    candidate that looks most like an n8n workflow (`nodes` + `connections`) wins.
+    """
+    for score, candidate in rank_json_candidates(response):
+        # Validate it looks like an n8n workflow
+        if score and ("nodes" in candidate or "name" in candidate):
+            return candidate
     return {}
 
 
+def extract_patch_from_response(response: str) -> Optional[List[Dict[str, Any]]]:
+    """Extract the list of patch operations from an edit-mode LLM response."""
+    for candidate in find_json_candidates(response):
+        if isinstance(candidate, dict):
+            candidate = candidate.get("patch")
+        if is_patch(candidate):
+            return candidate
+    return None
+
+
 def build_workflow():
     """Build the workflow config generator state graph with conversation support."""
     
     graph = StateGraph(WorkflowConfigGeneratorState)
     
     graph.add_node("config_generation", workflow_config_generator)
+    graph.add_node("step_generation", generate_step_fragment)
+    graph.add_node("merge_fragments", merge_config_fragments, destinations=("config_generation",))
     
-    graph.set_entry_point("config_generation")
-    graph.set_finish_point("config_generation")
+    # Large plans fan out one step_generation per step cluster, then merge
+    graph.add_conditional_edges(START, route_config_generation, ["config_generation", "step_generation"])
+    graph.add_edge("step_generation", "merge_fragments")
+    graph.add_edge("merge_fragments", END)
+    graph.add_edge("config_generation", END)
     
     return graph.compile(
         name="workflow-config-generator",
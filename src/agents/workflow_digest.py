@@ -0,0 +1,294 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from agents.workflow_layout import STICKY_NOTE_TYPE, _assign_layers, _iter_edges, _remove_cycles
+from agents.workflow_validator import LANGCHAIN_PREFIX, is_trigger
+
+logger = logging.getLogger(__name__)
+
+DIGEST_CACHE_SIZE = 128
+_analysis_cache: "OrderedDict[str, WorkflowAnalysis]" = OrderedDict()
+
+# Limits that keep the digest small for large workflows
+MAX_PATHS = 8
+MAX_PARAMETER_CHARS = 300
+MAX_STRING_CHARS = 120
+MAX_NOTE_CHARS = 200
+
+# n8n-nodes-base nodes that only move or transform data inside n8n
+CORE_NODE_TYPES = frozenset((
+    "aggregate", "code", "compareDatasets", "convertToFile", "crypto", "dateTime", "executeWorkflow",
+    "executeWorkflowTrigger", "extractFromFile", "filter", "form", "formTrigger", "function",
+    "functionItem", "html", "if", "itemLists", "limit", "manualTrigger", "markdown", "merge", "noOp",
+    "removeDuplicates", "renameKeys", "respondToWebhook", "scheduleTrigger", "set", "sort",
+    "splitInBatches", "splitOut", "stickyNote", "stopAndError", "summarize", "switch", "wait",
+    "webhook", "xml",
+))
+
+# Langchain sub-nodes that call an outside provider
+EXTERNAL_AI_PREFIXES = ("lmChat", "lmOpenAi", "lm", "embeddings", "vectorStore")
+
+
+def canonical_workflow_hash(workflow: Dict[str, Any]) -> str:
+    """Hash of the workflow content, ignoring canvas positions and key order."""
+    nodes = [{k: v for k, v in node.items() if k != "position"} for node in workflow.get("nodes", [])]
+    payload = json.dumps(
+        [workflow.get("name", ""), nodes, workflow.get("connections", {})],
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def short_type(node_type: str) -> str:
+    return node_type.rsplit(".", 1)[-1]
+
+
+def is_external_integration(node: Dict[str, Any]) -> bool:
+    """Whether a node talks to a service outside n8n (API, database, LLM provider...)."""
+    node_type = node.get("type", "")
+    if node.get("credentials"):
+        return True
+    if node_type.startswith(LANGCHAIN_PREFIX):
+        return short_type(node_type).startswith(EXTERNAL_AI_PREFIXES)
+    return short_type(node_type) not in CORE_NODE_TYPES
+
+
+@dataclass
+class WorkflowAnalysis:
+    """Structural index of an n8n workflow, built once per workflow content."""
+
+    name: str
+    nodes: Dict[str, Dict[str, Any]]
+    order: List[str]  # flow nodes in topological order
+    children: Dict[str, List[str]]  # main connections
+    parents: Dict[str, List[str]]
+    sub_nodes: Dict[str, List[Tuple[str, str]]]  # root -> [(connection type, sub-node)]
+    triggers: List[str]
+    paths: List[List[str]]
+    integrations: List[str]
+    notes: List[str]
+    _digest: Optional[str] = field(default=None, repr=False)
+
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            self._digest = render_digest(self)
+        return self._digest
+
+
+def _data_flow_paths(starts: List[str], edges: Dict[str, List[str]]) -> List[List[str]]:
+    """Paths from each start to a node without outputs, over an acyclic graph, at most MAX_PATHS."""
+    paths: List[List[str]] = []
+    for start in starts:
+        stack = [[start]]
+        while stack and len(paths) < MAX_PATHS:
+            path = stack.pop()
+            targets = edges.get(path[-1], [])
+            if not targets:
+                paths.append(path)
+            for target in reversed(targets):
+                stack.append(path + [target])
+    return paths
+
+
+def analyze_workflow(workflow: Dict[str, Any]) -> WorkflowAnalysis:
+    nodes: Dict[str, Dict[str, Any]] = {}
+    for node in workflow.get("nodes", []):
+        if isinstance(node, dict) and node.get("name"):
+            nodes.setdefault(node["name"], node)
+
+    children: Dict[str, List[str]] = defaultdict(list)
+    parents: Dict[str, List[str]] = defaultdict(list)
+    sub_nodes: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+    for source, target, connection_type in _iter_edges(workflow.get("connections", {})):
+        if source not in nodes or target not in nodes or source == target:
+            continue
+        if connection_type == "main":
+            if target not in children[source]:
+                children[source].append(target)
+                parents[target].append(source)
+        elif (connection_type, source) not in sub_nodes[target]:
+            sub_nodes[target].append((connection_type, source))
+
+    attached = {sub for subs in sub_nodes.values() for _, sub in subs}
+    flow = [
+        name for name, node in nodes.items()
+        if node.get("type") != STICKY_NOTE_TYPE and name not in attached
+    ]
+    acyclic = _remove_cycles(flow, children)
+    layer = _assign_layers(flow, acyclic)
+    index = {name: i for i, name in enumerate(flow)}
+    order = sorted(flow, key=lambda name: (layer[name], index[name]))
+
+    triggers = [name for name in order if is_trigger(nodes[name].get("type", ""))]
+    starts = triggers or [name for name in order if not parents.get(name)]
+    notes = [
+        ((node.get("parameters") or {}).get("content") or "").strip()
+        for node in nodes.values() if node.get("type") == STICKY_NOTE_TYPE
+    ]
+    return WorkflowAnalysis(
+        name=workflow.get("name", ""),
+        nodes=nodes,
+        order=order,
+        children=dict(children),
+        parents=dict(parents),
+        sub_nodes=dict(sub_nodes),
+        triggers=triggers,
+        paths=_data_flow_paths(starts, acyclic),
+        integrations=[name for name, node in nodes.items() if is_external_integration(node)],
+        notes=[note for note in notes if note],
+    )
+
+
+def _truncate(value: Any) -> Any:
+    if isinstance(value, str):
+        return value if len(value) <= MAX_STRING_CHARS else value[:MAX_STRING_CHARS] + "..."
+    if isinstance(value, dict):
+        return {k: _truncate(v) for k, v in value.items() if v not in ("", None, {}, [])}
+    if isinstance(value, list):
+        return [_truncate(v) for v in value]
+    return value
+
+
+def summarize_parameters(parameters: Dict[str, Any]) -> str:
+    """Compact JSON of a node's parameters with long strings and the whole block truncated."""
+    text = json.dumps(_truncate(parameters or {}), separators=(",", ":"), ensure_ascii=False)
+    return text if len(text) <= MAX_PARAMETER_CHARS else text[:MAX_PARAMETER_CHARS] + "..."
+
+
+def _node_label(analysis: WorkflowAnalysis, name: str) -> str:
+    return f"{name} [{short_type(analysis.nodes[name].get('type', ''))}]"
+
+
+def render_digest(analysis: WorkflowAnalysis) -> str:
+    """Text digest of a workflow for prompts: much smaller than the indented JSON."""
+    lines = [f"Workflow: {analysis.name or 'Unnamed'}"]
+    lines.append(
+        f"Nodes: {len(analysis.nodes)} ({len(analysis.order)} in the data flow, "
+        f"{sum(len(s) for s in analysis.sub_nodes.values())} AI sub-node connections, {len(analysis.notes)} notes)"
+    )
+
+    lines.append("\nTriggers:")
+    lines += [f"- {_node_label(analysis, name)}" for name in analysis.triggers] or ["- none"]
+
+    lines.append("\nNodes in execution order:")
+    for i, name in enumerate(analysis.order, 1):
+        node = analysis.nodes[name]
+        targets = analysis.children.get(name, [])
+        flags = [key for key in ("disabled", "retryOnFail") if node.get(key)]
+        if node.get("onError"):
+            flags.append(f"onError={node['onError']}")
+        line = f"{i}. {_node_label(analysis, name)}"
+        if flags:
+            line += f" ({', '.join(flags)})"
+        if targets:
+            line += f" -> {', '.join(targets)}"
+        lines.append(line)
+        if node.get("parameters"):
+            lines.append(f"   parameters: {summarize_parameters(node['parameters'])}")
+
+    if analysis.paths:
+        lines.append("\nData-flow paths:")
+        lines += [f"- {' -> '.join(path)}" for path in analysis.paths]
+
+    if analysis.sub_nodes:
+        lines.append("\nAI wiring:")
+        described = set()
+        for root, subs in analysis.sub_nodes.items():
+            attached = ", ".join(f"{_node_label(analysis, sub)} via {t}" for t, sub in subs)
+            lines.append(f"- {root} <- {attached}")
+            # Sub-nodes shared by several roots are described once
+            for _, sub in subs:
+                parameters = analysis.nodes[sub].get("parameters")
+                if parameters and sub not in described:
+                    described.add(sub)
+                    lines.append(f"   {sub} parameters: {summarize_parameters(parameters)}")
+
+    if analysis.integrations:
+        lines.append("\nExternal integrations:")
+        for name in analysis.integrations:
+            node = analysis.nodes[name]
+            line = f"- {_node_label(analysis, name)}"
+            if node.get("credentials"):
+                line += f" credentials: {', '.join(node['credentials'])}"
+            url = (node.get("parameters") or {}).get("url")
+            if isinstance(url, str) and url:
+                line += f" url: {_truncate(url)}"
+            lines.append(line)
+
+    if analysis.notes:
+        lines.append("\nNotes:")
+        for note in analysis.notes:
+            note = " ".join(note.split())
+            lines.append(f"- {note[:MAX_NOTE_CHARS]}{'...' if len(note) > MAX_NOTE_CHARS else ''}")
+    return "\n".join(lines)
+
+
+def get_workflow_analysis(workflow: Dict[str, Any]) -> WorkflowAnalysis:
+    """Analysis of a workflow, cached by content hash so each workflow is analyzed once."""
+    key = canonical_workflow_hash(workflow)
+    analysis = _analysis_cache.get(key)
+    if analysis is not None:
+        _analysis_cache.move_to_end(key)
+        return analysis
+    analysis = analyze_workflow(workflow)
+    _analysis_cache[key] = analysis
+    if len(_analysis_cache) > DIGEST_CACHE_SIZE:
+        _analysis_cache.popitem(last=False)
+    return analysis
+
+
+def get_workflow_digest(workflow: Dict[str, Any]) -> str:
+    return get_workflow_analysis(workflow).digest
+
+
+def clear_digest_cache() -> None:
+    _analysis_cache.clear()
+
+
+def benchmark_workflow_digest(path: str, turns: int = 20) -> Dict[str, Any]:
+    """Compare per-turn prompt tokens and CPU of the indented JSON dump with the cached digest."""
+    from core.tokens import estimate_tokens
+
+    workflow = json.load(open(path, "r"))
+    start = time.perf_counter()
+    for _ in range(turns):
+        dumped = json.dumps(workflow, indent=2)
+    dump_ms = (time.perf_counter() - start) * 1000 / turns
+
+    clear_digest_cache()
+    start = time.perf_counter()
+    digest = get_workflow_digest(workflow)
+    first_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    for _ in range(turns):
+        digest = get_workflow_digest(workflow)
+    cached_ms = (time.perf_counter() - start) * 1000 / turns
+
+    dump_tokens, digest_tokens = estimate_tokens(dumped), estimate_tokens(digest)
+    return {
+        "workflow": path,
+        "json_tokens": dump_tokens,
+        "digest_tokens": digest_tokens,
+        "token_reduction": round(1 - digest_tokens / dump_tokens, 3) if dump_tokens else 0.0,
+        "json_dump_ms": round(dump_ms, 3),
+        "digest_first_turn_ms": round(first_ms, 3),
+        "digest_cached_turn_ms": round(cached_ms, 3),
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+    for workflow_path in sys.argv[1:] or [
+        "example_workflow/AI_Automated_HR_Workflow_for_CV_Analysis_and_Candidate_Evaluation.json",
+        "example_workflow/workflow.json",
+    ]:
+        print(benchmark_workflow_digest(workflow_path))
@@ -14,6 +14,8 @@ from core.llm import get_model
 from core.settings import settings
 from agents.utils import send_custom_stream_data
 from agents.prompts import WORKFLOW_EXPLAIN_PROMPT
+from agents.workflow_digest import get_workflow_analysis
+from agents.workflow_query import answer_structural_question
 
 logger = logging.getLogger(__name__)
 
@@ -25,14 +27,22 @@ class WorkflowExplainState(MessagesState, total=False):
 async def workflow_explanation(state: WorkflowExplainState, config: RunnableConfig, writer: StreamWriter) -> WorkflowExplainState:
     """Interactive workflow explanation that responds to user questions about the workflow."""
     
-    llm = get_model(settings.DEFAULT_MODEL)
-    
     # Initialize state variables
     workflow_config = config["metadata"].get("workflow_config", {})
+    analysis = get_workflow_analysis(workflow_config) if workflow_config else None
+    
+    # Structural questions (triggers, neighbours, models...) are answered from the workflow index
+    human_messages = [m for m in state.get("messages", []) if m.type == "human"]
+    if analysis is not None and human_messages:
+        answer = answer_structural_question(analysis, str(human_messages[-1].content))
+        if answer is not None:
+            return {"messages": [AIMessage(content=answer)]}
+    
+    llm = get_model(settings.DEFAULT_MODEL)
     
-    # Create the prompt with context
+    # Create the prompt with context; the digest is computed once per workflow content
     prompt = WORKFLOW_EXPLAIN_PROMPT.format(
-        workflow_analysis=json.dumps(workflow_config, indent=2),
+        workflow_analysis=analysis.digest if analysis is not None else "No workflow configuration provided",
     )
     
     # Prepare messages for the LLM
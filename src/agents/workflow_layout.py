@@ -0,0 +1,376 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict, defaultdict, deque
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Spacing used by the n8n editor canvas (in canvas pixels)
+NODE_X_SPACING = 240
+NODE_Y_SPACING = 180
+SUB_NODE_X_SPACING = 140
+SUB_NODE_Y_OFFSET = 220
+ORIGIN = (0, 0)
+
+# Number of barycenter sweeps used for crossing reduction
+CROSSING_REDUCTION_SWEEPS = 4
+
+# Sticky notes are annotations, they are never part of the data flow
+STICKY_NOTE_TYPE = "n8n-nodes-base.stickyNote"
+
+LAYOUT_CACHE_SIZE = 256
+_layout_cache: "OrderedDict[str, Dict[str, List[int]]]" = OrderedDict()
+
+
+def _iter_edges(connections: Dict[str, Any]):
+    """Yield (source, target, connection_type) for every edge of an n8n connections block."""
+    for source, outputs in (connections or {}).items():
+        if not isinstance(outputs, dict):
+            continue
+        for connection_type, branches in outputs.items():
+            for branch in branches or []:
+                for target in branch or []:
+                    if isinstance(target, dict) and target.get("node"):
+                        yield source, target["node"], target.get("type", connection_type)
+
+
+def topology_hash(workflow: Dict[str, Any]) -> str:
+    """Hash of the node set and the connection graph, ignoring positions and parameters."""
+    nodes = sorted((n.get("name", ""), n.get("type", "")) for n in workflow.get("nodes", []))
+    edges = sorted(_iter_edges(workflow.get("connections", {})))
+    payload = json.dumps([nodes, edges], separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _split_edges(
+    names: List[str], connections: Dict[str, Any]
+) -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
+    """Split edges into the main data-flow graph and the `ai_*` sub-node attachments.
+
+    `ai_languageModel`, `ai_outputParser`, `ai_memory`, `ai_tool`... edges go from a
+    sub-node (chat model, parser) to the root node that uses it. Sub-nodes are drawn
+    under their root node instead of taking part in the layering.
+    """
+    known = set(names)
+    main_edges: Dict[str, List[str]] = defaultdict(list)
+    sub_nodes: Dict[str, List[str]] = defaultdict(list)
+    for source, target, connection_type in _iter_edges(connections):
+        if source not in known or target not in known or source == target:
+            continue
+        if connection_type == "main":
+            if target not in main_edges[source]:
+                main_edges[source].append(target)
+        elif source not in sub_nodes[target]:
+            sub_nodes[target].append(source)
+    return main_edges, sub_nodes
+
+
+def _remove_cycles(names: List[str], edges: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """Return an acyclic copy of `edges` by reversing DFS back edges (iterative DFS)."""
+    acyclic: Dict[str, List[str]] = defaultdict(list)
+    state: Dict[str, int] = {}  # 1 = on stack, 2 = done
+    for root in names:
+        if root in state:
+            continue
+        state[root] = 1
+        stack = [(root, iter(edges.get(root, [])))]
+        while stack:
+            node, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                state[node] = 2
+                stack.pop()
+                continue
+            if state.get(child) == 1:
+                acyclic[child].append(node)
+                continue
+            acyclic[node].append(child)
+            if child not in state:
+                state[child] = 1
+                stack.append((child, iter(edges.get(child, []))))
+    return acyclic
+
+
+def _assign_layers(names: List[str], edges: Dict[str, List[str]]) -> Dict[str, int]:
+    """Longest-path layering over a DAG using Kahn's algorithm."""
+    indegree = {name: 0 for name in names}
+    for source in names:
+        for target in edges.get(source, []):
+            indegree[target] += 1
+    layer = {name: 0 for name in names}
+    queue = deque(name for name in names if indegree[name] == 0)
+    while queue:
+        node = queue.popleft()
+        for target in edges.get(node, []):
+            layer[target] = max(layer[target], layer[node] + 1)
+            indegree[target] -= 1
+            if indegree[target] == 0:
+                queue.append(target)
+    return layer
+
+
+def _order_layers(
+    names: List[str], edges: Dict[str, List[str]], layer: Dict[str, int]
+) -> List[List[str]]:
+    """Order nodes inside each layer with barycenter sweeps to reduce edge crossings."""
+    layers: List[List[str]] = [[] for _ in range(max(layer.values(), default=-1) + 1)]
+    for name in names:
+        layers[layer[name]].append(name)
+
+    parents: Dict[str, List[str]] = defaultdict(list)
+    for source in names:
+        for target in edges.get(source, []):
+            parents[target].append(source)
+
+    position = {name: i for nodes in layers for i, name in enumerate(nodes)}
+
+    def sweep(indices, neighbours):
+        for i in indices:
+            def barycenter(name: str) -> float:
+                adjacent = neighbours.get(name, [])
+                if not adjacent:
+                    return position[name]
+                return sum(position[n] for n in adjacent) / len(adjacent)
+
+            layers[i].sort(key=barycenter)
+            for j, name in enumerate(layers[i]):
+                position[name] = j
+
+    for _ in range(CROSSING_REDUCTION_SWEEPS):
+        sweep(range(1, len(layers)), parents)
+        sweep(range(len(layers) - 2, -1, -1), edges)
+    return layers
+
+
+def compute_layout(workflow: Dict[str, Any]) -> Dict[str, List[int]]:
+    """Compute `[x, y]` canvas positions for every non-sticky node of an n8n workflow.
+
+    Layered (Sugiyama-style) layout: cycle removal, longest-path layering, barycenter
+    crossing reduction and coordinate assignment. Runs in O((V + E) log V) per sweep,
+    long edges are not split into dummy nodes to keep it linear-ish on large workflows.
+    """
+    names = [
+        n["name"] for n in workflow.get("nodes", [])
+        if n.get("name") and n.get("type") != STICKY_NOTE_TYPE
+    ]
+    main_edges, sub_nodes = _split_edges(names, workflow.get("connections", {}))
+
+    # A node attached to a root node through an `ai_*` edge only is drawn as a sub-node
+    attached = {sub for subs in sub_nodes.values() for sub in subs}
+    in_main_flow = set(main_edges) | {t for targets in main_edges.values() for t in targets}
+    flow_names = [name for name in names if name not in attached or name in in_main_flow]
+
+    acyclic = _remove_cycles(flow_names, main_edges)
+    layer = _assign_layers(flow_names, acyclic)
+    layers = _order_layers(flow_names, acyclic, layer)
+
+    positions: Dict[str, List[int]] = {}
+    for i, nodes in enumerate(layers):
+        offset = (len(nodes) - 1) / 2
+        for j, name in enumerate(nodes):
+            positions[name] = [
+                ORIGIN[0] + i * NODE_X_SPACING,
+                ORIGIN[1] + round((j - offset) * NODE_Y_SPACING),
+            ]
+
+    # Sub-nodes go in a band under the layer of their root node; a sub-node shared by
+    # several roots (e.g. one chat model for many chains) goes under the first root.
+    band: Dict[int, List[str]] = defaultdict(list)
+    banded = set(positions)
+    for i, nodes in enumerate(layers):
+        for root in nodes:
+            for sub in sub_nodes.get(root, []):
+                if sub not in banded:
+                    banded.add(sub)
+                    band[i].append(sub)
+    for i, subs in band.items():
+        bottom = max(positions[name][1] for name in layers[i])
+        offset = (len(subs) - 1) / 2
+        for j, sub in enumerate(subs):
+            positions[sub] = [
+                round(ORIGIN[0] + i * NODE_X_SPACING + (j - offset) * SUB_NODE_X_SPACING),
+                bottom + SUB_NODE_Y_OFFSET,
+            ]
+
+    # Sub-nodes whose roots are themselves sub-nodes (e.g. a tool's model)
+    pending = [name for name in names if name not in positions]
+    while pending:
+        placed = False
+        for name in pending:
+            roots = [root for root, subs in sub_nodes.items() if name in subs and root in positions]
+            if roots:
+                x, y = positions[roots[0]]
+                positions[name] = [x, y + SUB_NODE_Y_OFFSET]
+                placed = True
+        pending = [name for name in pending if name not in positions]
+        if not placed:
+            for k, name in enumerate(pending):
+                positions[name] = [ORIGIN[0] + k * NODE_X_SPACING, ORIGIN[1] - NODE_Y_SPACING * 2]
+            break
+
+    return positions
+
+
+def layout_workflow(workflow: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a copy of the workflow with `position` assigned to every node.
+
+    Layouts are cached by topology hash, so re-generating a workflow with the same
+    nodes and connections reuses the previous layout.
+    """
+    key = topology_hash(workflow)
+    positions = _layout_cache.get(key)
+    if positions is None:
+        positions = compute_layout(workflow)
+        _layout_cache[key] = positions
+        if len(_layout_cache) > LAYOUT_CACHE_SIZE:
+            _layout_cache.popitem(last=False)
+    else:
+        _layout_cache.move_to_end(key)
+
+    positioned = {**workflow, "nodes": [dict(node) for node in workflow.get("nodes", [])]}
+    for node in positioned["nodes"]:
+        if node.get("name") in positions:
+            node["position"] = list(positions[node["name"]])
+        elif "position" not in node:
+            node["position"] = list(ORIGIN)
+    return positioned
+
+
+def _has_position(node: Dict[str, Any]) -> bool:
+    position = node.get("position")
+    return (
+        isinstance(position, (list, tuple))
+        and len(position) == 2
+        and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in position)
+    )
+
+
+def place_new_nodes(workflow: Dict[str, Any], previous: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a copy of an edited workflow where only the new nodes are placed.
+
+    Nodes that already were in `previous` keep the position the user arranged on
+    the canvas, whatever the edit says. A new node, or one that had no position,
+    goes right of a placed predecessor, left of a placed successor, or under the
+    root node it is attached to as a sub-node; nodes with no placed neighbour go
+    right of the workflow. Without any previous position the workflow gets a full layout.
+    """
+    nodes = [dict(node) for node in workflow.get("nodes", [])]
+    previous_positions = {
+        node.get("name"): list(node["position"]) for node in previous.get("nodes", []) if _has_position(node)
+    }
+    positions = {
+        node["name"]: previous_positions[node["name"]] for node in nodes if node.get("name") in previous_positions
+    }
+    if not positions:
+        return layout_workflow(workflow)
+    names = [node["name"] for node in nodes if node.get("name")]
+    main_edges, sub_nodes = _split_edges(names, workflow.get("connections", {}))
+    predecessors: Dict[str, List[str]] = defaultdict(list)
+    for source, targets in main_edges.items():
+        for target in targets:
+            predecessors[target].append(source)
+    roots = {sub: root for root, subs in sub_nodes.items() for sub in subs}
+    taken = {tuple(position) for position in positions.values()}
+
+    def place(name: str, x: float, y: float) -> None:
+        # Move down until the spot is free, new nodes never cover existing ones
+        while (x, y) in taken:
+            y += NODE_Y_SPACING
+        positions[name] = [x, y]
+        taken.add((x, y))
+
+    pending = [name for name in names if name not in positions]
+    while pending:
+        for name in pending:
+            placed_predecessors = [p for p in predecessors.get(name, []) if p in positions]
+            placed_successors = [t for t in main_edges.get(name, []) if t in positions]
+            if placed_predecessors:
+                x, y = positions[placed_predecessors[0]]
+                place(name, x + NODE_X_SPACING, y)
+            elif placed_successors:
+                x, y = positions[placed_successors[0]]
+                place(name, x - NODE_X_SPACING, y)
+            elif roots.get(name) in positions:
+                x, y = positions[roots[name]]
+                place(name, x, y + SUB_NODE_Y_OFFSET)
+        remaining = [name for name in pending if name not in positions]
+        if len(remaining) == len(pending):
+            # Not connected to any placed node: start a column right of the workflow
+            right = max(x for x, _ in positions.values()) + NODE_X_SPACING
+            place(remaining[0], right, ORIGIN[1])
+            remaining = remaining[1:]
+        pending = remaining
+
+    for node in nodes:
+        node["position"] = list(positions.get(node.get("name"), ORIGIN))
+    return {**workflow, "nodes": nodes}
+
+
+def clear_layout_cache() -> None:
+    """Drop all cached layouts."""
+    _layout_cache.clear()
+
+
+def benchmark_layout(repeat: int = 100) -> List[Dict[str, Any]]:
+    """Benchmark the layout engine on the example templates and a synthetic large workflow."""
+    from agents.workflow_information import WORKFLOW_EXAMPLE_METADATA
+
+    workflows = {
+        workflow["name"]: json.load(open(workflow["file_path"], "r"))
+        for workflow in WORKFLOW_EXAMPLE_METADATA
+    }
+    workflows["synthetic_500_nodes"] = _synthetic_workflow(500)
+
+    results = []
+    for name, workflow in workflows.items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            compute_layout(workflow)
+        cold_ms = (time.perf_counter() - start) * 1000 / repeat
+
+        clear_layout_cache()
+        layout_workflow(workflow)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            layout_workflow(workflow)
+        cached_ms = (time.perf_counter() - start) * 1000 / repeat
+
+        results.append({
+            "workflow": name,
+            "nodes": len(workflow.get("nodes", [])),
+            "layout_ms": round(cold_ms, 3),
+            "cached_layout_ms": round(cached_ms, 3),
+        })
+    return results
+
+
+def _synthetic_workflow(size: int) -> Dict[str, Any]:
+    """Build a branching workflow of `size` main nodes, each tenth one an AI chain with a model."""
+    nodes = [{"name": "Trigger", "type": "n8n-nodes-base.manualTrigger"}]
+    connections: Dict[str, Any] = {}
+    for i in range(1, size):
+        name = f"Node {i}"
+        parent = "Trigger" if i < 3 else f"Node {i // 2}"
+        if i % 10 == 0:
+            nodes.append({"name": name, "type": "@n8n/n8n-nodes-langchain.chainLlm"})
+            nodes.append({"name": f"Model {i}", "type": "@n8n/n8n-nodes-langchain.lmChatOpenAi"})
+            connections[f"Model {i}"] = {
+                "ai_languageModel": [[{"node": name, "type": "ai_languageModel", "index": 0}]]
+            }
+        else:
+            nodes.append({"name": name, "type": "n8n-nodes-base.set"})
+        connections.setdefault(parent, {"main": [[]]})["main"][0].append(
+            {"node": name, "type": "main", "index": 0}
+        )
+    return {"name": "Synthetic", "nodes": nodes, "connections": connections}
+
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+    for row in benchmark_layout():
+        print(row)
@@ -0,0 +1,238 @@
+import asyncio
+import json
+import logging
+import math
+import weakref
+from typing import Any, Dict, List, Optional
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.types import Send
+
+from core.settings import settings
+from core.tracing import span
+from agents.json_parsing import rank_json_candidates
+from agents.plan_parser import parse_workflow_plan
+
+logger = logging.getLogger(__name__)
+
+STEP_FRAGMENT_PROMPT = '''
+You are an expert n8n workflow configuration generator specializing in banking and financial technology solutions. A large workflow is generated in parts; you generate the n8n nodes for a few of its steps only.
+
+Workflow: {workflow_name}
+Description: {description}
+
+All steps of the workflow (for context only):
+{all_steps}
+
+Steps you must implement:
+{assigned_steps}
+
+Respond with a single ```json code block containing:
+```json
+{{
+  "steps": {{"<step number>": {{"entry": "<name of the first node of the step>", "exit": "<name of the last node of the step>"}}}},
+  "nodes": [{{"name": "...", "type": "...", "typeVersion": 1, "parameters": {{}}}}],
+  "connections": {{}}
+}}
+```
+- `connections` only contains connections between your own nodes, the steps are connected to each other later.
+- Every `@n8n/n8n-nodes-langchain.*` chain/agent node needs its own chat model node (e.g. `@n8n/n8n-nodes-langchain.lmChatGoogleGemini`) connected to it via `ai_languageModel`.
+- Keep node names unique and descriptive.
+'''
+
+# Runs of a step cluster: the first one and a retry
+FRAGMENT_ATTEMPTS = 2
+
+# Limits the number of step generations running at once, per event loop: a semaphore
+# is bound to the loop it is first used on
+_fragment_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _get_fragment_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _fragment_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _fragment_semaphores[loop] = asyncio.Semaphore(settings.PARALLEL_GENERATION_MAX_CONCURRENCY)
+    return semaphore
+
+
+def add_fragments(current: Optional[List[Dict[str, Any]]], new: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Reducer for step fragments; `None` clears them once they are merged."""
+    if new is None:
+        return []
+    return (current or []) + new
+
+
+def plan_step_clusters(workflow_plan: str) -> Optional[Dict[str, Any]]:
+    """Parse the plan and split its steps into clusters if it is large enough to fan out."""
+    if not workflow_plan:
+        return None
+    plan = parse_workflow_plan(workflow_plan)
+    steps = plan["steps"]
+    if len(steps) < settings.PARALLEL_GENERATION_MIN_STEPS:
+        return None
+    size = max(1, settings.PARALLEL_GENERATION_CLUSTER_SIZE)
+    plan["clusters"] = [steps[i:i + size] for i in range(0, len(steps), size)]
+    return plan
+
+
+def route_config_generation(state: Dict[str, Any], config: RunnableConfig):
+    """Fan out one `step_generation` task per step cluster for large plans, else generate in one call."""
+    metadata = config.get("metadata", {})
+    if metadata.get("workflow_config", {}).get("nodes"):
+        return "config_generation"
+    plan = plan_step_clusters(metadata.get("workflow_plan", ""))
+    if plan is None:
+        return "config_generation"
+    logger.info(f"Generating {plan['steps_count']} steps in {len(plan['clusters'])} parallel fragments")
+    context = {k: plan[k] for k in ("workflow_name", "description", "steps")}
+    return [Send("step_generation", {"plan": context, "cluster": cluster}) for cluster in plan["clusters"]]
+
+
+def _format_steps(steps: List[Dict[str, Any]], detailed: bool) -> str:
+    lines = []
+    for step in steps:
+        lines.append(f"Step {step['step_number']}: {step['title']}")
+        if detailed:
+            for label, key in (("Description", "description"), ("Node Type", "node_type"), ("Details", "details")):
+                if step.get(key):
+                    lines.append(f"- {label}: {step[key]}")
+    return "\n".join(lines)
+
+
+async def generate_step_fragment(state: Dict[str, Any], config: RunnableConfig) -> Dict[str, Any]:
+    """Generate the nodes of one step cluster.
+
+    A failed or timed out generation is retried once; after that the fragment is
+    marked `failed` instead of failing the run, and the merge falls back to
+    generating the whole plan in one call.
+    """
+    from agents.workflow_config_generator_agent import get_generator_llm
+
+    plan, cluster = state["plan"], state["cluster"]
+    prompt = STEP_FRAGMENT_PROMPT.format(
+        workflow_name=plan.get("workflow_name") or "Generated Workflow",
+        description=plan.get("description") or "No description",
+        all_steps=_format_steps(plan["steps"], detailed=False),
+        assigned_steps=_format_steps(cluster, detailed=True),
+    )
+    # Parallel token streams would interleave in the UI, only the merged config is streamed
+    llm = get_generator_llm().with_config(tags=["skip_stream"])
+    steps = [step["step_number"] for step in cluster]
+    for attempt in range(1, FRAGMENT_ATTEMPTS + 1):
+        try:
+            async with _get_fragment_semaphore():
+                response = await asyncio.wait_for(
+                    llm.ainvoke([
+                        {"role": "system", "content": prompt},
+                        {"role": "user", "content": "Generate the nodes for the assigned steps."},
+                    ]),
+                    timeout=settings.PARALLEL_GENERATION_FRAGMENT_TIMEOUT_SECONDS,
+                )
+            break
+        except Exception as e:
+            logger.warning(f"Generation of steps {steps} failed (attempt {attempt}/{FRAGMENT_ATTEMPTS}): {e!r}")
+    else:
+        return {"fragments": [{"steps": steps, "failed": True, "step_nodes": {}, "nodes": [], "connections": {}}]}
+
+    with span("json_extraction", chars=len(response.content)):
+        fragment = next((value for score, value in rank_json_candidates(response.content) if score), {})
+    return {"fragments": [{
+        "steps": steps,
+        "step_nodes": fragment.get("steps", {}) if isinstance(fragment.get("steps"), dict) else {},
+        "nodes": fragment.get("nodes", []) if isinstance(fragment.get("nodes"), list) else [],
+        "connections": fragment.get("connections", {}) if isinstance(fragment.get("connections"), dict) else {},
+    }]}
+
+
+def _rename_fragment(fragment: Dict[str, Any], taken: set) -> Dict[str, Any]:
+    """Rename nodes of a fragment that clash with nodes of earlier fragments or of the fragment itself.
+
+    The first node of a name keeps it if it is free, later ones get a suffix; the
+    connections and step ends of the fragment refer to that first node.
+    """
+    own = {node.get("name", "") for node in fragment["nodes"]}
+    names = []
+    renames = {}
+    for node in fragment["nodes"]:
+        name = new_name = node.get("name", "")
+        if name in taken:
+            i = 2
+            while f"{name} {i}" in taken or f"{name} {i}" in own:
+                i += 1
+            new_name = f"{name} {i}"
+        renames.setdefault(name, new_name)
+        names.append(new_name)
+        taken.add(new_name)
+    if names == [node.get("name", "") for node in fragment["nodes"]]:
+        return fragment
+
+    nodes = [dict(node, name=name) for node, name in zip(fragment["nodes"], names)]
+    connections = {}
+    for source, outputs in fragment["connections"].items():
+        connections[renames.get(source, source)] = {
+            connection_type: [
+                [dict(t, node=renames.get(t.get("node"), t.get("node"))) for t in branch or []]
+                for branch in branches or []
+            ]
+            for connection_type, branches in outputs.items()
+        }
+    step_nodes = {
+        step: {k: renames.get(v, v) for k, v in ends.items()}
+        for step, ends in fragment["step_nodes"].items() if isinstance(ends, dict)
+    }
+    return {**fragment, "nodes": nodes, "connections": connections, "step_nodes": step_nodes}
+
+
+def merge_workflow_fragments(
+    fragments: List[Dict[str, Any]], flow_connections: List[Dict[str, Any]], workflow_name: str = ""
+) -> Dict[str, Any]:
+    """Merge step fragments into one workflow, wiring steps with the plan's flow connections.
+
+    Fragments are merged in step order whatever order they finished in, so the
+    result only depends on the fragments themselves.
+    """
+    nodes: List[Dict[str, Any]] = []
+    connections: Dict[str, Any] = {}
+    step_ends: Dict[int, Dict[str, str]] = {}
+    taken: set = set()
+    for fragment in sorted(fragments, key=lambda f: min(f["steps"], default=math.inf)):
+        fragment = _rename_fragment(fragment, taken)
+        nodes.extend(fragment["nodes"])
+        for source, outputs in fragment["connections"].items():
+            connections.setdefault(source, {}).update(outputs)
+        fragment_names = [n.get("name") for n in fragment["nodes"]]
+        for step in fragment["steps"]:
+            ends = fragment["step_nodes"].get(str(step)) or {}
+            entry = ends.get("entry") if ends.get("entry") in fragment_names else None
+            exit_ = ends.get("exit") if ends.get("exit") in fragment_names else None
+            if fragment_names and (entry or exit_ or len(fragment["steps"]) == 1):
+                step_ends[step] = {
+                    "entry": entry or exit_ or fragment_names[0],
+                    "exit": exit_ or entry or fragment_names[-1],
+                }
+
+    # Without flow connections in the plan, steps run one after the other
+    edges = [(c["from_step"], c["to_step"]) for c in flow_connections] or list(zip(sorted(step_ends), sorted(step_ends)[1:]))
+    for from_step, to_step in edges:
+        if from_step not in step_ends or to_step not in step_ends:
+            continue
+        source, target = step_ends[from_step]["exit"], step_ends[to_step]["entry"]
+        if source == target:
+            continue
+        branches = connections.setdefault(source, {}).setdefault("main", [[]])
+        if not branches:
+            branches.append([])
+        if not any(t.get("node") == target for t in branches[0]):
+            branches[0].append({"node": target, "type": "main", "index": 0})
+
+    return {"name": workflow_name or "Generated Workflow", "nodes": nodes, "connections": connections}
+
+
+def merged_config_message(workflow: Dict[str, Any], fragments: int) -> str:
+    return (
+        f"Generated the workflow from {fragments} step fragments in parallel.\n\n"
+        f"```json\n{json.dumps(workflow, indent=2, ensure_ascii=False)}\n```"
+    )
@@ -0,0 +1,191 @@
+import copy
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+JSON_PATCH_OPS = frozenset(("add", "remove", "replace", "move", "copy", "test"))
+NODE_OPS = frozenset(("add_node", "replace_node", "remove_node", "set_connections", "remove_connections"))
+
+
+class PatchError(ValueError):
+    """Raised when a patch cannot be applied to the current workflow."""
+
+
+def _parse_pointer(path: str) -> List[str]:
+    if path == "":
+        return []
+    if not path.startswith("/"):
+        raise PatchError(f"Invalid JSON pointer: {path!r}")
+    return [part.replace("~1", "/").replace("~0", "~") for part in path[1:].split("/")]
+
+
+def _child(container: Any, key: str, path: str) -> Any:
+    if isinstance(container, dict):
+        if key not in container:
+            raise PatchError(f"Path not found: {path}")
+        return container[key]
+    if isinstance(container, list):
+        index = _list_index(container, key, path, allow_end=False)
+        return container[index]
+    raise PatchError(f"Path not found: {path}")
+
+
+def _list_index(container: list, key: str, path: str, allow_end: bool) -> int:
+    if key == "-" and allow_end:
+        return len(container)
+    if not key.isdigit() or (len(key) > 1 and key.startswith("0")):
+        raise PatchError(f"Invalid array index in {path}")
+    index = int(key)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise PatchError(f"Array index out of range in {path}")
+    return index
+
+
+def _resolve_parent(document: Any, path: str):
+    parts = _parse_pointer(path)
+    if not parts:
+        raise PatchError("Operations on the document root are not supported")
+    parent = document
+    for part in parts[:-1]:
+        parent = _child(parent, part, path)
+    return parent, parts[-1]
+
+
+def _get(document: Any, path: str) -> Any:
+    value = document
+    for part in _parse_pointer(path):
+        value = _child(value, part, path)
+    return value
+
+
+def _add(document: Any, path: str, value: Any) -> None:
+    parent, key = _resolve_parent(document, path)
+    if isinstance(parent, dict):
+        parent[key] = value
+    elif isinstance(parent, list):
+        parent.insert(_list_index(parent, key, path, allow_end=True), value)
+    else:
+        raise PatchError(f"Cannot add to {path}")
+
+
+def _remove(document: Any, path: str) -> Any:
+    parent, key = _resolve_parent(document, path)
+    if isinstance(parent, dict):
+        if key not in parent:
+            raise PatchError(f"Path not found: {path}")
+        return parent.pop(key)
+    if isinstance(parent, list):
+        return parent.pop(_list_index(parent, key, path, allow_end=False))
+    raise PatchError(f"Cannot remove {path}")
+
+
+def _apply_json_patch_op(document: Any, operation: Dict[str, Any]) -> None:
+    """Apply one RFC 6902 operation in place."""
+    op, path = operation["op"], operation.get("path")
+    if path is None:
+        raise PatchError(f"Missing 'path' in {op} operation")
+    if op == "add":
+        _add(document, path, copy.deepcopy(operation["value"]))
+    elif op == "remove":
+        _remove(document, path)
+    elif op == "replace":
+        _remove(document, path)
+        _add(document, path, copy.deepcopy(operation["value"]))
+    elif op == "move":
+        _add(document, path, _remove(document, operation["from"]))
+    elif op == "copy":
+        _add(document, path, copy.deepcopy(_get(document, operation["from"])))
+    elif op == "test":
+        if _get(document, path) != operation["value"]:
+            raise PatchError(f"Test failed for {path}")
+
+
+def _node_index(workflow: Dict[str, Any], name: str) -> int:
+    for i, node in enumerate(workflow["nodes"]):
+        if node.get("name") == name:
+            return i
+    raise PatchError(f"Unknown node: {name!r}")
+
+
+def _drop_connections_to(workflow: Dict[str, Any], name: str) -> None:
+    connections = workflow["connections"]
+    connections.pop(name, None)
+    for outputs in connections.values():
+        for branches in outputs.values():
+            for branch in branches:
+                branch[:] = [t for t in branch if t.get("node") != name]
+
+
+def _apply_node_op(workflow: Dict[str, Any], operation: Dict[str, Any]) -> None:
+    """Apply one node-level operation in place, addressing nodes by name instead of index."""
+    op = operation["op"]
+    if op == "add_node":
+        node = copy.deepcopy(operation["node"])
+        if any(n.get("name") == node.get("name") for n in workflow["nodes"]):
+            raise PatchError(f"Node already exists: {node.get('name')!r}")
+        workflow["nodes"].append(node)
+    elif op == "replace_node":
+        index = _node_index(workflow, operation["name"])
+        node = copy.deepcopy(operation["node"])
+        new_name = node.setdefault("name", operation["name"])
+        workflow["nodes"][index] = {**workflow["nodes"][index], **node}
+        if new_name != operation["name"]:
+            _rename_in_connections(workflow, operation["name"], new_name)
+    elif op == "remove_node":
+        del workflow["nodes"][_node_index(workflow, operation["name"])]
+        _drop_connections_to(workflow, operation["name"])
+    elif op == "set_connections":
+        _node_index(workflow, operation["source"])
+        workflow["connections"][operation["source"]] = copy.deepcopy(operation["connections"])
+    elif op == "remove_connections":
+        workflow["connections"].pop(operation["source"], None)
+
+
+def _rename_in_connections(workflow: Dict[str, Any], old: str, new: str) -> None:
+    connections = workflow["connections"]
+    if old in connections:
+        connections[new] = connections.pop(old)
+    for outputs in connections.values():
+        for branches in outputs.values():
+            for branch in branches:
+                for target in branch:
+                    if target.get("node") == old:
+                        target["node"] = new
+
+
+def apply_workflow_patch(workflow: Dict[str, Any], operations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Apply a patch to a copy of the workflow, all or nothing.
+
+    `operations` may mix RFC 6902 operations (`add`, `remove`, `replace`, `move`,
+    `copy`, `test`) and node-level operations (`add_node`, `replace_node`,
+    `remove_node`, `set_connections`, `remove_connections`). Raises `PatchError`
+    if any operation does not apply.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise PatchError("Patch must be a non-empty list of operations")
+    patched = copy.deepcopy(workflow)
+    patched.setdefault("nodes", [])
+    patched.setdefault("connections", {})
+    for operation in operations:
+        if not isinstance(operation, dict) or "op" not in operation:
+            raise PatchError(f"Invalid operation: {operation!r}")
+        try:
+            if operation["op"] in JSON_PATCH_OPS:
+                _apply_json_patch_op(patched, operation)
+            elif operation["op"] in NODE_OPS:
+                _apply_node_op(patched, operation)
+            else:
+                raise PatchError(f"Unsupported operation: {operation['op']!r}")
+        except (KeyError, TypeError, AttributeError) as e:
+            raise PatchError(f"Malformed {operation['op']} operation: {e}") from e
+    return patched
+
+
+def is_patch(value: Any) -> bool:
+    """Whether a parsed JSON value looks like a list of patch operations."""
+    return (
+        isinstance(value, list)
+        and bool(value)
+        and all(isinstance(op, dict) and op.get("op") in JSON_PATCH_OPS | NODE_OPS for op in value)
+    )
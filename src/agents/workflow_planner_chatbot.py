@@ -15,6 +15,7 @@ from core.llm import get_model
 from core.settings import settings
 from agents.utils import send_custom_stream_data_workflow_plan
 from agents.prompts import WORKFLOW_PLANNING_PROMPT
+from agents.plan_parser import IncrementalPlanParser
 from agents.workflow_information import WORKFLOW_EXAMPLE_METADATA
 
 logger = logging.getLogger(__name__)
@@ -57,12 +58,19 @@ The user may want to modify, improve, or ask questions about this plan. Please r
     stream = llm.astream(input=input_messages)
     
     response_parts = []
+    parser = IncrementalPlanParser()
     async for chunk in stream:
         response_parts.append(chunk.content)
+        # Send each step to the UI as soon as its block is complete
+        for step in parser.feed(chunk.content):
+            send_custom_stream_data_workflow_plan(
+                writer,
+                data={"kind": "step", "workflow_name": parser.result["workflow_name"], "step": step},
+            )
     
     response_content = "".join(response_parts)
     try:
-        workflow_plan = regex_parse_workflow_plan(response_content)
+        workflow_plan = parser.finish()
     except Exception as e:
         logger.error(f"Error parsing workflow plan: {e}")
         workflow_plan = {"plan": response_content}
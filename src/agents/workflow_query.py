@@ -0,0 +1,246 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from agents.workflow_digest import WorkflowAnalysis, short_type
+
+logger = logging.getLogger(__name__)
+
+# Questions longer than this are rarely purely structural
+MAX_QUESTION_CHARS = 160
+
+# Anything asking for reasoning, opinions, comparisons or changes goes to the LLM
+_NEEDS_LLM = re.compile(
+    r"\b(why|explain|describe|purpose|improve|optimi[sz]e|should|could|would|better|recommend|suggest|fix|"
+    r"change|modify|add|remove|replace|compare|difference|secure|security|risk|cost|"
+    r"best|worst|cheap(?:er|est)?|expensive|fast(?:er|est)?|slow(?:er|est)?|quick(?:er|est)?|than|vs|versus|"
+    r"ok|okay|good|bad|fine|enough|right|wrong|prefer(?:red)?|ideal|suitable|appropriate|worth|pros|cons)\b"
+)
+_QUESTION = r"^(?:what|which|list|show|tell me|give me|where|who|how many)\b"
+# A second clause or question asks for more than one canned answer can give
+_COMPOUND = re.compile(r"\b(?:and|but|or|also|then)\b|[?;,].|\b(?:what|which|where|who|how|when)\b.*\b(?:what|which|where|who|how|when)\b")
+# List-style questions about the whole workflow, e.g. "what are the triggers", "which models are used"
+_LIST = r"^(?:(?:what|which) (?:are|is)|list|show(?: me)?|give me|tell me)(?: all)?(?: the| its)? "
+_IN_WORKFLOW = r"(?: (?:are |is )?(?:used|there))?(?: (?:in|of|for|by) (?:the|this) workflow)?\s*\??$"
+_TRIGGER_TERMS = r"(?:triggers?|trigger nodes?|entry points?|start(?:ing)? points?)"
+_MODEL_TERMS = r"(?:llms?|language models?|chat models?|ai models?|models?)"
+
+_INTENTS: List[Tuple[str, re.Pattern]] = [
+    ("count", re.compile(r"^how many (?:nodes|steps)\b")),
+    ("after", re.compile(_QUESTION + r".*?\b(?:after|follows?|following|next to|downstream of)\s+(?:the\s+)?(?P<node>.+?)(?:\s+node)?\s*\??$")),
+    ("before", re.compile(_QUESTION + r".*?\b(?:before|precedes?|preceding|upstream of|feeds?(?: into)?)\s+(?:the\s+)?(?P<node>.+?)(?:\s+node)?\s*\??$")),
+    ("uses", re.compile(_QUESTION + r".*?\bnodes?\b.*?\b(?:call|calls|use|uses|using|talk to|talks to|connect to|connects to)\s+(?:the\s+)?(?P<term>.+?)\s*\??$")),
+    ("triggers", re.compile(
+        _LIST + _TRIGGER_TERMS + _IN_WORKFLOW
+        + r"|^(?:how|what) (?:is|starts|triggers) (?:the|this) workflow(?: triggered| started)?\s*\??$"
+    )),
+    ("models", re.compile(
+        _LIST + _MODEL_TERMS + _IN_WORKFLOW
+        + r"|^(?:what|which) " + _MODEL_TERMS + r" (?:are|is|does (?:the|this) workflow) (?:used|use)" + _IN_WORKFLOW
+    )),
+    ("integrations", re.compile(_QUESTION + r".*\b(?:integrations?|external (?:services?|systems?|apis?)|third[- ]party|credentials?)\b")),
+    ("flow", re.compile(_QUESTION + r".*\b(?:data flow|execution order|order of (?:the )?nodes|paths?)\b")),
+    ("nodes", re.compile(_QUESTION + r".*\b(?:all (?:the )?nodes|nodes (?:are )?(?:in|of|used)|list (?:the )?nodes)\b")),
+]
+
+
+class FastPathStats:
+    """Hit-rate counters of the structural fast path, per process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits: Counter = Counter()
+        self.misses = 0
+        self.total_ms = 0.0
+
+    def record(self, intent: Optional[str], elapsed_ms: float) -> None:
+        with self._lock:
+            if intent is None:
+                self.misses += 1
+            else:
+                self.hits[intent] += 1
+                self.total_ms += elapsed_ms
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            hits = sum(self.hits.values())
+            total = hits + self.misses
+            return {
+                "questions": total,
+                "hits": hits,
+                "llm_fallbacks": self.misses,
+                "hit_rate": round(hits / total, 3) if total else 0.0,
+                "hits_by_intent": dict(self.hits),
+                "avg_hit_ms": round(self.total_ms / hits, 3) if hits else 0.0,
+            }
+
+
+FAST_PATH_STATS = FastPathStats()
+
+
+def match_structural_intent(question: str) -> Optional[Tuple[str, Dict[str, str]]]:
+    """Return `(intent, arguments)` if the question is purely structural, else None."""
+    text = " ".join(question.strip().lower().split())
+    if not text or len(text) > MAX_QUESTION_CHARS or _NEEDS_LLM.search(text) or _COMPOUND.search(text):
+        return None
+    for intent, pattern in _INTENTS:
+        match = pattern.search(text)
+        if match:
+            return intent, {k: v.strip(" '\"`") for k, v in match.groupdict().items() if v}
+    return None
+
+
+def _find_node(analysis: WorkflowAnalysis, text: str) -> Optional[str]:
+    """Resolve a node name mentioned in a question: exact, then longest contained, then prefix."""
+    by_lower = {name.lower(): name for name in analysis.nodes}
+    if text in by_lower:
+        return by_lower[text]
+    contained = [lower for lower in by_lower if lower and lower in text]
+    if contained:
+        return by_lower[max(contained, key=len)]
+    prefixed = [lower for lower in by_lower if lower.startswith(text)]
+    return by_lower[min(prefixed, key=len)] if len(text) >= 3 and prefixed else None
+
+
+def _label(analysis: WorkflowAnalysis, name: str) -> str:
+    return f"**{name}** ({short_type(analysis.nodes[name].get('type', ''))})"
+
+
+def _bullets(analysis: WorkflowAnalysis, names: List[str]) -> str:
+    return "\n".join(f"- {_label(analysis, name)}" for name in names)
+
+
+def _roots_of(analysis: WorkflowAnalysis, sub_node: str) -> List[str]:
+    return [root for root, subs in analysis.sub_nodes.items() if any(sub == sub_node for _, sub in subs)]
+
+
+def _answer_triggers(analysis: WorkflowAnalysis, args: Dict[str, str]) -> Optional[str]:
+    if not analysis.triggers:
+        return "This workflow has no trigger node, so it only runs when started manually or by another workflow."
+    return f"The workflow starts from {len(analysis.triggers)} trigger(s):\n{_bullets(analysis, analysis.triggers)}"
+
+
+def _answer_neighbours(analysis: WorkflowAnalysis, args: Dict[str, str], after: bool) -> Optional[str]:
+    name = _find_node(analysis, args.get("node", ""))
+    if name is None:
+        return None
+    if name not in analysis.order:
+        roots = _roots_of(analysis, name)
+        if not roots:
+            return None
+        return f"{_label(analysis, name)} is a sub-node, it is used by:\n{_bullets(analysis, roots)}"
+    neighbours = (analysis.children if after else analysis.parents).get(name, [])
+    if not neighbours:
+        return f"{_label(analysis, name)} is {'the last node of its branch' if after else 'a starting point'}, nothing runs {'after' if after else 'before'} it."
+    return f"{'After' if after else 'Before'} {_label(analysis, name)}:\n{_bullets(analysis, neighbours)}"
+
+
+def _answer_uses(analysis: WorkflowAnalysis, args: Dict[str, str]) -> Optional[str]:
+    term = re.sub(r"[^a-z0-9]", "", args.get("term", ""))
+    if len(term) < 2:
+        return None
+    matches = []
+    for name, node in analysis.nodes.items():
+        haystack = " ".join([name, node.get("type", ""), *(node.get("credentials") or {})])
+        if term in re.sub(r"[^a-z0-9 ]", "", haystack.lower()).replace(" ", ""):
+            matches.append(name)
+    if not matches:
+        # The term may be a concept ("a database") rather than a name, let the LLM answer
+        return None
+    lines = []
+    for name in matches:
+        roots = _roots_of(analysis, name)
+        lines.append(f"- {_label(analysis, name)}" + (f", used by {', '.join(roots)}" if roots else ""))
+    return f"{len(matches)} node(s) use {args['term']}:\n" + "\n".join(lines)
+
+
+def _answer_models(analysis: WorkflowAnalysis, args: Dict[str, str]) -> Optional[str]:
+    wiring = [
+        (root, sub) for root, subs in analysis.sub_nodes.items()
+        for connection_type, sub in subs if connection_type == "ai_languageModel"
+    ]
+    if not wiring:
+        return "No node of this workflow is connected to a language model."
+    by_model: Dict[str, List[str]] = {}
+    for root, sub in wiring:
+        by_model.setdefault(sub, []).append(root)
+    lines = []
+    for model, roots in by_model.items():
+        parameters = analysis.nodes[model].get("parameters") or {}
+        model_name = parameters.get("model") or parameters.get("modelName")
+        if isinstance(model_name, dict):
+            model_name = model_name.get("value")
+        suffix = f" `{model_name}`" if isinstance(model_name, str) and model_name else ""
+        lines.append(f"- {_label(analysis, model)}{suffix}, used by {', '.join(roots)}")
+    return f"The workflow uses {len(by_model)} language model node(s):\n" + "\n".join(lines)
+
+
+def _answer_integrations(analysis: WorkflowAnalysis, args: Dict[str, str]) -> Optional[str]:
+    if not analysis.integrations:
+        return "This workflow does not call any external service."
+    lines = []
+    for name in analysis.integrations:
+        credentials = analysis.nodes[name].get("credentials") or {}
+        lines.append(f"- {_label(analysis, name)}" + (f", credentials: {', '.join(credentials)}" if credentials else ""))
+    return f"The workflow talks to {len(analysis.integrations)} external service node(s):\n" + "\n".join(lines)
+
+
+def _answer_flow(analysis: WorkflowAnalysis, args: Dict[str, str]) -> Optional[str]:
+    if not analysis.order:
+        return "This workflow has no nodes."
+    text = "Nodes in execution order:\n" + "\n".join(
+        f"{i}. {_label(analysis, name)}" for i, name in enumerate(analysis.order, 1)
+    )
+    if analysis.paths:
+        text += "\n\nData-flow paths:\n" + "\n".join(f"- {' → '.join(path)}" for path in analysis.paths)
+    return text
+
+
+def _answer_nodes(analysis: WorkflowAnalysis, args: Dict[str, str]) -> Optional[str]:
+    sub_nodes = [name for name in analysis.nodes if name not in analysis.order and _roots_of(analysis, name)]
+    text = f"The workflow has {len(analysis.order)} node(s) in its data flow:\n{_bullets(analysis, analysis.order)}"
+    if sub_nodes:
+        text += f"\n\nand {len(sub_nodes)} AI sub-node(s):\n{_bullets(analysis, sub_nodes)}"
+    return text
+
+
+def _answer_count(analysis: WorkflowAnalysis, args: Dict[str, str]) -> Optional[str]:
+    sub_nodes = sum(1 for name in analysis.nodes if name not in analysis.order and _roots_of(analysis, name))
+    return (
+        f"The workflow has {len(analysis.order)} node(s) in its data flow"
+        + (f" plus {sub_nodes} AI sub-node(s)" if sub_nodes else "")
+        + (f" and {len(analysis.notes)} sticky note(s)" if analysis.notes else "")
+        + "."
+    )
+
+
+_ANSWERS: Dict[str, Callable[[WorkflowAnalysis, Dict[str, str]], Optional[str]]] = {
+    "triggers": _answer_triggers,
+    "after": lambda analysis, args: _answer_neighbours(analysis, args, after=True),
+    "before": lambda analysis, args: _answer_neighbours(analysis, args, after=False),
+    "uses": _answer_uses,
+    "models": _answer_models,
+    "integrations": _answer_integrations,
+    "flow": _answer_flow,
+    "nodes": _answer_nodes,
+    "count": _answer_count,
+}
+
+
+def answer_structural_question(analysis: WorkflowAnalysis, question: str) -> Optional[str]:
+    """Answer a structural question from the workflow index, or return None to fall through to the LLM."""
+    start = time.perf_counter()
+    matched = match_structural_intent(question)
+    answer = _ANSWERS[matched[0]](analysis, matched[1]) if matched else None
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    FAST_PATH_STATS.record(matched[0] if answer is not None else None, elapsed_ms)
+    if answer is not None:
+        logger.info(f"Answered structural question ({matched[0]}) without LLM in {elapsed_ms:.2f} ms")
+    return answer
+
+
+def get_fast_path_stats() -> Dict[str, object]:
+    return FAST_PATH_STATS.snapshot()
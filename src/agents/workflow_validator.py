@@ -0,0 +1,178 @@
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+LANGCHAIN_PREFIX = "@n8n/n8n-nodes-langchain."
+STICKY_NOTE_TYPE = "n8n-nodes-base.stickyNote"
+
+# Root nodes that cannot run without a chat model on their `ai_languageModel` input
+LLM_REQUIRED_TYPES = frozenset(
+    LANGCHAIN_PREFIX + t
+    for t in (
+        "agent",
+        "agentExecutor",
+        "chainLlm",
+        "chainRetrievalQa",
+        "chainSummarization",
+        "informationExtractor",
+        "sentimentAnalysis",
+        "textClassifier",
+    )
+)
+
+# Chat model inserted when an AI node has none, same as the one recommended in the prompt
+DEFAULT_CHAT_MODEL_NODE = {
+    "name": "Google Gemini Chat Model",
+    "type": LANGCHAIN_PREFIX + "lmChatGoogleGemini",
+    "typeVersion": 1,
+    "parameters": {"modelName": "models/gemini-2.5-flash", "options": {}},
+}
+
+
+@dataclass
+class WorkflowValidationReport:
+    """Outcome of `validate_and_repair_workflow`."""
+
+    repairs: List[str] = field(default_factory=list)
+    issues: List[str] = field(default_factory=list)
+
+    @property
+    def valid(self) -> bool:
+        return not self.issues
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"valid": self.valid, "repairs": self.repairs, "issues": self.issues}
+
+
+def is_chat_model(node_type: str) -> bool:
+    return node_type.startswith(LANGCHAIN_PREFIX + "lmChat") or node_type.startswith(LANGCHAIN_PREFIX + "lmOpenAi")
+
+
+def is_trigger(node_type: str) -> bool:
+    short_type = node_type.rsplit(".", 1)[-1].lower()
+    return "trigger" in short_type or short_type == "webhook"
+
+
+def _unique_name(name: str, taken: Set[str]) -> str:
+    i = 1
+    while f"{name} {i}" in taken:
+        i += 1
+    return f"{name} {i}"
+
+
+def _iter_targets(connections: Dict[str, Any]):
+    """Yield (source, connection_type, branch_list, target) for every connection target."""
+    for source, outputs in connections.items():
+        if not isinstance(outputs, dict):
+            continue
+        for connection_type, branches in outputs.items():
+            for branch in branches or []:
+                for target in list(branch or []):
+                    yield source, connection_type, branch, target
+
+
+def validate_and_repair_workflow(workflow: Dict[str, Any]) -> Tuple[Dict[str, Any], WorkflowValidationReport]:
+    """Check a generated n8n workflow for structural errors and repair what can be repaired.
+
+    Repaired: duplicate node names (renamed), connections from/to unknown nodes
+    (dropped), AI chain/agent nodes without a chat model (wired to an existing chat
+    model, or to a newly inserted one). Reported only: unreachable nodes, missing
+    trigger, output parsers that feed nothing.
+    """
+    report = WorkflowValidationReport()
+    nodes = [dict(node) for node in workflow.get("nodes", []) if isinstance(node, dict)]
+    connections: Dict[str, Any] = {
+        source: {t: [list(b or []) for b in branches or []] for t, branches in outputs.items()}
+        for source, outputs in (workflow.get("connections") or {}).items()
+        if isinstance(outputs, dict)
+    }
+
+    # Duplicate names: connections can only refer to the first node with a name
+    names: Set[str] = set()
+    for node in nodes:
+        name = node.get("name") or node.get("type", "Node").rsplit(".", 1)[-1]
+        if name in names:
+            new_name = _unique_name(name, names)
+            report.repairs.append(f"Renamed duplicate node '{name}' to '{new_name}'")
+            name = new_name
+        node["name"] = name
+        names.add(name)
+
+    # Dangling sources and targets
+    for source in [s for s in connections if s not in names]:
+        report.repairs.append(f"Removed connections from unknown node '{source}'")
+        del connections[source]
+    for source, connection_type, branch, target in list(_iter_targets(connections)):
+        target_name = target.get("node") if isinstance(target, dict) else None
+        if target_name not in names:
+            branch.remove(target)
+            report.repairs.append(f"Removed connection '{source}' -> unknown node '{target_name}'")
+
+    # AI nodes without a chat model
+    has_model = {
+        target["node"]
+        for _, connection_type, _, target in _iter_targets(connections)
+        if connection_type == "ai_languageModel"
+    }
+    by_name = {node["name"]: node for node in nodes}
+    missing = [n["name"] for n in nodes if n.get("type") in LLM_REQUIRED_TYPES and n["name"] not in has_model]
+    if missing:
+        model_name = next((n["name"] for n in nodes if is_chat_model(n.get("type", ""))), None)
+        if model_name is None:
+            model = dict(DEFAULT_CHAT_MODEL_NODE)
+            if model["name"] in names:
+                model["name"] = _unique_name(model["name"], names)
+            model_name = model["name"]
+            nodes.append(model)
+            names.add(model_name)
+            by_name[model_name] = model
+            report.repairs.append(f"Inserted chat model node '{model_name}'")
+        outputs = connections.setdefault(model_name, {}).setdefault("ai_languageModel", [[]])
+        if not outputs:
+            outputs.append([])
+        for name in missing:
+            outputs[0].append({"node": name, "type": "ai_languageModel", "index": 0})
+            report.repairs.append(f"Connected '{model_name}' to AI node '{name}' via ai_languageModel")
+
+    # Output parsers that feed nothing
+    parser_sources = {
+        source for source, connection_type, _, _ in _iter_targets(connections)
+        if connection_type == "ai_outputParser"
+    }
+    for node in nodes:
+        if node.get("type", "").startswith(LANGCHAIN_PREFIX + "outputParser") and node["name"] not in parser_sources:
+            report.issues.append(f"Output parser '{node['name']}' is not connected to any chain via ai_outputParser")
+
+    # Reachability from triggers over main connections; sub-nodes hang off their root
+    main_edges: Dict[str, List[str]] = {}
+    sub_node_sources: Set[str] = set()
+    for source, connection_type, _, target in _iter_targets(connections):
+        if connection_type == "main":
+            main_edges.setdefault(source, []).append(target["node"])
+        else:
+            sub_node_sources.add(source)
+    flow_nodes = [
+        n["name"] for n in nodes
+        if n.get("type") != STICKY_NOTE_TYPE and n["name"] not in sub_node_sources
+    ]
+    triggers = [name for name in flow_nodes if is_trigger(by_name[name].get("type", ""))]
+    if flow_nodes and not triggers:
+        report.issues.append("Workflow has no trigger node")
+    else:
+        reached = set(triggers)
+        queue = deque(triggers)
+        while queue:
+            for target in main_edges.get(queue.popleft(), []):
+                if target not in reached:
+                    reached.add(target)
+                    queue.append(target)
+        for name in flow_nodes:
+            if name not in reached:
+                report.issues.append(f"Node '{name}' is not reachable from any trigger")
+
+    if report.repairs or report.issues:
+        logger.info(f"Workflow validation: {len(report.repairs)} repair(s), {len(report.issues)} issue(s)")
+    return {**workflow, "nodes": nodes, "connections": connections}, report
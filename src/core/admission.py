@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+from core.llm import llm_call_key
+
+logger = logging.getLogger(__name__)
+
+# Wait times kept per lane for the percentiles of the metrics
+WAIT_SAMPLES = 1024
+
+
+class AdmissionRejected(Exception):
+    """A call was not admitted; `status_code` is 429 when the queue is full, 503 on a queue timeout."""
+
+    def __init__(self, key: str, status_code: int, retry_after: int, reason: str):
+        super().__init__(f"{key}: {reason}")
+        self.key = key
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class _Lane:
+    """Concurrency slots and FIFO wait queue of one provider/model."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.waiters: deque[asyncio.Future] = deque()
+        self.max_queued = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.waits: deque[float] = deque(maxlen=WAIT_SAMPLES)
+        # Moving average of how long a slot is held, for Retry-After
+        self.hold_seconds = 1.0
+
+
+class AdmissionSlot:
+    """A slot held by one call, release it exactly once (extra releases are ignored)."""
+
+    def __init__(self, controller: "AdmissionController", key: str, wait_seconds: float):
+        self._controller = controller
+        self.key = key
+        self.wait_seconds = wait_seconds
+        self._acquired_at = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._controller._release(self.key, time.monotonic() - self._acquired_at)
+
+    async def __aenter__(self) -> "AdmissionSlot":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.release()
+
+
+class AdmissionController:
+    """Bounded concurrency per provider/model with a bounded, timed wait queue.
+
+    At most `limit` calls of a key run at once, the next `max_queue` wait in
+    FIFO order for at most `queue_timeout` seconds. Calls beyond the queue are
+    rejected at once, so a burst fails fast instead of stacking up on the
+    provider. Limits are looked up by `provider/model`, then by `provider`.
+    """
+
+    def __init__(self, limits: dict[str, int], default_limit: int, max_queue: int, queue_timeout: float):
+        self.limits = limits
+        self.default_limit = default_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lanes: dict[str, _Lane] = {}
+
+    def _lane(self, key: str) -> _Lane:
+        lane = self._lanes.get(key)
+        if lane is None:
+            provider = key.split("/", 1)[0]
+            limit = self.limits.get(key) or self.limits.get(provider) or self.default_limit
+            lane = self._lanes[key] = _Lane(max(1, limit))
+        return lane
+
+    def _retry_after(self, lane: _Lane) -> int:
+        """Seconds until the queue has likely drained by one slot per waiter."""
+        return max(1, math.ceil(lane.hold_seconds * (len(lane.waiters) + 1) / lane.limit))
+
+    def check(self, key: str) -> None:
+        """Fail fast with a 429 when the wait queue of `key` is full, without taking a slot."""
+        lane = self._lane(key)
+        if len(lane.waiters) >= self.max_queue:
+            lane.rejected_queue_full += 1
+            raise AdmissionRejected(key, 429, self._retry_after(lane), "too many queued requests")
+
+    async def acquire(self, key: str) -> AdmissionSlot:
+        lane = self._lane(key)
+        if lane.active < lane.limit and not lane.waiters:
+            lane.active += 1
+            lane.admitted += 1
+            lane.waits.append(0.0)
+            return AdmissionSlot(self, key, 0.0)
+        if len(lane.waiters) >= self.max_queue:
+            lane.rejected_queue_full += 1
+            raise AdmissionRejected(key, 429, self._retry_after(lane), "too many queued requests")
+
+        start = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        lane.waiters.append(waiter)
+        lane.max_queued = max(lane.max_queued, len(lane.waiters))
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over while timing out, pass it on
+                self._release(key, None)
+            else:
+                waiter.cancel()
+                lane.waiters.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            lane.rejected_timeout += 1
+            raise AdmissionRejected(key, 503, self._retry_after(lane), "timed out waiting for a slot") from None
+        wait = time.monotonic() - start
+        lane.admitted += 1
+        lane.waits.append(wait)
+        return AdmissionSlot(self, key, wait)
+
+    def _release(self, key: str, held_seconds: float | None) -> None:
+        lane = self._lanes[key]
+        if held_seconds is not None:
+            lane.hold_seconds = 0.8 * lane.hold_seconds + 0.2 * held_seconds
+        # The slot goes straight to the oldest waiter, so queued calls are not overtaken
+        while lane.waiters:
+            waiter = lane.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        lane.active -= 1
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        stats = {}
+        for key, lane in self._lanes.items():
+            waits = sorted(lane.waits)
+            stats[key] = {
+                "limit": lane.limit,
+                "active": lane.active,
+                "queued": len(lane.waiters),
+                "max_queued": lane.max_queued,
+                "admitted": lane.admitted,
+                "rejected_queue_full": lane.rejected_queue_full,
+                "rejected_timeout": lane.rejected_timeout,
+                "avg_wait_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                "p95_wait_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0.0,
+                "max_wait_ms": round(waits[-1] * 1000, 1) if waits else 0.0,
+                "avg_hold_s": round(lane.hold_seconds, 2),
+            }
+        return stats
+
+
+class AdmissionCallback(AsyncCallbackHandler):
+    """Hold a slot of the called provider/model for the duration of each chat model call of a run.
+
+    Calls made in parallel by one run (e.g. step fragments) each take their own
+    slot. A rejected call raises `AdmissionRejected` instead of reaching the provider.
+    """
+
+    raise_error = True
+
+    def __init__(self, controller: AdmissionController, default_key: str):
+        self.controller = controller
+        self.default_key = default_key
+        self._slots: dict[UUID, AdmissionSlot] = {}
+
+    async def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: Any,
+        *,
+        run_id: UUID,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        key = llm_call_key(metadata, kwargs.get("invocation_params"), self.default_key)
+        self._slots[run_id] = await self.controller.acquire(key)
+
+    def _release(self, run_id: UUID) -> None:
+        slot = self._slots.pop(run_id, None)
+        if slot is not None:
+            slot.release()
+
+    async def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._release(run_id)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._release(run_id)
+
+    def release_all(self) -> None:
+        """Release the slots of calls that never reported their end, e.g. of a cancelled run."""
+        for run_id in list(self._slots):
+            self._release(run_id)
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+
+from core.llm import llm_call_key
+from core.tokens import estimate_tokens, estimate_tokens_cached
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 60
+# Per-message overhead of chat formats (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_prompt_tokens(messages: list[BaseMessage]) -> int:
+    """Tokens of a chat prompt; system prompts and templates repeat, so segments are memoized."""
+    total = 0
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        total += estimate_tokens_cached(content) + MESSAGE_OVERHEAD_TOKENS
+    return total
+
+
+class TokenBudget:
+    """Tokens-per-minute and requests-per-minute budget per provider/model, shared by all workers.
+
+    Every call reserves its estimated tokens in a sliding one-minute ledger kept
+    in SQLite, so workers of the same host share one budget. A call that does not
+    fit waits until enough of the window has expired instead of hitting the
+    provider limit; after `max_delay` seconds it goes through anyway. The
+    reservation is corrected with the real usage when the call ends. Calls are
+    blocking, run them off the event loop.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        tpm_limits: dict[str, int],
+        rpm_limits: dict[str, int],
+        completion_tokens: int,
+        max_delay: float,
+    ):
+        self.path = path
+        self.tpm_limits = tpm_limits
+        self.rpm_limits = rpm_limits
+        self.completion_tokens = completion_tokens
+        self.max_delay = max_delay
+        self.stats = {"reserved": 0, "delayed": 0, "delay_s": 0.0, "over_budget": 0, "reconciled": 0, "estimate_error_tokens": 0}
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS token_budget (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL,
+                ts REAL NOT NULL,
+                tokens INTEGER NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS token_budget_key_ts ON token_budget (key, ts)")
+
+    def _limit(self, limits: dict[str, int], key: str) -> int | None:
+        return limits.get(key) or limits.get(key.split("/", 1)[0])
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.tpm_limits or self.rpm_limits)
+
+    def is_limited(self, key: str) -> bool:
+        return bool(self._limit(self.tpm_limits, key) or self._limit(self.rpm_limits, key))
+
+    def try_reserve(self, key: str, tokens: int) -> tuple[int | None, float]:
+        """Reserve `tokens` now; return `(reservation id, 0)` or `(None, seconds to wait)`."""
+        tpm = self._limit(self.tpm_limits, key)
+        rpm = self._limit(self.rpm_limits, key)
+        # A prompt larger than the whole budget runs alone in an empty window
+        tokens = min(tokens, tpm) if tpm else tokens
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM token_budget WHERE ts < ?", (now - WINDOW_SECONDS,))
+                rows = self._conn.execute(
+                    "SELECT ts, tokens FROM token_budget WHERE key = ? ORDER BY ts", (key,)
+                ).fetchall()
+                used = sum(t for _, t in rows)
+                wait = 0.0
+                if rpm and len(rows) + 1 > rpm:
+                    wait = rows[len(rows) - rpm][0] + WINDOW_SECONDS - now
+                if tpm and used + tokens > tpm:
+                    # Wait until the oldest reservations have freed enough tokens
+                    freed = 0
+                    for ts, reserved in rows:
+                        freed += reserved
+                        if used - freed + tokens <= tpm:
+                            wait = max(wait, ts + WINDOW_SECONDS - now)
+                            break
+                if wait > 0:
+                    self._conn.execute("COMMIT")
+                    return None, wait
+                reservation = self._conn.execute(
+                    "INSERT INTO token_budget (key, ts, tokens) VALUES (?, ?, ?)", (key, now, tokens)
+                ).lastrowid
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self.stats["reserved"] += 1
+        return reservation, 0.0
+
+    def force_reserve(self, key: str, tokens: int) -> int:
+        with self._lock:
+            self.stats["over_budget"] += 1
+            return self._conn.execute(
+                "INSERT INTO token_budget (key, ts, tokens) VALUES (?, ?, ?)", (key, time.time(), tokens)
+            ).lastrowid
+
+    def reconcile(self, reservation: int, estimated: int, actual: int) -> None:
+        """Replace the estimate of a call with its real usage."""
+        with self._lock:
+            self._conn.execute("UPDATE token_budget SET tokens = ? WHERE id = ?", (actual, reservation))
+            self.stats["reconciled"] += 1
+            self.stats["estimate_error_tokens"] += actual - estimated
+
+    async def reserve(self, key: str, tokens: int) -> int:
+        """Reserve budget for a call, sleeping while the window is full."""
+        start = time.monotonic()
+        delayed = False
+        while True:
+            reservation, wait = await asyncio.to_thread(self.try_reserve, key, tokens)
+            if reservation is not None:
+                break
+            waited = time.monotonic() - start
+            if waited + wait > self.max_delay:
+                logger.warning(f"Token budget of {key} still full after {waited:.1f}s, sending the call anyway")
+                reservation = await asyncio.to_thread(self.force_reserve, key, tokens)
+                break
+            delayed = True
+            await asyncio.sleep(wait)
+        if delayed:
+            delay = time.monotonic() - start
+            self.stats["delayed"] += 1
+            self.stats["delay_s"] += delay
+            logger.info(f"Delayed a {tokens} token call of {key} by {delay:.1f}s to stay under its budget")
+        return reservation
+
+    def snapshot(self) -> dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, COUNT(*), COALESCE(SUM(tokens), 0) FROM token_budget WHERE ts >= ? GROUP BY key",
+                (now - WINDOW_SECONDS,),
+            ).fetchall()
+            stats = dict(self.stats)
+        stats["delay_s"] = round(stats["delay_s"], 3)
+        stats["window"] = {
+            key: {
+                "requests": requests,
+                "tokens": tokens,
+                "rpm_limit": self._limit(self.rpm_limits, key),
+                "tpm_limit": self._limit(self.tpm_limits, key),
+            }
+            for key, requests, tokens in rows
+        }
+        return stats
+
+
+def _usage_tokens(response: LLMResult) -> int | None:
+    """Total tokens reported by the provider, None if it did not report usage."""
+    total = 0
+    found = False
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                total += usage.get("total_tokens", 0)
+                found = True
+    if not found:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage.get("total_tokens"):
+            return usage["total_tokens"]
+    return total if found else None
+
+
+class TokenBudgetCallback(AsyncCallbackHandler):
+    """Reserve budget before each chat model call of a run and reconcile it after.
+
+    Each call is charged to the provider/model it calls, `default_key` only
+    when the call does not name its model.
+    """
+
+    # Inline handlers finish before the others start: a call sleeping for budget must not hold an admission slot
+    run_inline = True
+
+    def __init__(self, budget: TokenBudget, default_key: str):
+        self.budget = budget
+        self.default_key = default_key
+        self._reservations: dict[UUID, tuple[int, int]] = {}
+
+    async def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: list[list[BaseMessage]],
+        *,
+        run_id: UUID,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        key = llm_call_key(metadata, kwargs.get("invocation_params"), self.default_key)
+        if not self.budget.is_limited(key):
+            return
+        estimated = sum(estimate_prompt_tokens(prompt) for prompt in messages) + self.budget.completion_tokens
+        self._reservations[run_id] = (await self.budget.reserve(key, estimated), estimated)
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        reservation = self._reservations.pop(run_id, None)
+        if reservation is None:
+            return
+        reservation_id, estimated = reservation
+        actual = _usage_tokens(response)
+        if actual is None:
+            # Streaming without usage reporting, count the generated text instead
+            prompt = estimated - self.budget.completion_tokens
+            actual = prompt + sum(estimate_tokens(g.text) for gs in response.generations for g in gs)
+        await asyncio.to_thread(self.budget.reconcile, reservation_id, estimated, actual)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        # A failed call still spent its prompt at the provider, keep the estimate
+        self._reservations.pop(run_id, None)
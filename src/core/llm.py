@@ -23,6 +23,7 @@ from schema.models import (
     OllamaModelName,
     OpenAICompatibleName,
     OpenAIModelName,
+    Provider,
     VertexAIModelName,
 )
 
@@ -40,6 +41,72 @@ _MODEL_TABLE = (
     | {m: m.value for m in FakeModelName}
 )
 
+_PROVIDER_TABLE = {
+    OpenAIModelName: Provider.OPENAI,
+    OpenAICompatibleName: Provider.OPENAI_COMPATIBLE,
+    AzureOpenAIModelName: Provider.AZURE_OPENAI,
+    DeepseekModelName: Provider.DEEPSEEK,
+    AnthropicModelName: Provider.ANTHROPIC,
+    GoogleModelName: Provider.GOOGLE,
+    VertexAIModelName: Provider.VERTEXAI,
+    GroqModelName: Provider.GROQ,
+    AWSModelName: Provider.AWS,
+    OllamaModelName: Provider.OLLAMA,
+    FakeModelName: Provider.FAKE,
+}
+
+
+# `ls_provider` reported by LangChain chat models
+_LS_PROVIDERS = {
+    "openai": Provider.OPENAI,
+    "azure": Provider.AZURE_OPENAI,
+    "anthropic": Provider.ANTHROPIC,
+    "google_genai": Provider.GOOGLE,
+    "google_vertexai": Provider.VERTEXAI,
+    "groq": Provider.GROQ,
+    "amazon_bedrock": Provider.AWS,
+    "ollama": Provider.OLLAMA,
+}
+
+# API model name -> models using it (e.g. OpenAI-compatible APIs share names)
+_API_MODEL_NAMES: dict[str, list[AllModelEnum]] = {}
+for _model, _api_model_name in _MODEL_TABLE.items():
+    _API_MODEL_NAMES.setdefault(_api_model_name, []).append(_model)
+
+
+def get_provider(model_name: AllModelEnum, /) -> Provider:
+    provider = _PROVIDER_TABLE.get(type(model_name))
+    if provider is None:
+        raise ValueError(f"Unsupported model: {model_name}")
+    return provider
+
+
+def model_key(model_name: AllModelEnum, /) -> str:
+    """`provider/model` key of a model, used by admission control, token budgets and metrics."""
+    return f"{get_provider(model_name)}/{model_name}"
+
+
+def llm_call_key(metadata: dict | None, invocation_params: dict | None, default: str) -> str:
+    """`provider/model` key of one chat model call, from what LangChain passes to callbacks.
+
+    The model comes from the `ls_model_name`/`ls_provider` metadata of the call,
+    or its invocation params; `default` is used when neither names a model.
+    """
+    metadata = metadata or {}
+    params = invocation_params or {}
+    name = metadata.get("ls_model_name") or params.get("model") or params.get("model_name")
+    if not name:
+        return default
+    ls_provider = metadata.get("ls_provider") or ""
+    provider = _LS_PROVIDERS.get(ls_provider)
+    candidates = _API_MODEL_NAMES.get(str(name), [])
+    for model in candidates:
+        if get_provider(model) == provider:
+            return model_key(model)
+    if candidates:
+        return model_key(candidates[0])
+    return f"{provider or ls_provider or 'unknown'}/{name}"
+
 
 class FakeToolModel(FakeListChatModel):
     def __init__(self, responses: list[str]):
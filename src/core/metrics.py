@@ -0,0 +1,206 @@
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Callable
+from functools import wraps
+from typing import Any
+
+from core.tracing import span
+
+# Latency buckets in seconds, from a cache hit to a long config generation
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+RATE_BUCKETS = (1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400)
+
+
+def _format_labels(labelnames: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Sharded:
+    """Per-thread shards of a metric: writers only touch their own thread's dict.
+
+    The lock is only taken when a thread writes to a metric for the first time
+    and when the shards are merged for a scrape, so observations never contend.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._local = threading.local()
+        self._shards: list[dict[tuple, Any]] = []
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _shard(self) -> dict[tuple, Any]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def _key(self, labels: dict[str, Any]) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+
+class Counter(_Sharded):
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def collect(self) -> dict[tuple, float]:
+        totals: dict[tuple, float] = {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for key, value in list(shard.items()):
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Sharded):
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...], buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        shard = self._shard()
+        key = self._key(labels)
+        counts = shard.get(key)
+        if counts is None:
+            # One slot per bucket plus +Inf, then sum and count
+            counts = shard[key] = [0] * (len(self.buckets) + 3)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def time(self, **labels: Any) -> "_Timer":
+        return _Timer(self, labels)
+
+    def render(self) -> list[str]:
+        merged: dict[tuple, list] = {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for key, counts in list(shard.items()):
+                total = merged.setdefault(key, [0] * len(counts))
+                for i, count in enumerate(list(counts)):
+                    total[i] += count
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, counts in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = f'le="{bound if bound == "+Inf" else _format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(counts[-2])}")
+            lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: dict[str, Any]):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._histogram.observe(time.perf_counter() - self._start, **self._labels)
+
+
+class Gauge:
+    """A gauge read from a callback at scrape time, returning `{label values: value}`."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...], read: Callable[[], dict[tuple, float]]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.read = read
+        REGISTRY.append(self)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for key, value in sorted(self.read().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+REGISTRY: list[Any] = []
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines: list[str] = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+REQUESTS = Counter("agent_requests_total", "Agent runs by outcome.", ("agent", "mode", "status"))
+REQUEST_SECONDS = Histogram("agent_request_duration_seconds", "Duration of agent runs.", ("agent", "mode"))
+FIRST_TOKEN_SECONDS = Histogram(
+    "agent_time_to_first_token_seconds", "Time from the start of a stream to its first token.", ("agent",)
+)
+TOKENS_PER_SECOND = Histogram(
+    "agent_stream_tokens_per_second", "Streamed tokens per second after the first token.", ("agent",), RATE_BUCKETS
+)
+SSE_BYTES = Counter("sse_bytes_sent_total", "Bytes of SSE and NDJSON frames sent.", ("agent",))
+NODE_SECONDS = Histogram("graph_node_duration_seconds", "Duration of LangGraph node runs.", ("agent", "node"))
+LLM_SECONDS = Histogram("llm_call_duration_seconds", "Duration of chat model calls.", ("model",))
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported in the usage metadata of chat model calls.", ("model", "kind"))
+CHECKPOINT_SECONDS = Histogram("checkpoint_operation_seconds", "Latency of checkpointer reads and writes.", ("operation",))
+THREAD_INDEX_WRITE_SECONDS = Histogram("thread_index_write_seconds", "Latency of thread index batch writes.", ())
+
+
+_CHECKPOINT_OPERATIONS = ("aget_tuple", "alist", "aput", "aput_writes")
+
+
+def instrument_checkpointer(saver: Any) -> Any:
+    """Time the async reads and writes of a LangGraph checkpointer in place, and trace them except `alist`."""
+    for operation in _CHECKPOINT_OPERATIONS:
+        method = getattr(saver, operation, None)
+        if method is None:
+            continue
+        if operation == "alist":
+            # An async generator: time until it is exhausted
+            def timed_list(*args: Any, _method: Callable = method, **kwargs: Any) -> Any:
+                async def iterate():
+                    with CHECKPOINT_SECONDS.time(operation="alist"):
+                        async for item in _method(*args, **kwargs):
+                            yield item
+                return iterate()
+
+            setattr(saver, operation, timed_list)
+        else:
+            def make_timed(_method: Callable, _operation: str) -> Callable:
+                @wraps(_method)
+                async def timed(*args: Any, **kwargs: Any) -> Any:
+                    with CHECKPOINT_SECONDS.time(operation=_operation), span(f"checkpoint.{_operation}"):
+                        return await _method(*args, **kwargs)
+                return timed
+
+            setattr(saver, operation, make_timed(method, operation))
+    return saver
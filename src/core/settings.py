@@ -94,7 +94,74 @@ class Settings(BaseSettings):
         DatabaseType.SQLITE
     )  # Options: DatabaseType.SQLITE or DatabaseType.POSTGRES
     SQLITE_DB_PATH: str = "checkpoints.db"
+    # Legacy user -> threads JSON file, imported once into the thread index
     INMEMORY_STORE_FILE_PATH: str = "inmemory_store.json"
+    # User -> threads index; turns are written in batches every THREAD_INDEX_FLUSH_SECONDS
+    THREAD_INDEX_PATH: str = "thread_index.db"
+    THREAD_INDEX_FLUSH_SECONDS: float = 0.5
+
+    # Content-addressed store of uploaded workflows (PUT /workflows)
+    WORKFLOW_STORE_PATH: str = "workflow_store"
+    WORKFLOW_STORE_CACHE_SIZE: int = 64
+
+    # Token frames of SSE streams are coalesced per time window or byte threshold
+    SSE_TOKEN_FLUSH_MS: int = 30
+    SSE_TOKEN_FLUSH_BYTES: int = 1024
+    SSE_MAX_TOKEN_FLUSH_MS: int = 500
+    SSE_MAX_BUFFERED_BYTES: int = 16 * 1024
+    SSE_MAX_PENDING_EVENTS: int = 256
+
+    # Streams whose client went away are cancelled within this delay
+    RUN_DISCONNECT_POLL_SECONDS: float = 0.5
+
+    # Admission control of LLM calls: concurrent calls per "provider/model" or "provider"
+    # (e.g. {"azure_openai": 8, "openai/gpt-4o": 4}), then a bounded FIFO queue
+    LLM_CONCURRENCY_LIMITS: dict[str, int] = {}
+    LLM_DEFAULT_CONCURRENCY: int = 16
+    LLM_ADMISSION_MAX_QUEUE: int = 64
+    LLM_ADMISSION_TIMEOUT_SECONDS: float = 10.0
+
+    # Tokens/requests per minute budget per "provider/model" or "provider", shared by the
+    # workers of a host; calls over budget are delayed up to LLM_BUDGET_MAX_DELAY_SECONDS
+    LLM_TPM_LIMITS: dict[str, int] = {}
+    LLM_RPM_LIMITS: dict[str, int] = {}
+    LLM_BUDGET_PATH: str = "llm_budget.db"
+    LLM_BUDGET_COMPLETION_TOKENS: int = 1024
+    LLM_BUDGET_MAX_DELAY_SECONDS: float = 30.0
+
+    # Tracing of agent runs: share of runs traced, decided per run_id (0 disables tracing),
+    # and the JSONL file the spans are appended to
+    TRACE_SAMPLE_RATE: float = 0.0
+    TRACE_EXPORT_PATH: str = "traces.jsonl"
+
+    # Profiles of requests sent with `X-Profile: cpu|mem` (only when AUTH_SECRET is set)
+    PROFILE_DIR: str = "profiles"
+    PROFILE_MAX_KEPT: int = 100
+    PROFILE_CPU_INTERVAL_MS: float = 5.0
+
+    # Batch endpoints: items per request, items run at once per batch, runs per item
+    BATCH_MAX_ITEMS: int = 200
+    BATCH_MAX_PARALLEL: int = 4
+    BATCH_MAX_ATTEMPTS: int = 3
+    BATCH_RETRY_BASE_SECONDS: float = 1.0
+
+    # Exact-match response cache of the explain and config generator agents
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_PATH: str = "response_cache.db"
+    RESPONSE_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    RESPONSE_CACHE_MAX_ENTRIES: int = 5000
+    RESPONSE_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+
+    # Workflow template retrieval
+    TEMPLATE_INDEX_PATH: str = "template_index.npz"
+    TEMPLATE_TOP_K: int = 2
+
+    # Plans with at least this many steps are generated per step cluster in parallel
+    PARALLEL_GENERATION_MIN_STEPS: int = 10
+    PARALLEL_GENERATION_CLUSTER_SIZE: int = 2
+    PARALLEL_GENERATION_MAX_CONCURRENCY: int = 4
+    # A step cluster is retried once after an error or timeout, then the plan is generated in one call
+    PARALLEL_GENERATION_FRAGMENT_TIMEOUT_SECONDS: float = 120.0
     
     # PostgreSQL Configuration
     POSTGRES_USER: str | None = None
@@ -0,0 +1,34 @@
+import logging
+from functools import cache, lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Average characters per token for English/JSON text, used when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+
+@cache
+def _get_encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:  # tiktoken missing or encoding file not downloadable
+        logger.warning(f"tiktoken unavailable, falling back to character estimate: {e}")
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens of `text` for OpenAI-style tokenizers."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+@lru_cache(maxsize=1024)
+def estimate_tokens_cached(text: str) -> int:
+    """Same as `estimate_tokens`, memoized for static prompt segments and templates."""
+    return estimate_tokens(text)
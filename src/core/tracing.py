@@ -0,0 +1,157 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+from uuid import UUID, uuid4
+
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Span of the running code, children started with `span()` nest under it
+_current: ContextVar["Span | None"] = ContextVar("current_span", default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str = field(default_factory=lambda: uuid4().hex[:16])
+    parent_id: str | None = None
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: int | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    events: list[dict[str, Any]] = field(default_factory=list)
+    error: str | None = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def event(self, name: str, **attributes: Any) -> None:
+        self.events.append({"name": name, "timeUnixNano": time.time_ns(), "attributes": attributes})
+
+    def to_dict(self) -> dict[str, Any]:
+        """The span with the field names of OTLP/JSON."""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": {"code": "ERROR", "message": self.error} if self.error else {"code": "OK"},
+        }
+
+
+class JsonlExporter:
+    """Append finished spans to a JSONL file, one span per line, from a background thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        self._queue.put(span)
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                batch = [self._queue.get()]
+                # Spans that finished meanwhile go out in the same write
+                while not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                stop = None in batch
+                try:
+                    f.write("".join(json.dumps(s.to_dict(), default=str) + "\n" for s in batch if s is not None))
+                    f.flush()
+                except Exception as e:
+                    logger.error(f"Error exporting spans to {self.path}: {e}")
+                if stop:
+                    return
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write the spans still queued and stop the export thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+
+class Tracer:
+    """Spans of agent runs, the run_id of a run being its trace id.
+
+    Sampling is decided once per trace from its id: spans of an unsampled trace
+    are never created, so `span()` only costs a context variable lookup.
+    """
+
+    def __init__(self, exporter: JsonlExporter, sample_rate: float):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def sampled(self, trace_id: UUID) -> bool:
+        # Deterministic, every worker keeps or drops the same traces
+        return self.sample_rate > 0 and (trace_id.int >> 96) < self.sample_rate * 2**32
+
+    def start_trace(self, trace_id: UUID, name: str, **attributes: Any) -> Span | None:
+        """Start the root span of a trace and make it current, None if the trace is not sampled."""
+        root = Span(name, trace_id=trace_id.hex, attributes=attributes) if self.sampled(trace_id) else None
+        _current.set(root)
+        return root
+
+    def start_span(self, name: str, parent: Span | None, **attributes: Any) -> Span | None:
+        if parent is None:
+            return None
+        return Span(name, trace_id=parent.trace_id, parent_id=parent.span_id, attributes=attributes)
+
+    def end(self, span: Span | None, error: BaseException | None = None) -> None:
+        if span is None or span.end_ns is not None:
+            return
+        span.end_ns = time.time_ns()
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        self.exporter.export(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span | None]:
+        """A child of the current span around a block of code, yields None outside of sampled traces."""
+        parent = _current.get()
+        if parent is None or parent.end_ns is not None:
+            yield None
+            return
+        child = self.start_span(name, parent, **attributes)
+        token = _current.set(child)
+        try:
+            yield child
+        except BaseException as e:
+            self.end(child, e)
+            raise
+        finally:
+            _current.reset(token)
+            self.end(child)
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+tracer = Tracer(JsonlExporter(settings.TRACE_EXPORT_PATH), settings.TRACE_SAMPLE_RATE)
+span = tracer.span
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_message(message: str) -> str:
+    """Case and whitespace insensitive form of a user message."""
+    return " ".join(message.lower().split())
+
+
+def response_cache_key(**parts: Any) -> str:
+    """SHA-256 of the canonical JSON of the key parts."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Persistent exact-match cache of agent responses, backed by SQLite.
+
+    Entries expire `ttl_seconds` after they were stored. When the cache holds
+    more than `max_entries` entries or `max_bytes` of payload, the least
+    recently used entries are evicted. Calls are blocking, run them off the
+    event loop.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int, max_entries: int, max_bytes: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expirations": 0}
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                agent TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS response_cache_accessed ON response_cache (accessed_at)")
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Return the cached events for `key`, or None on a miss or an expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, created_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            payload, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                self.stats["misses"] += 1
+                self.stats["expirations"] += 1
+                return None
+            self._conn.execute("UPDATE response_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.stats["hits"] += 1
+        return json.loads(payload)
+
+    def put(self, key: str, agent: str, events: List[Dict[str, Any]]) -> None:
+        payload = json.dumps(events, ensure_ascii=False)
+        size = len(payload.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, agent, payload, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, agent, payload, size, now, now),
+            )
+            self.stats["stores"] += 1
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        expired = self._conn.execute(
+            "DELETE FROM response_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        self.stats["expirations"] += max(expired, 0)
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM response_cache ORDER BY accessed_at ASC"
+        ).fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            count, total, evicted = count - 1, total - size, evicted + 1
+        self.stats["evictions"] += evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache"
+            ).fetchone()
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            **stats,
+            "hit_rate": round(stats["hits"] / lookups, 3) if lookups else 0.0,
+            "entries": count,
+            "bytes": total,
+        }
@@ -0,0 +1,287 @@
+import asyncio
+import base64
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.metrics import THREAD_INDEX_WRITE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+MAX_TITLE_CHARS = 80
+
+_THREAD_COLUMNS = ("agent_id", "created_at", "last_active", "turns", "title", "message_count", "workflow_name")
+
+
+def encode_cursor(last_active: float, key: str) -> str:
+    """Opaque pagination cursor of the last item of a page."""
+    return base64.urlsafe_b64encode(json.dumps([last_active, key]).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """Inverse of `encode_cursor`, raises ValueError for a malformed cursor."""
+    try:
+        last_active, key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(last_active), str(key)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+class ThreadIndex:
+    """Index of the threads of each user, backed by SQLite in WAL mode.
+
+    A user's threads are a set: each (user, thread) pair is one row, with the
+    agent that last used it, when it was created, when it was last active, how
+    many turns and messages it had, its title and the name of the latest
+    workflow generated in it. A `users` table keeps the last activity and
+    thread count of each user, so both listings are served from an index.
+    `touch` and `set_metadata` only buffer in memory; a background task writes
+    the buffer in one transaction every `flush_interval` seconds, off the
+    event loop. Reads flush first, so they see every turn recorded before them.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.5):
+        self.path = path
+        self.flush_interval = flush_interval
+        # (user_id, thread_id) -> buffered columns of `_THREAD_COLUMNS`
+        self._pending: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS user_threads (
+                user_id TEXT NOT NULL,
+                thread_id TEXT NOT NULL,
+                agent_id TEXT,
+                created_at REAL NOT NULL,
+                last_active REAL NOT NULL,
+                turns INTEGER NOT NULL DEFAULT 0,
+                title TEXT,
+                message_count INTEGER,
+                workflow_name TEXT,
+                PRIMARY KEY (user_id, thread_id)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS user_threads_recent ON user_threads (user_id, last_active, thread_id)"
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                user_id TEXT PRIMARY KEY,
+                last_active REAL NOT NULL,
+                thread_count INTEGER NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS users_recent ON users (last_active, user_id)")
+        # Indexes created before thread metadata was recorded
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(user_threads)")}
+        for column, column_type in (("title", "TEXT"), ("message_count", "INTEGER"), ("workflow_name", "TEXT")):
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE user_threads ADD COLUMN {column} {column_type}")
+        self._conn.execute(
+            "INSERT OR IGNORE INTO users (user_id, last_active, thread_count) "
+            "SELECT user_id, MAX(last_active), COUNT(*) FROM user_threads GROUP BY user_id"
+        )
+
+    def import_json(self, file_path: str) -> int:
+        """Import a `{user_id: [thread_id, ...]}` JSON file of `InMemoryDatabase` into an empty index."""
+        if not os.path.exists(file_path):
+            return 0
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM user_threads LIMIT 1").fetchone():
+                return 0
+            try:
+                with open(file_path, "r") as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, IOError) as e:
+                logger.warning(f"Could not import thread index from {file_path}: {e}")
+                return 0
+            now = time.time()
+            # Duplicates are dropped, the order of each user's threads is kept
+            rows = list(dict.fromkeys(
+                (user_id, thread_id) for user_id, thread_ids in data.items() for thread_id in thread_ids
+            ))
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO user_threads (user_id, thread_id, created_at, last_active) VALUES (?, ?, ?, ?)",
+                [(user_id, thread_id, now + i * 1e-6, now) for i, (user_id, thread_id) in enumerate(rows)],
+            )
+            self._update_users({user_id for user_id, _ in rows})
+            self._conn.execute("COMMIT")
+        logger.info(f"Imported {len(rows)} threads of {len(data)} users from {file_path}")
+        return len(rows)
+
+    def _buffer(self, user_id: str, thread_id: str, turns: int, **columns: Any) -> None:
+        now = time.time()
+        with self._lock:
+            entry = self._pending.setdefault(
+                (user_id, thread_id), dict.fromkeys(_THREAD_COLUMNS) | {"created_at": now, "turns": 0}
+            )
+            entry["last_active"] = now
+            entry["turns"] += turns
+            for column, value in columns.items():
+                # The title is set once, by the first message of the thread
+                if value is not None and not (column == "title" and entry["title"]):
+                    entry[column] = value
+        self._start_flusher()
+
+    def touch(self, user_id: str, thread_id: str, agent_id: Optional[str] = None, message: str = "") -> None:
+        """Record a turn of `thread_id` by `user_id`; the first message of a thread becomes its title."""
+        title = " ".join(message.split())[:MAX_TITLE_CHARS] or None
+        self._buffer(user_id, thread_id, 1, agent_id=agent_id, title=title)
+
+    def set_metadata(
+        self, user_id: str, thread_id: str, message_count: Optional[int] = None, workflow_name: Optional[str] = None
+    ) -> None:
+        """Record the message count and latest generated workflow of a thread after a run."""
+        self._buffer(user_id, thread_id, 0, message_count=message_count, workflow_name=workflow_name)
+
+    def _start_flusher(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_periodically())
+        self._wakeup.set()
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # Turns arriving during the interval are written in the same transaction
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing thread index: {e}")
+
+    def _update_users(self, user_ids: set) -> None:
+        self._conn.executemany(
+            """
+            INSERT OR REPLACE INTO users (user_id, last_active, thread_count)
+            SELECT user_id, MAX(last_active), COUNT(*) FROM user_threads WHERE user_id = ? GROUP BY user_id
+            """,
+            [(user_id,) for user_id in user_ids],
+        )
+
+    def _write(self, batch: Dict[Tuple[str, str], Dict[str, Any]]) -> None:
+        with self._lock, THREAD_INDEX_WRITE_SECONDS.time():
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    f"""
+                    INSERT INTO user_threads (user_id, thread_id, {", ".join(_THREAD_COLUMNS)})
+                    VALUES (?, ?, {", ".join("?" for _ in _THREAD_COLUMNS)})
+                    ON CONFLICT (user_id, thread_id) DO UPDATE SET
+                        agent_id = COALESCE(excluded.agent_id, agent_id),
+                        last_active = MAX(last_active, excluded.last_active),
+                        turns = turns + excluded.turns,
+                        title = COALESCE(title, excluded.title),
+                        message_count = COALESCE(excluded.message_count, message_count),
+                        workflow_name = COALESCE(excluded.workflow_name, workflow_name)
+                    """,
+                    [
+                        (user_id, thread_id, *(entry[column] for column in _THREAD_COLUMNS))
+                        for (user_id, thread_id), entry in batch.items()
+                    ],
+                )
+                self._update_users({user_id for user_id, _ in batch})
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    async def flush(self) -> None:
+        if self._flush_lock is None:
+            return
+        async with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return
+            try:
+                # A cancelled flush still completes its write
+                await asyncio.shield(asyncio.to_thread(self._write, batch))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Keep the turns for the next flush
+                with self._lock:
+                    for key, entry in batch.items():
+                        self._pending.setdefault(key, entry)
+                raise
+
+    async def _read(self, query: str, params: tuple = ()) -> List[tuple]:
+        await self.flush()
+
+        def read() -> List[tuple]:
+            with self._lock:
+                return self._conn.execute(query, params).fetchall()
+
+        return await asyncio.to_thread(read)
+
+    async def user_ids(self) -> List[str]:
+        rows = await self._read("SELECT DISTINCT user_id FROM user_threads ORDER BY user_id")
+        return [user_id for user_id, in rows]
+
+    async def thread_ids(self, user_id: str) -> List[str]:
+        """Threads of a user, oldest first."""
+        rows = await self._read(
+            "SELECT thread_id FROM user_threads WHERE user_id = ? ORDER BY created_at, thread_id", (user_id,)
+        )
+        return [thread_id for thread_id, in rows]
+
+    async def list_users(self, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """A page of users, most recently active first, and the cursor of the next page."""
+        query = "SELECT user_id, last_active, thread_count FROM users"
+        params: tuple = ()
+        if cursor:
+            last_active, user_id = decode_cursor(cursor)
+            query += " WHERE (last_active, user_id) < (?, ?)"
+            params = (last_active, user_id)
+        rows = await self._read(query + " ORDER BY last_active DESC, user_id DESC LIMIT ?", (*params, limit + 1))
+        users = [
+            {"user_id": user_id, "last_active": last_active, "thread_count": thread_count}
+            for user_id, last_active, thread_count in rows[:limit]
+        ]
+        next_cursor = encode_cursor(users[-1]["last_active"], users[-1]["user_id"]) if len(rows) > limit else None
+        return users, next_cursor
+
+    async def list_threads(
+        self, user_id: str, limit: int, cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """A page of the threads of a user, most recently active first, and the cursor of the next page."""
+        columns = ("thread_id", *_THREAD_COLUMNS)
+        query = f"SELECT {', '.join(columns)} FROM user_threads WHERE user_id = ?"
+        params: tuple = (user_id,)
+        if cursor:
+            last_active, thread_id = decode_cursor(cursor)
+            query += " AND (last_active, thread_id) < (?, ?)"
+            params += (last_active, thread_id)
+        rows = await self._read(query + " ORDER BY last_active DESC, thread_id DESC LIMIT ?", (*params, limit + 1))
+        threads = [dict(zip(columns, row)) for row in rows[:limit]]
+        next_cursor = encode_cursor(threads[-1]["last_active"], threads[-1]["thread_id"]) if len(rows) > limit else None
+        return threads, next_cursor
+
+    async def aclose(self) -> None:
+        """Write the buffered turns and stop the background flush."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flusher
+        await self.flush()
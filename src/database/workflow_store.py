@@ -0,0 +1,82 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_REF_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+def canonicalize_workflow(workflow: Dict[str, Any]) -> bytes:
+    """Canonical JSON bytes of a workflow: sorted keys, no whitespace, UTF-8."""
+    return json.dumps(workflow, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def is_workflow_ref(ref: str) -> bool:
+    return bool(_REF_PATTERN.match(ref or ""))
+
+
+class WorkflowBlobStore:
+    """Content-addressed store of workflow JSON documents.
+
+    A workflow is stored once under the SHA-256 of its canonical JSON, as
+    `<directory>/<ref[:2]>/<ref>.json`, and the most recently used documents are
+    kept parsed in memory. Documents returned by `get` are shared between
+    callers and must not be mutated.
+    """
+
+    def __init__(self, directory: str, cache_size: int = 64):
+        self.directory = directory
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, ref: str) -> str:
+        return os.path.join(self.directory, ref[:2], f"{ref}.json")
+
+    def _remember(self, ref: str, workflow: Dict[str, Any]) -> None:
+        with self._lock:
+            self._cache[ref] = workflow
+            self._cache.move_to_end(ref)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def put(self, workflow: Dict[str, Any]) -> Tuple[str, int]:
+        """Store a workflow and return `(ref, size in bytes)`; storing it again is a no-op."""
+        data = canonicalize_workflow(workflow)
+        ref = hashlib.sha256(data).hexdigest()
+        path = self._path(ref)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            logger.info(f"Stored workflow {ref} ({len(data)} bytes)")
+        self._remember(ref, workflow)
+        return ref, len(data)
+
+    def get(self, ref: str) -> Optional[Dict[str, Any]]:
+        """Return the workflow stored under `ref`, or None if it is unknown."""
+        if not is_workflow_ref(ref):
+            return None
+        with self._lock:
+            workflow = self._cache.get(ref)
+            if workflow is not None:
+                self._cache.move_to_end(ref)
+                return workflow
+        try:
+            with open(self._path(ref), "rb") as f:
+                workflow = json.loads(f.read())
+        except FileNotFoundError:
+            return None
+        self._remember(ref, workflow)
+        return workflow
+
+    def exists(self, ref: str) -> bool:
+        return is_workflow_ref(ref) and (ref in self._cache or os.path.exists(self._path(ref)))
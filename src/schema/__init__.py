@@ -16,7 +16,15 @@ from schema.schema import (
     CleanedDataResult,
     UserInputExplainWorkflowAgent,
     UserInputWorkflowConfigGeneratorAgent,
-    DataCleaningInput
+    DataCleaningInput,
+    WorkflowUploadResponse,
+    RunInfo,
+    WorkflowExplainBatchInput,
+    WorkflowConfigGeneratorBatchInput,
+    UserInfo,
+    UserPage,
+    ThreadInfo,
+    ThreadPage,
 )
 
 __all__ = [
@@ -38,5 +46,13 @@ __all__ = [
     "CleanedDataResult",
     "UserInputExplainWorkflowAgent",
     "UserInputWorkflowConfigGeneratorAgent",
-    "DataCleaningInput"
+    "DataCleaningInput",
+    "WorkflowUploadResponse",
+    "RunInfo",
+    "WorkflowExplainBatchInput",
+    "WorkflowConfigGeneratorBatchInput",
+    "UserInfo",
+    "UserPage",
+    "ThreadInfo",
+    "ThreadPage",
 ]
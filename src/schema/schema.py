@@ -72,6 +72,19 @@ class UserInput(BaseModel):
         description="Whether to stream LLM tokens to the client.",
         default=True,
     )
+    
+    token_flush_ms: int | None = Field(
+        description="Time window in ms in which streamed tokens are coalesced into one SSE frame, 0 sends every token on its own. Defaults to the server setting.",
+        default=None,
+        ge=0,
+        examples=[30],
+    )
+    token_flush_bytes: int | None = Field(
+        description="Size in bytes at which coalesced tokens are flushed before the time window ends. Defaults to the server setting.",
+        default=None,
+        ge=1,
+        examples=[1024],
+    )
 
 class StreamInput(UserInput):
     """Input for streaming responses from the agent."""
@@ -414,6 +427,13 @@ class UserInputExplainWorkflowAgent(UserInput):
                 }}
         ]
     )
+    
+    workflow_ref: str | None = Field(
+        description="SHA-256 returned by `PUT /workflows`, used instead of sending `workflow_json_data.workflow_config` on every turn.",
+        default=None,
+        examples=[None],
+    )
+
 
 class UserInputWorkflowConfigGeneratorAgent(UserInput):
     """User input for generating n8n workflow configurations."""
@@ -435,6 +455,46 @@ class UserInputWorkflowConfigGeneratorAgent(UserInput):
         ]
     )
     
+    workflow_config: dict[str, Any] = Field(
+        description="Current n8n workflow configuration. When provided, the agent edits it with a patch instead of regenerating it.",
+        default={},
+        examples=[{}],
+    )
+    
+    workflow_ref: str | None = Field(
+        description="SHA-256 returned by `PUT /workflows`, used instead of sending `workflow_config` on every turn.",
+        default=None,
+        examples=[None],
+    )
+    
+class WorkflowExplainBatchInput(BaseModel):
+    """Batch of workflow explanation requests, answered as NDJSON in completion order."""
+
+    items: list[UserInputExplainWorkflowAgent] = Field(
+        description="Requests to run; identical requests run once.",
+        min_length=1,
+    )
+    max_parallel: int | None = Field(
+        description="Requests run at once, bounded by the server. Defaults to the server limit.",
+        default=None,
+        examples=[4],
+    )
+
+
+class WorkflowConfigGeneratorBatchInput(BaseModel):
+    """Batch of workflow configuration requests, answered as NDJSON in completion order."""
+
+    items: list[UserInputWorkflowConfigGeneratorAgent] = Field(
+        description="Requests to run; identical requests run once.",
+        min_length=1,
+    )
+    max_parallel: int | None = Field(
+        description="Requests run at once, bounded by the server. Defaults to the server limit.",
+        default=None,
+        examples=[4],
+    )
+
+
 class ToolCall(TypedDict):
     """Represents a request to call a tool."""
 
@@ -450,7 +510,7 @@ class ToolCall(TypedDict):
 class ChatMessage(BaseModel):
     """Message in a chat."""
 
-    type: Literal["human", "ai", "tool", "custom", "workflow_config", "workflow_plan"] = Field(
+    type: Literal["human", "ai", "tool", "custom", "workflow_config", "workflow_config_delta", "workflow_validation", "workflow_plan"] = Field(
         description="Role of the message.",
         examples=["human", "ai", "tool", "custom"],
     )
@@ -521,6 +581,85 @@ class FeedbackResponse(BaseModel):
     status: Literal["success"] = "success"
 
 
+class WorkflowUploadResponse(BaseModel):
+    """Reference of a workflow stored with `PUT /workflows`."""
+
+    workflow_ref: str = Field(
+        description="SHA-256 of the canonical workflow JSON, to pass as `workflow_ref`.",
+        examples=["3f0a9c1e6b2d4f5a7c8e9d0b1a2c3e4f5a6b7c8d9e0f1a2b3c4d5e6f7a8b9c0d"],
+    )
+    size: int = Field(
+        description="Size of the canonical workflow JSON in bytes.",
+        examples=[18234],
+    )
+
+
+class RunInfo(BaseModel):
+    """An agent run that is still streaming."""
+
+    run_id: str = Field(description="Run ID, as in the `run_id` of the streamed messages.")
+    agent_id: str = Field(description="Agent serving the run.", examples=["workflow_config_generator"])
+    thread_id: str = Field(description="Thread of the run.")
+    user_id: str = Field(description="User of the run.")
+    started_at: float = Field(description="Start of the run, as a Unix timestamp.")
+    elapsed_s: float = Field(description="Seconds since the run started.", examples=[12.4])
+    tokens: int = Field(description="Tokens streamed so far.", examples=[318])
+    cancelled: bool = Field(description="Whether the run is being cancelled.", default=False)
+
+
+class UserInfo(BaseModel):
+    """A user of the service."""
+
+    user_id: str = Field(description="User ID.")
+    last_active: float = Field(description="Last turn of the user in any thread, as a Unix timestamp.")
+    thread_count: int = Field(description="Number of threads of the user.", examples=[3])
+
+
+class UserPage(BaseModel):
+    """A page of users, most recently active first."""
+
+    users: list[UserInfo]
+    next_cursor: str | None = Field(
+        description="Pass as `cursor` to get the next page, None on the last page.",
+        default=None,
+    )
+
+
+class ThreadInfo(BaseModel):
+    """A thread of a user, with what a thread picker needs to show it."""
+
+    thread_id: str = Field(description="Thread ID.")
+    agent_id: str | None = Field(description="Agent of the latest turn.", default=None, examples=["workflow_config_generator"])
+    title: str | None = Field(
+        description="Start of the first message of the thread.",
+        default=None,
+        examples=["Generate an n8n workflow for processing CVs"],
+    )
+    message_count: int | None = Field(
+        description="Messages in the thread after its latest run, None until a run has completed.",
+        default=None,
+        examples=[6],
+    )
+    turns: int = Field(description="Number of requests made in the thread.", default=0, examples=[3])
+    workflow_name: str | None = Field(
+        description="Name of the latest workflow generated in the thread.",
+        default=None,
+        examples=["CV Processing"],
+    )
+    created_at: float = Field(description="First turn of the thread, as a Unix timestamp.")
+    last_active: float = Field(description="Latest turn of the thread, as a Unix timestamp.")
+
+
+class ThreadPage(BaseModel):
+    """A page of the threads of a user, most recently active first."""
+
+    threads: list[ThreadInfo]
+    next_cursor: str | None = Field(
+        description="Pass as `cursor` to get the next page, None on the last page.",
+        default=None,
+    )
+
+
 class ChatHistoryInput(BaseModel):
     """Input for retrieving chat history."""
 
@@ -534,10 +673,45 @@ class ChatHistoryInput(BaseModel):
         default="workflow_explain_chatbot",
         examples=["workflow_explain_chatbot"],
     )
+    limit: int | None = Field(
+        description="Maximum number of messages to return. All messages when omitted.",
+        default=None,
+        ge=1,
+        examples=[50],
+    )
+    before: int | None = Field(
+        description=(
+            "Return the messages before this index, newest page first. Use `start_index` of a page to get the previous one."
+            " With `after` or `since_message_index`, the exclusive end of the range."
+        ),
+        default=None,
+        ge=0,
+        examples=[120],
+    )
+    after: int | None = Field(
+        description="Return the messages after this index, oldest first.",
+        default=None,
+        ge=-1,
+        examples=[119],
+    )
+    since_message_index: int | None = Field(
+        description="Incremental mode: return the messages from this index on, e.g. the `total_messages` of the last call.",
+        default=None,
+        ge=0,
+        examples=[120],
+    )
 
 
 class ChatHistory(BaseModel):
     messages: list[ChatMessage]
+    start_index: int = Field(
+        description="Index of the first returned message in the thread.",
+        default=0,
+    )
+    total_messages: int = Field(
+        description="Number of messages in the thread.",
+        default=0,
+    )
     
 class ModelInferenceInput(BaseModel):
     """Input for model inference."""
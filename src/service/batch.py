@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from collections.abc import AsyncGenerator, Awaitable, Callable, Hashable
+from dataclasses import dataclass
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchItemResult:
+    index: int
+    attempts: int
+    result: Any = None
+    error: Exception | None = None
+    # Index of the identical item whose run produced this result
+    duplicate_of: int | None = None
+
+
+async def run_batch(
+    items: list[Any],
+    worker: Callable[[Any], Awaitable[Any]],
+    key: Callable[[Any], Hashable],
+    max_parallel: int,
+    max_attempts: int,
+    retry_delay: Callable[[Any, Exception, int], float | None],
+    lane: Callable[[Any], Hashable | None] = lambda item: None,
+) -> AsyncGenerator[BatchItemResult, None]:
+    """Run `worker` on the items with at most `max_parallel` in flight, yielding results as they complete.
+
+    Items with the same `key` run once and their duplicates get the same result.
+    Items with the same non-None `lane` run one after another, in their order.
+    A failed item is retried on its own after `retry_delay(item, error, attempt)`
+    seconds, up to `max_attempts` runs; `retry_delay` returns None for errors
+    that are not worth retrying. Closing the generator cancels the workers.
+    """
+    groups: dict[Hashable, list[int]] = {}
+    for index, item in enumerate(items):
+        groups.setdefault(key(item), []).append(index)
+    chains: dict[Hashable, list[list[int]]] = {}
+    for indices in groups.values():
+        item_lane = lane(items[indices[0]])
+        chains.setdefault(("item", indices[0]) if item_lane is None else ("lane", item_lane), []).append(indices)
+    jobs: asyncio.Queue = asyncio.Queue()
+    for chain in chains.values():
+        jobs.put_nowait(chain)
+    done: asyncio.Queue = asyncio.Queue()
+
+    async def run(indices: list[int]) -> BatchItemResult:
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return BatchItemResult(index=indices[0], attempts=attempt, result=await worker(items[indices[0]]))
+            except Exception as e:
+                delay = retry_delay(items[indices[0]], e, attempt) if attempt < max_attempts else None
+                if delay is None:
+                    return BatchItemResult(index=indices[0], attempts=attempt, error=e)
+                logger.info(f"Retrying batch item {indices[0]} in {delay:.1f}s after attempt {attempt} failed: {e}")
+                await asyncio.sleep(delay)
+
+    async def work() -> None:
+        while not jobs.empty():
+            for indices in jobs.get_nowait():
+                await done.put((indices, await run(indices)))
+
+    workers = [asyncio.create_task(work()) for _ in range(max(1, min(max_parallel, len(chains))))]
+    try:
+        for _ in range(len(groups)):
+            indices, result = await done.get()
+            yield result
+            for index in indices[1:]:
+                yield BatchItemResult(
+                    index=index, attempts=0, result=result.result, error=result.error, duplicate_of=indices[0]
+                )
+    finally:
+        for task in workers:
+            task.cancel()
@@ -0,0 +1,170 @@
+import time
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from core.llm import llm_call_key
+from core.metrics import LLM_SECONDS, LLM_TOKENS, NODE_SECONDS
+from core.tracing import Span, tracer
+
+
+class MetricsCallback(BaseCallbackHandler):
+    """Time the graph nodes and chat model calls of a run, and count the tokens the provider reports.
+
+    Chat model calls are labelled with the provider/model they call, `default_model`
+    when a call does not name its model.
+    """
+
+    # Only does arithmetic, run it on the event loop rather than in the executor
+    run_inline = True
+
+    def __init__(self, agent_id: str, default_model: str):
+        self.agent_id = agent_id
+        self.default_model = default_model
+        self._nodes: dict[UUID, tuple[str, float]] = {}
+        self._llm_calls: dict[UUID, tuple[str, float]] = {}
+
+    def on_chain_start(
+        self,
+        serialized: dict[str, Any] | None,
+        inputs: Any,
+        *,
+        run_id: UUID,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        # Runnables inside a node inherit its metadata, only the node's own run has its name
+        if node and kwargs.get("name") == node:
+            self._nodes[run_id] = (node, time.perf_counter())
+
+    def _end_node(self, run_id: UUID) -> None:
+        started = self._nodes.pop(run_id, None)
+        if started is not None:
+            node, start = started
+            NODE_SECONDS.observe(time.perf_counter() - start, agent=self.agent_id, node=node)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_node(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_node(run_id)
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: Any,
+        *,
+        run_id: UUID,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        model = llm_call_key(metadata, kwargs.get("invocation_params"), self.default_model)
+        self._llm_calls[run_id] = (model, time.perf_counter())
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        call = self._llm_calls.pop(run_id, None)
+        if call is None:
+            return
+        model, start = call
+        LLM_SECONDS.observe(time.perf_counter() - start, model=model)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    LLM_TOKENS.inc(usage.get("input_tokens", 0), model=model, kind="prompt")
+                    LLM_TOKENS.inc(usage.get("output_tokens", 0), model=model, kind="completion")
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._llm_calls.pop(run_id, None)
+
+
+class TracingCallback(BaseCallbackHandler):
+    """Record a span for each graph node and chat model call of a sampled run, under the run's root span.
+
+    The spans of chat model calls are events of provider streams: they end at
+    the last byte and carry the time to the first byte.
+    """
+
+    run_inline = True
+
+    def __init__(self, root: Span, default_model: str):
+        self.root = root
+        self.default_model = default_model
+        # Parent run of every chain seen, to find the node a model call belongs to
+        self._parents: dict[UUID, UUID | None] = {}
+        self._spans: dict[UUID, Span] = {}
+
+    def _parent_span(self, parent_run_id: UUID | None) -> Span:
+        while parent_run_id is not None:
+            if parent_run_id in self._spans:
+                return self._spans[parent_run_id]
+            parent_run_id = self._parents.get(parent_run_id)
+        return self.root
+
+    def on_chain_start(
+        self,
+        serialized: dict[str, Any] | None,
+        inputs: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        self._parents[run_id] = parent_run_id
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            self._spans[run_id] = tracer.start_span(
+                f"node {node}", self._parent_span(parent_run_id), node=node, step=metadata.get("langgraph_step")
+            )
+
+    def _end(self, run_id: UUID, error: BaseException | None = None) -> Span | None:
+        self._parents.pop(run_id, None)
+        span = self._spans.pop(run_id, None)
+        tracer.end(span, error)
+        return span
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        model = llm_call_key(metadata, kwargs.get("invocation_params"), self.default_model)
+        self._spans[run_id] = tracer.start_span(f"llm {model}", self._parent_span(parent_run_id), model=model, chunks=0)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._spans.get(run_id)
+        if span is None:
+            return
+        if span.attributes["chunks"] == 0:
+            span.event("first_byte")
+            span.set(first_byte_ms=round((time.time_ns() - span.start_ns) / 1e6, 1))
+        span.attributes["chunks"] += 1
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._spans.get(run_id)
+        if span is not None:
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                    if usage:
+                        span.set(input_tokens=usage.get("input_tokens"), output_tokens=usage.get("output_tokens"))
+            span.event("last_byte")
+        self._end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
@@ -0,0 +1,174 @@
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any
+from uuid import UUID
+
+PROFILE_KINDS = ("cpu", "mem")
+# Frames kept per sampled stack, deeper frames are cut at the root
+MAX_STACK_DEPTH = 128
+
+# Runs profiling memory at once: tracemalloc is process-wide
+_mem_lock = threading.Lock()
+_mem_users = 0
+_mem_started = False
+
+
+def parse_profile_header(value: str) -> frozenset[str]:
+    """Kinds of an `X-Profile` header, e.g. "cpu", "mem", "cpu|mem" or "cpu,mem"."""
+    kinds = frozenset(kind.strip().lower() for kind in value.replace("|", ",").split(",") if kind.strip())
+    if unknown := kinds - set(PROFILE_KINDS):
+        raise ValueError(f"Unknown profile kinds {sorted(unknown)}, expected {'|'.join(PROFILE_KINDS)}")
+    return kinds
+
+
+def _frame_name(frame: Any) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _CpuSampler:
+    """Sample the stack of one thread every `interval` seconds from a background thread."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="cpu-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self) -> dict[str, Any]:
+        self._stop.set()
+        self._thread.join()
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            # Self samples per function, then the stacks in the folded format of flame graph tools
+            "top_functions": [{"function": f, "samples": n} for f, n in leaves.most_common(30)],
+            "stacks": [{"stack": s, "samples": n} for s, n in self.stacks.most_common()],
+        }
+
+
+class RequestProfiler:
+    """CPU and/or memory profile of one request.
+
+    The CPU profile samples the event loop thread, so it also shows the other
+    requests running at the same time and the time the loop waits for I/O; work
+    sent to worker threads is not sampled. The memory profile diffs tracemalloc
+    snapshots taken at the start and end of the request. tracemalloc slows every
+    allocation of the process down while any memory profile is running.
+    """
+
+    def __init__(self, kinds: frozenset[str], cpu_interval: float, mem_top: int = 50):
+        self.kinds = kinds
+        self.cpu_interval = cpu_interval
+        self.mem_top = mem_top
+        self._cpu: _CpuSampler | None = None
+        self._snapshot: tracemalloc.Snapshot | None = None
+        self._started_at = 0.0
+        self._start = 0.0
+
+    def start(self) -> "RequestProfiler":
+        global _mem_users, _mem_started
+        self._started_at = time.time()
+        self._start = time.perf_counter()
+        if "mem" in self.kinds:
+            with _mem_lock:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _mem_started = True
+                _mem_users += 1
+            tracemalloc.reset_peak()
+            self._snapshot = tracemalloc.take_snapshot()
+        if "cpu" in self.kinds:
+            self._cpu = _CpuSampler(threading.get_ident(), self.cpu_interval)
+            self._cpu.start()
+        return self
+
+    def stop(self) -> dict[str, Any]:
+        global _mem_users, _mem_started
+        profile: dict[str, Any] = {
+            "kinds": sorted(self.kinds),
+            "started_at": self._started_at,
+            "duration_s": round(time.perf_counter() - self._start, 3),
+        }
+        if self._cpu is not None:
+            profile["cpu"] = self._cpu.stop()
+        if self._snapshot is not None:
+            current, peak = tracemalloc.get_traced_memory()
+            ignored = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+            diff = tracemalloc.take_snapshot().filter_traces(ignored).compare_to(
+                self._snapshot.filter_traces(ignored), "lineno"
+            )
+            profile["mem"] = {
+                # Process-wide, includes the requests that ran at the same time
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "top_allocations": [
+                    {"location": str(stat.traceback[0]), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+                    for stat in diff[: self.mem_top]
+                ],
+            }
+            with _mem_lock:
+                _mem_users -= 1
+                if _mem_users == 0 and _mem_started:
+                    tracemalloc.stop()
+                    _mem_started = False
+        return profile
+
+
+class ProfileStore:
+    """Profiles of runs as `<directory>/<run_id>.json`, keeping the `max_kept` most recent."""
+
+    def __init__(self, directory: str, max_kept: int = 100):
+        self.directory = directory
+        self.max_kept = max_kept
+
+    def _path(self, run_id: str) -> str:
+        return os.path.join(self.directory, f"{run_id}.json")
+
+    def put(self, run_id: str, profile: dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(run_id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"run_id": run_id, **profile}, f)
+        os.replace(tmp_path, path)
+        files = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in files[: max(0, len(files) - self.max_kept)]:
+            # Another worker may have pruned it already
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(entry.path)
+
+    def get(self, run_id: str) -> dict[str, Any] | None:
+        try:
+            # Only run ids map to file names
+            with open(self._path(str(UUID(run_id))), encoding="utf-8") as f:
+                return json.load(f)
+        except (ValueError, FileNotFoundError):
+            return None
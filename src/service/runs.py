@@ -0,0 +1,85 @@
+import logging
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ActiveRun:
+    """A streaming agent run, from `_handle_input` until its stream ends."""
+
+    run_id: str
+    agent_id: str
+    thread_id: str
+    user_id: str
+    started_at: float = field(default_factory=time.time)
+    tokens: int = 0
+    # Seconds from the start of the run to its first streamed token
+    first_token_at: float | None = None
+    cancel_reason: str | None = None
+    _started: float = field(default_factory=time.monotonic, repr=False)
+    _cancel: Callable[[], None] | None = field(default=None, repr=False)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started
+
+    def bind(self, cancel: Callable[[], None]) -> None:
+        """Set how the run is stopped; a run cancelled before it is bound is stopped right away."""
+        self._cancel = cancel
+        if self.cancel_reason is not None:
+            cancel()
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "run_id": self.run_id,
+            "agent_id": self.agent_id,
+            "thread_id": self.thread_id,
+            "user_id": self.user_id,
+            "started_at": self.started_at,
+            "elapsed_s": round(self.elapsed, 3),
+            "tokens": self.tokens,
+            "cancelled": self.cancel_reason is not None,
+        }
+
+
+class RunRegistry:
+    """Active runs of the service, by run_id, so they can be listed and cancelled."""
+
+    def __init__(self):
+        self._runs: dict[str, ActiveRun] = {}
+        self._lock = threading.Lock()
+
+    def register(self, run: ActiveRun) -> ActiveRun:
+        with self._lock:
+            self._runs[run.run_id] = run
+        return run
+
+    def unregister(self, run_id: str) -> None:
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+    def get(self, run_id: str) -> ActiveRun | None:
+        with self._lock:
+            return self._runs.get(run_id)
+
+    def cancel(self, run_id: str, reason: str) -> ActiveRun | None:
+        """Stop a run, return it or None if it is unknown or already finished."""
+        run = self.get(run_id)
+        if run is None:
+            return None
+        if run.cancel_reason is None:
+            run.cancel_reason = reason
+            logger.info(f"Cancelling run {run_id} of {run.agent_id} after {run.elapsed:.1f}s: {reason}")
+            if run._cancel is not None:
+                run._cancel()
+        return run
+
+    def list(self) -> list[ActiveRun]:
+        with self._lock:
+            runs = list(self._runs.values())
+        return sorted(runs, key=lambda run: run.started_at)
@@ -1,15 +1,19 @@
+import asyncio
 import inspect
 import json
 import logging
+import re
+import time
 import warnings
+from collections import Counter
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 from typing import Annotated, Any, Union
 from uuid import UUID, uuid4
 
-from fastapi import APIRouter, Depends, FastAPI, HTTPException, status
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from langchain_core._api import LangChainBetaWarning
 from langchain_core.messages import AIMessage, AIMessageChunk, AnyMessage, HumanMessage, ToolMessage
@@ -18,10 +22,31 @@ from langgraph.pregel import Pregel
 from langgraph.types import Command, Interrupt
 from langsmith import Client as LangsmithClient
 
-from agents import DEFAULT_AGENT, get_agent, get_all_agent_info
+from agents import DEFAULT_AGENT, get_agent, get_agent_model, get_all_agent_info
+from agents.prompts import PROMPT_VERSION, WORKFLOW_EXPLAIN_PROMPT
+from agents.workflow_config_generator_agent import WORKFLOW_CONFIG_EDIT_PROMPT, WORKFLOW_CONFIG_GENERATOR_PROMPT
+from agents.workflow_digest import canonical_workflow_hash
+from agents.workflow_parallel_generation import STEP_FRAGMENT_PROMPT
+from agents.workflow_query import get_fast_path_stats
 from core import settings
+from core.admission import AdmissionCallback, AdmissionController, AdmissionRejected
+from core.budget import TokenBudget, TokenBudgetCallback
+from core.llm import model_key
+from core.metrics import (
+    FIRST_TOKEN_SECONDS,
+    REQUEST_SECONDS,
+    REQUESTS,
+    SSE_BYTES,
+    TOKENS_PER_SECOND,
+    Gauge,
+    instrument_checkpointer,
+    render_metrics,
+)
+from core.tracing import Span, current_span, span, tracer
 from memory import initialize_database, initialize_store
-from database.inmem_database import InMemoryDatabase
+from database.response_cache import ResponseCache, normalize_message, response_cache_key
+from database.thread_index import ThreadIndex
+from database.workflow_store import WorkflowBlobStore
 from schema import (
     ChatHistory,
     ChatHistoryInput,
@@ -35,8 +60,21 @@ from schema import (
     UserInputExplainWorkflowAgent,
     UserInputWorkflowConfigGeneratorAgent,
     SchemaAnalysisInput,
-    DataCleaningInput
+    DataCleaningInput,
+    WorkflowUploadResponse,
+    RunInfo,
+    WorkflowExplainBatchInput,
+    WorkflowConfigGeneratorBatchInput,
+    UserPage,
+    UserInfo,
+    ThreadPage,
+    ThreadInfo,
 )
+from service.batch import run_batch
+from service.instrumentation import MetricsCallback, TracingCallback
+from service.profiling import ProfileStore, RequestProfiler, parse_profile_header
+from service.runs import ActiveRun, RunRegistry
+from service.sse import CANCELLED, TICK, EventPump, TokenCoalescer, token_frame
 from service.utils import (
     convert_message_content_to_string,
     langchain_to_chat_message,
@@ -76,6 +114,9 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
             if hasattr(store, "setup"):  # ignore: union-attr
                 await store.setup()
 
+            # Time checkpoint reads and writes for /metrics
+            instrument_checkpointer(saver)
+
             # Configure agents with both memory components
             agents = get_all_agent_info()
             for a in agents:
@@ -85,6 +126,8 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
                 # Set store for long-term memory (cross-conversation knowledge)
                 agent.store = store
             yield
+            await thread_index.aclose()
+            tracer.exporter.close()
     except Exception as e:
         logger.error(f"Error during database/store initialization: {e}")
         raise
@@ -101,7 +144,64 @@ app.add_middleware(
 )
 
 router = APIRouter(dependencies=[Depends(verify_bearer)])
-inmem_store = InMemoryDatabase(file_path=settings.INMEMORY_STORE_FILE_PATH)
+thread_index = ThreadIndex(settings.THREAD_INDEX_PATH, flush_interval=settings.THREAD_INDEX_FLUSH_SECONDS)
+thread_index.import_json(settings.INMEMORY_STORE_FILE_PATH)
+# Fire-and-forget tasks, referenced until they finish
+_background_tasks: set[asyncio.Task] = set()
+workflow_store = WorkflowBlobStore(settings.WORKFLOW_STORE_PATH, cache_size=settings.WORKFLOW_STORE_CACHE_SIZE)
+response_cache = ResponseCache(
+    settings.RESPONSE_CACHE_PATH,
+    ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+)
+run_registry = RunRegistry()
+profile_store = ProfileStore(settings.PROFILE_DIR, max_kept=settings.PROFILE_MAX_KEPT)
+admission = AdmissionController(
+    settings.LLM_CONCURRENCY_LIMITS,
+    default_limit=settings.LLM_DEFAULT_CONCURRENCY,
+    max_queue=settings.LLM_ADMISSION_MAX_QUEUE,
+    queue_timeout=settings.LLM_ADMISSION_TIMEOUT_SECONDS,
+)
+token_budget = TokenBudget(
+    settings.LLM_BUDGET_PATH,
+    tpm_limits=settings.LLM_TPM_LIMITS,
+    rpm_limits=settings.LLM_RPM_LIMITS,
+    completion_tokens=settings.LLM_BUDGET_COMPLETION_TOKENS,
+    max_delay=settings.LLM_BUDGET_MAX_DELAY_SECONDS,
+)
+
+Gauge(
+    "agent_active_runs",
+    "Runs in progress.",
+    ("agent",),
+    lambda: Counter((run.agent_id,) for run in run_registry.list()),
+)
+Gauge(
+    "llm_admission_slots",
+    "LLM admission slots in use and requests waiting for one.",
+    ("model", "state"),
+    lambda: {
+        (key, state): lane[state] for key, lane in admission.snapshot().items() for state in ("active", "queued")
+    },
+)
+
+# Agents whose responses are cached, with the graph node a cached answer is recorded as
+RESPONSE_CACHE_AGENTS = {
+    "workflow_explain_chatbot": "explanation",
+    "workflow_config_generator": "config_generation",
+}
+# Hash of the prompts behind each cached agent's answers, PROMPT_VERSION only covers prompts.py
+RESPONSE_CACHE_PROMPTS = {
+    "workflow_explain_chatbot": response_cache_key(prompts=[WORKFLOW_EXPLAIN_PROMPT]),
+    "workflow_config_generator": response_cache_key(
+        prompts=[WORKFLOW_CONFIG_GENERATOR_PROMPT, WORKFLOW_CONFIG_EDIT_PROMPT, STEP_FRAGMENT_PROMPT]
+    ),
+}
+# Custom events returned by /invoke; deltas and plan steps are superseded by the final event
+INVOKE_CUSTOM_TYPES = ("workflow_plan", "workflow_config", "workflow_validation")
+# Granularity of the simulated token stream of a cached response
+_REPLAY_TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
 
 @router.get("/info")
 async def info() -> ServiceMetadata:
@@ -115,7 +215,17 @@ async def info() -> ServiceMetadata:
     )
 
 
-async def _handle_input(user_input: Union[UserInput, UserInputSelectFeatureAgent, UserInputExplainWorkflowAgent, UserInputWorkflowConfigGeneratorAgent, SchemaAnalysisInput, DataCleaningInput], agent: Pregel) -> tuple[dict[str, Any], UUID]:
+async def _resolve_workflow_ref(workflow_ref: str) -> dict[str, Any]:
+    workflow = await asyncio.to_thread(workflow_store.get, workflow_ref)
+    if workflow is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown workflow_ref {workflow_ref}, upload the workflow with PUT /workflows first.",
+        )
+    return workflow
+
+
+async def _handle_input(user_input: Union[UserInput, UserInputSelectFeatureAgent, UserInputExplainWorkflowAgent, UserInputWorkflowConfigGeneratorAgent, SchemaAnalysisInput, DataCleaningInput], agent: Pregel, agent_id: str | None = None) -> tuple[dict[str, Any], UUID]:
     """
     Parse user input and handle any required interrupt resumption.
     Returns kwargs for agent invocation and the run_id.
@@ -123,77 +233,255 @@ async def _handle_input(user_input: Union[UserInput, UserInputSelectFeatureAgent
     run_id = uuid4()
     thread_id = user_input.thread_id or str(uuid4())
     user_id = user_input.user_id or str(uuid4())
+    # The run is the trace, every span of it carries the run_id
+    root = tracer.start_trace(run_id, f"run {agent_id}", agent=agent_id, thread_id=thread_id, user_id=user_id)
 
-    # save thread_id for user_id in in-memory store
-    thread_id_for_user_id: list[str] = inmem_store.get(user_id)
-    if not (thread_id in thread_id_for_user_id):
-        thread_id_for_user_id.append(thread_id)
-    inmem_store.set(user_id, thread_id_for_user_id)
-    
-    configurable = {"thread_id": thread_id, "model": user_input.model, "user_id": user_id}
+    try:
+        with span("handle_input"):
+            configurable = {"thread_id": thread_id, "model": user_input.model, "user_id": user_id}
 
-    if user_input.agent_config:
-        if overlap := configurable.keys() & user_input.agent_config.keys():
-            raise HTTPException(
-                status_code=422,
-                detail=f"agent_config contains reserved keys: {overlap}",
-            )
-        configurable.update(user_input.agent_config)
-    logger.info(f"user_input {user_input}")
-    # Merge product_config and model_config safely, defaulting to empty dicts if None
-    category_config = user_input.category_config if hasattr(user_input, "category_config") else {}
-    workflow_json_data = user_input.workflow_json_data if hasattr(user_input, "workflow_json_data") else {}
-    clean_etl_config = user_input.schemas_analysis_config if hasattr(user_input, "clean_etl_config") else {}
-    data_cleaning_config = user_input.data_cleaning_config if hasattr(user_input, "data_cleaning_config") else {}
+            if user_input.agent_config:
+                if overlap := configurable.keys() & user_input.agent_config.keys():
+                    raise HTTPException(
+                        status_code=422,
+                        detail=f"agent_config contains reserved keys: {overlap}",
+                    )
+                configurable.update(user_input.agent_config)
+            logger.info(f"user_input {user_input}")
+            # Merge product_config and model_config safely, defaulting to empty dicts if None
+            category_config = user_input.category_config if hasattr(user_input, "category_config") else {}
+            workflow_json_data = user_input.workflow_json_data if hasattr(user_input, "workflow_json_data") else {}
+            clean_etl_config = user_input.schemas_analysis_config if hasattr(user_input, "clean_etl_config") else {}
+            data_cleaning_config = user_input.data_cleaning_config if hasattr(user_input, "data_cleaning_config") else {}
     
-    # Handle workflow config generator specific fields
-    workflow_config_data = {}
-    if hasattr(user_input, "workflow_plan") and user_input.workflow_plan:
-        workflow_config_data["workflow_plan"] = user_input.workflow_plan
+            # Handle workflow config generator specific fields
+            workflow_config_data = {}
+            if hasattr(user_input, "workflow_plan") and user_input.workflow_plan:
+                workflow_config_data["workflow_plan"] = user_input.workflow_plan
+            if hasattr(user_input, "workflow_config") and user_input.workflow_config:
+                workflow_config_data["workflow_config"] = user_input.workflow_config
+            # A workflow uploaded with PUT /workflows replaces the inline one
+            if getattr(user_input, "workflow_ref", None):
+                workflow_config_data["workflow_config"] = await _resolve_workflow_ref(user_input.workflow_ref)
+
+            # save thread_id for user_id in the thread index once the input is valid, written in the background
+            thread_index.touch(user_id, thread_id, agent_id, message=user_input.message)
     
-    config = RunnableConfig(
-        configurable=configurable,
-        run_id=run_id,
-        metadata={**category_config, **workflow_json_data, **clean_etl_config, **data_cleaning_config, **workflow_config_data},
-    )
+            config = RunnableConfig(
+                configurable=configurable,
+                run_id=run_id,
+                metadata={**category_config, **workflow_json_data, **clean_etl_config, **data_cleaning_config, **workflow_config_data},
+            )
+            agent_key = _admission_key(agent_id)
+            callbacks: list[Any] = []
+            # Every LLM call of the run waits for its share of the provider's TPM/RPM budget,
+            # then takes a slot of the provider/model it calls
+            if token_budget.enabled:
+                callbacks.append(TokenBudgetCallback(token_budget, agent_key))
+            callbacks += [AdmissionCallback(admission, agent_key), MetricsCallback(agent_id or "", agent_key)]
+            if root is not None:
+                callbacks.append(TracingCallback(root, agent_key))
+            config["callbacks"] = callbacks
     
-    # Check for interrupts that need to be resumed
-    state = await agent.aget_state(config=config)
-    interrupted_tasks = [
-        task for task in state.tasks if hasattr(task, "interrupts") and task.interrupts
+            # Check for interrupts that need to be resumed
+            with span("aget_state"):
+                state = await agent.aget_state(config=config)
+            interrupted_tasks = [
+                task for task in state.tasks if hasattr(task, "interrupts") and task.interrupts
+            ]
+
+            input: Command | dict[str, Any]
+            if interrupted_tasks:
+                # assume user input is response to resume agent execution from interrupt
+                input = Command(resume=user_input.message)
+            else:
+                input = {"messages": [HumanMessage(content=user_input.message)]}
+
+            kwargs = {
+                "input": input,
+                "config": config,
+            }
+
+            return kwargs, run_id
+    except BaseException as e:
+        # Rejected input still ends its trace, with the error
+        tracer.end(root, e)
+        raise
+
+
+async def _record_thread_metadata(agent: Pregel, config: RunnableConfig, workflow_name: str | None) -> None:
+    configurable = config["configurable"]
+    try:
+        state = await agent.aget_state(config=RunnableConfig(configurable={"thread_id": configurable["thread_id"]}))
+        thread_index.set_metadata(
+            configurable["user_id"],
+            configurable["thread_id"],
+            message_count=len(state.values.get("messages", [])),
+            workflow_name=workflow_name,
+        )
+    except Exception as e:
+        logger.warning(f"Could not record metadata of thread {configurable['thread_id']}: {e}")
+
+
+def _after_run(agent: Pregel, kwargs: dict[str, Any], workflow_name: str | None = None) -> None:
+    """Update the thread listing in the background once a run has ended."""
+    task = asyncio.create_task(_record_thread_metadata(agent, kwargs["config"], workflow_name))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def _workflow_name(config: Any) -> str | None:
+    name = config.get("name") if isinstance(config, dict) else None
+    return name if isinstance(name, str) and name else None
+
+
+async def _response_cache_key(user_input: UserInput, agent_id: str, agent: Pregel, kwargs: dict[str, Any]) -> str | None:
+    """Key of the response cache for this turn, or None if it must not be cached."""
+    if not settings.RESPONSE_CACHE_ENABLED or agent_id not in RESPONSE_CACHE_AGENTS:
+        return None
+    # Resuming an interrupt depends on the interrupted run, not on the message
+    if not isinstance(kwargs["input"], dict):
+        return None
+    config = kwargs["config"]
+    workflow = config["metadata"].get("workflow_config") or {}
+    generator = agent_id == "workflow_config_generator"
+    # An edit keeps the positions and wording of the user's own workflow, a cached config would replace them
+    if generator and workflow.get("nodes"):
+        return None
+    with span("aget_state", purpose="response_cache_key"):
+        state = await agent.aget_state(config=config)
+    history = [
+        (m.type, convert_message_content_to_string(m.content)) for m in state.values.get("messages", [])
     ]
+    return response_cache_key(
+        agent=agent_id,
+        model=str(get_agent_model(agent_id)),
+        prompt_version=PROMPT_VERSION,
+        prompts=RESPONSE_CACHE_PROMPTS[agent_id],
+        workflow=canonical_workflow_hash(workflow) if workflow else "",
+        workflow_plan=config["metadata"].get("workflow_plan", ""),
+        # Earlier turns of the thread change the answer, first turns are shared across users
+        history=response_cache_key(history=history) if history else "",
+        # Generated configs copy names from the message as written
+        message=" ".join(user_input.message.split()) if generator else normalize_message(user_input.message),
+    )
 
-    input: Command | dict[str, Any]
-    if interrupted_tasks:
-        # assume user input is response to resume agent execution from interrupt
-        input = Command(resume=user_input.message)
-    else:
-        input = {"messages": [HumanMessage(content=user_input.message)]}
 
-    kwargs = {
-        "input": input,
-        "config": config,
-    }
+def _token_coalescer(user_input: UserInput) -> TokenCoalescer | None:
+    """Coalescer of the token frames of a request, None when every token is sent on its own."""
+    window_ms = settings.SSE_TOKEN_FLUSH_MS if user_input.token_flush_ms is None else user_input.token_flush_ms
+    flush_bytes = settings.SSE_TOKEN_FLUSH_BYTES if user_input.token_flush_bytes is None else user_input.token_flush_bytes
+    if window_ms <= 0 or not user_input.stream_tokens:
+        return None
+    # Clients choose the window, the server bounds what a connection may buffer
+    return TokenCoalescer(
+        window_ms=min(window_ms, settings.SSE_MAX_TOKEN_FLUSH_MS),
+        flush_bytes=max(1, min(flush_bytes, settings.SSE_MAX_BUFFERED_BYTES)),
+    )
+
+
+async def _replay_cached_response(
+    events: list[dict[str, Any]],
+    user_input: UserInput,
+    agent_id: str,
+    agent: Pregel,
+    kwargs: dict[str, Any],
+    run_id: UUID,
+    coalescer: TokenCoalescer | None,
+) -> AsyncGenerator[str, None]:
+    """Stream a cached response like a live one and record the turn in the thread."""
+    answer = next((e["content"] for e in reversed(events) if e.get("type") == "ai"), "")
+    if user_input.stream_tokens:
+        for token in _REPLAY_TOKEN_PATTERN.findall(answer):
+            frame = coalescer.add(token) if coalescer else token_frame(token)
+            if frame:
+                yield frame
+        if coalescer and (frame := coalescer.flush()):
+            yield frame
+    for event in events:
+        yield f"data: {json.dumps({'type': 'message', 'content': {**event, 'run_id': str(run_id)}})}\n\n"
+    await agent.aupdate_state(
+        kwargs["config"],
+        {"messages": [HumanMessage(content=user_input.message), AIMessage(content=answer)]},
+        as_node=RESPONSE_CACHE_AGENTS[agent_id],
+    )
+
 
-    return kwargs, run_id
+async def _watch_disconnect(request: Request, run_id: str) -> None:
+    """Cancel a run once its client has gone away."""
+    while not await request.is_disconnected():
+        await asyncio.sleep(settings.RUN_DISCONNECT_POLL_SECONDS)
+    run_registry.cancel(run_id, "client disconnected")
 
 
 async def message_generator(
-    user_input: UserInput, agent_id: str = DEFAULT_AGENT
+    user_input: UserInput,
+    agent_id: str = DEFAULT_AGENT,
+    request: Request | None = None,
+    profile: frozenset[str] = frozenset(),
 ) -> AsyncGenerator[str, None]:
     """
     Generate a stream of messages from the agent.
 
-    This is the workhorse method for the /stream endpoint.
+    This is the workhorse method for the /stream endpoint. The run is listed by
+    `GET /runs` while it streams, and it is cancelled when the client of `request`
+    disconnects or on `POST /runs/{run_id}/cancel`. The run is profiled when
+    `profile` names profile kinds, see `GET /profiles/{run_id}`.
     """
     agent: Pregel = get_agent(agent_id)
-    kwargs, run_id = await _handle_input(user_input, agent)
+    try:
+        kwargs, run_id = await _handle_input(user_input, agent, agent_id)
+    except HTTPException as e:
+        # The response has already started, report invalid input in the stream
+        yield f"data: {json.dumps({'type': 'error', 'content': e.detail})}\n\n"
+        yield "data: [DONE]\n\n"
+        return
+    trace = current_span()
+    cache_key: str | None = None
+    recorded: list[dict[str, Any]] = []
+    workflow_name: str | None = None
+    coalescer = _token_coalescer(user_input)
+    configurable = kwargs["config"]["configurable"]
+    run = run_registry.register(
+        ActiveRun(
+            run_id=str(run_id),
+            agent_id=agent_id,
+            thread_id=configurable["thread_id"],
+            user_id=configurable["user_id"],
+        )
+    )
+    watcher = asyncio.create_task(_watch_disconnect(request, run.run_id)) if request else None
+    outcome = "ok"
+    profiler = _start_profile(profile)
 
     try:
+        cache_key = await _response_cache_key(user_input, agent_id, agent, kwargs)
+        # `bypass_cache` skips the lookup, the fresh response still refreshes the cache
+        if cache_key and not user_input.agent_config.get("bypass_cache"):
+            with span("response_cache.get"):
+                cached = await asyncio.to_thread(response_cache.get, cache_key)
+            if cached is not None:
+                outcome = "cached"
+                async for event in _replay_cached_response(cached, user_input, agent_id, agent, kwargs, run_id, coalescer):
+                    yield event
+                return
+
         # Process streamed events from the graph and yield messages over the SSE stream.
-        async for stream_event in agent.astream(
-            **kwargs, stream_mode=["updates", "messages", "custom"]
-        ):
+        # The graph runs in the pump's task, cancelling the run cancels it and its provider calls.
+        pump = EventPump(
+            agent.astream(**kwargs, stream_mode=["updates", "messages", "custom"]),
+            max_pending=settings.SSE_MAX_PENDING_EVENTS,
+            coalescer=coalescer,
+        )
+        run.bind(pump.cancel)
+        async for stream_event in pump.events():
+            if stream_event is CANCELLED:
+                break
+            # Ticks flush buffered tokens when the model pauses between chunks
+            if stream_event is TICK:
+                if frame := coalescer.flush():
+                    yield frame
+                continue
             if not isinstance(stream_event, tuple):
                 continue
             stream_mode, event = stream_event
@@ -263,6 +551,17 @@ async def message_generator(
                 # LangGraph re-sends the input message, which feels weird, so drop it
                 if chat_message.type == "human" and chat_message.content == user_input.message:
                     continue
+                if chat_message.type == "workflow_config":
+                    try:
+                        workflow_name = _workflow_name(json.loads(chat_message.content)) or workflow_name
+                    except json.JSONDecodeError:
+                        pass
+                # Deltas are superseded by the final workflow_config, they are not replayed
+                if cache_key and chat_message.type != "workflow_config_delta":
+                    recorded.append(chat_message.model_dump(exclude={"run_id"}))
+                # Tokens buffered so far go out before the message that follows them
+                if coalescer and (frame := coalescer.flush()):
+                    yield frame
                 yield f"data: {json.dumps({'type': 'message', 'content': chat_message.model_dump()})}\n\n"
 
             if stream_mode == "messages":
@@ -280,14 +579,310 @@ async def message_generator(
                     # Empty content in the context of OpenAI usually means
                     # that the model is asking for a tool to be invoked.
                     # So we only print non-empty content.
-                    yield f"data: {json.dumps({'type': 'token', 'content': convert_message_content_to_string(content)})}\n\n"
+                    content = convert_message_content_to_string(content)
+                    run.tokens += 1
+                    if run.first_token_at is None:
+                        run.first_token_at = run.elapsed
+                        FIRST_TOKEN_SECONDS.observe(run.first_token_at, agent=agent_id)
+                    frame = coalescer.add(content) if coalescer else token_frame(content)
+                    if frame:
+                        yield frame
+
+        if coalescer and (frame := coalescer.flush()):
+            yield frame
+        if run.cancel_reason is not None:
+            outcome = "cancelled"
+            yield f"data: {json.dumps({'type': 'error', 'content': f'Run cancelled: {run.cancel_reason}'})}\n\n"
+        elif cache_key and any(e["type"] == "ai" for e in recorded):
+            await asyncio.to_thread(response_cache.put, cache_key, agent_id, recorded)
+    except AdmissionRejected as e:
+        logger.warning(f"Admission rejected for {e}")
+        outcome = "error"
+        if coalescer and (frame := coalescer.flush()):
+            yield frame
+        yield f"data: {json.dumps({'type': 'error', 'content': f'LLM provider is busy ({e.reason}), retry later.'})}\n\n"
     except Exception as e:
         logger.error(f"Error in message generator: {e}")
+        outcome = "error"
+        if coalescer and (frame := coalescer.flush()):
+            yield frame
         yield f"data: {json.dumps({'type': 'error', 'content': 'Internal server error'})}\n\n"
     finally:
+        if watcher:
+            watcher.cancel()
+        _release_call_slots(kwargs["config"])
+        run_registry.unregister(run.run_id)
+        _record_run_metrics(run, "stream", outcome)
+        _end_trace(trace, run, outcome)
+        _save_profile(profiler, run)
+        _after_run(agent, kwargs, workflow_name)
         yield "data: [DONE]\n\n"
 
 
+def _record_run_metrics(run: ActiveRun, mode: str, outcome: str) -> None:
+    elapsed = run.elapsed
+    REQUESTS.inc(agent=run.agent_id, mode=mode, status=outcome)
+    REQUEST_SECONDS.observe(elapsed, agent=run.agent_id, mode=mode)
+    if run.first_token_at is not None and run.tokens > 1 and elapsed > run.first_token_at:
+        TOKENS_PER_SECOND.observe((run.tokens - 1) / (elapsed - run.first_token_at), agent=run.agent_id)
+
+
+def _end_trace(trace: Span | None, run: ActiveRun, outcome: str) -> None:
+    if trace is not None:
+        trace.set(outcome=outcome, tokens=run.tokens, first_token_s=run.first_token_at)
+        tracer.end(trace)
+
+
+def _requested_profile(request: Request | None) -> frozenset[str]:
+    """Profile kinds asked for with the `X-Profile` header, which needs AUTH_SECRET to be set."""
+    header = request.headers.get("X-Profile") if request else None
+    if not header:
+        return frozenset()
+    # Without a secret anyone could slow the service down with profiling
+    if not settings.AUTH_SECRET:
+        raise HTTPException(status_code=403, detail="Profiling requires AUTH_SECRET to be set.")
+    try:
+        return parse_profile_header(header)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+def _start_profile(kinds: frozenset[str]) -> RequestProfiler | None:
+    if not kinds:
+        return None
+    return RequestProfiler(kinds, cpu_interval=settings.PROFILE_CPU_INTERVAL_MS / 1000).start()
+
+
+def _save_profile(profiler: RequestProfiler | None, run: ActiveRun) -> None:
+    """Stop the profiler of a run and store its profile in the background."""
+    if profiler is None:
+        return
+    profile = {"agent_id": run.agent_id, "thread_id": run.thread_id, **profiler.stop()}
+    task = asyncio.create_task(asyncio.to_thread(profile_store.put, run.run_id, profile))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def _admission_key(agent_id: str | None) -> str:
+    """provider/model the agent calls unless a call says otherwise."""
+    return model_key(get_agent_model(agent_id) if agent_id else settings.DEFAULT_MODEL)
+
+
+def _admission_error(e: AdmissionRejected) -> HTTPException:
+    logger.warning(f"Admission rejected for {e}")
+    return HTTPException(
+        status_code=e.status_code,
+        detail=f"LLM provider is busy ({e.reason}), retry later.",
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+def _check_admission(agent_id: str) -> None:
+    """Fail fast with 429 and Retry-After when the queue of the agent's provider/model is full.
+
+    No slot is taken here: each LLM call of the run waits for its own through
+    `AdmissionCallback`, so a run holds none between its calls.
+    """
+    try:
+        admission.check(_admission_key(agent_id))
+    except AdmissionRejected as e:
+        raise _admission_error(e)
+
+
+def _release_call_slots(config: RunnableConfig) -> None:
+    """Release the slots of LLM calls a cancelled or failed run left open."""
+    for callback in config.get("callbacks") or []:
+        if isinstance(callback, AdmissionCallback):
+            callback.release_all()
+
+
+async def _sse_stream(stream: AsyncGenerator[str, None], agent_id: str) -> AsyncGenerator[str, None]:
+    sse_span = None
+    frames = sent = 0
+    write_seconds = 0.0
+    try:
+        async for chunk in stream:
+            size = len(chunk.encode("utf-8"))
+            SSE_BYTES.inc(size, agent=agent_id)
+            # The trace was started by _handle_input, before the first event
+            if sse_span is None:
+                sse_span = tracer.start_span("sse_write", current_span())
+            frames += 1
+            sent += size
+            start = time.perf_counter()
+            yield chunk
+            # Time until the server asks for the next frame, i.e. spent writing this one
+            write_seconds += time.perf_counter() - start
+    finally:
+        if sse_span is not None:
+            sse_span.set(frames=frames, bytes=sent, write_ms=round(write_seconds * 1000, 1))
+            tracer.end(sse_span)
+
+
+async def _admitted_stream(user_input: UserInput, agent_id: str, request: Request) -> StreamingResponse:
+    """SSE response of a run, rejected up front when its provider/model is saturated."""
+    profile = _requested_profile(request)
+    # Unknown refs are a 404 before the stream starts, the document is cached for _handle_input
+    if getattr(user_input, "workflow_ref", None):
+        await _resolve_workflow_ref(user_input.workflow_ref)
+    _check_admission(agent_id)
+    return StreamingResponse(
+        _sse_stream(message_generator(user_input, agent_id=agent_id, request=request, profile=profile), agent_id),
+        media_type="text/event-stream",
+    )
+
+
+def _project_final_state(events: list[tuple[str, Any]], run_id: UUID) -> ChatMessage:
+    """Last AI message of a run, with the final custom data of its agent in `custom_data`."""
+    output: ChatMessage | None = None
+    values: dict[str, Any] = {}
+    custom_data: dict[str, Any] = {}
+    for stream_mode, event in events:
+        if stream_mode == "values":
+            values = event
+        elif stream_mode == "updates" and "__interrupt__" in event:
+            output = langchain_to_chat_message(AIMessage(content=event["__interrupt__"][0].value))
+        elif stream_mode == "custom" and getattr(event, "role", None) in INVOKE_CUSTOM_TYPES:
+            data = json.loads(event.content[0])
+            if isinstance(data, dict) and data.get("kind") == "step":
+                continue
+            custom_data[event.role] = data
+    if output is None:
+        messages = values.get("messages", [])
+        if not messages or not isinstance(messages[-1], AIMessage):
+            raise ValueError("Run did not end with an AI message")
+        output = langchain_to_chat_message(messages[-1])
+    if values.get("generated_config"):
+        # The final workflow_config event carries the same config
+        custom_data.pop("workflow_config", None)
+        custom_data["generated_config"] = values["generated_config"]
+    output.custom_data = custom_data
+    output.run_id = str(run_id)
+    return output
+
+
+async def _invoke(user_input: UserInput, agent_id: str, request: Request | None = None) -> ChatMessage:
+    """
+    Run an agent to completion and return its final message.
+
+    This is the workhorse method for the /invoke endpoints. The graph runs without
+    the `messages` stream mode, so no per-token events are produced.
+    """
+    agent: Pregel = get_agent(agent_id)
+    profile = _requested_profile(request)
+    _check_admission(agent_id)
+    kwargs, run_id = await _handle_input(user_input, agent, agent_id)
+    trace = current_span()
+    configurable = kwargs["config"]["configurable"]
+    run = run_registry.register(
+        ActiveRun(
+            run_id=str(run_id),
+            agent_id=agent_id,
+            thread_id=configurable["thread_id"],
+            user_id=configurable["user_id"],
+        )
+    )
+    task = asyncio.create_task(agent.ainvoke(**kwargs, stream_mode=["updates", "values", "custom"]))
+    run.bind(task.cancel)
+    watcher = asyncio.create_task(_watch_disconnect(request, run.run_id)) if request else None
+    outcome = "ok"
+    profiler = _start_profile(profile)
+    try:
+        output = _project_final_state(await task, run_id)
+        _after_run(agent, kwargs, _workflow_name(output.custom_data.get("generated_config")))
+        return output
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        if run.cancel_reason is None:
+            raise
+        raise HTTPException(status_code=409, detail=f"Run cancelled: {run.cancel_reason}")
+    except AdmissionRejected as e:
+        outcome = "error"
+        raise _admission_error(e)
+    except Exception as e:
+        outcome = "error"
+        logger.error(f"Error invoking {agent_id}: {e}")
+        raise HTTPException(status_code=500, detail="Unexpected error")
+    finally:
+        _record_run_metrics(run, "invoke", outcome)
+        _end_trace(trace, run, outcome)
+        _save_profile(profiler, run)
+        task.cancel()
+        _release_call_slots(kwargs["config"])
+        if watcher:
+            watcher.cancel()
+        run_registry.unregister(run.run_id)
+
+
+async def _batch_invoke(user_input: UserInput, agent_id: str) -> ChatMessage:
+    # Raised as is, a rejection before the run starts is the one error safe to retry on any thread
+    admission.check(_admission_key(agent_id))
+    return await _invoke(user_input, agent_id)
+
+
+def _batch_retry_delay(user_input: UserInput, error: Exception, attempt: int) -> float | None:
+    """Seconds before a failed batch item runs again, None if it must not run again.
+
+    A failed run may already have written its turn to the item's thread, so items
+    with a `thread_id` are only retried when they were rejected before their run
+    started. Items without one run on a new thread every attempt.
+    """
+    if isinstance(error, AdmissionRejected):
+        return float(error.retry_after)
+    if user_input.thread_id:
+        return None
+    if isinstance(error, HTTPException):
+        if error.status_code in (429, 503):
+            return float((error.headers or {}).get("Retry-After", settings.BATCH_RETRY_BASE_SECONDS))
+        if error.status_code != 500:
+            return None
+    return settings.BATCH_RETRY_BASE_SECONDS * 2 ** (attempt - 1)
+
+
+async def _batch_lines(items: list[UserInput], agent_id: str, max_parallel: int) -> AsyncGenerator[str, None]:
+    """NDJSON lines of the items of a batch in completion order, then a summary line."""
+    failed = 0
+    async for item in run_batch(
+        items,
+        worker=lambda user_input: _batch_invoke(user_input, agent_id),
+        key=lambda user_input: user_input.model_dump_json(),
+        # Turns of one thread run in order on its checkpoint
+        lane=lambda user_input: user_input.thread_id,
+        max_parallel=max_parallel,
+        max_attempts=settings.BATCH_MAX_ATTEMPTS,
+        retry_delay=_batch_retry_delay,
+    ):
+        line: dict[str, Any] = {"index": item.index, "attempts": item.attempts}
+        if item.duplicate_of is not None:
+            line["duplicate_of"] = item.duplicate_of
+        if item.error is None:
+            line.update(status="ok", result=item.result.model_dump())
+        else:
+            failed += 1
+            if isinstance(item.error, HTTPException):
+                detail = item.error.detail
+            elif isinstance(item.error, AdmissionRejected):
+                detail = f"LLM provider is busy ({item.error.reason}), retry later."
+            else:
+                detail = "Unexpected error"
+            line.update(status="error", error=detail)
+        line = json.dumps(line, ensure_ascii=False, separators=(",", ":")) + "\n"
+        SSE_BYTES.inc(len(line.encode("utf-8")), agent=agent_id)
+        yield line
+    summary = {"done": True, "items": len(items), "failed": failed}
+    yield json.dumps(summary, separators=(",", ":")) + "\n"
+
+
+def _batch_response(items: list[UserInput], agent_id: str, max_parallel: int | None) -> StreamingResponse:
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"A batch holds at most {settings.BATCH_MAX_ITEMS} items, got {len(items)}.",
+        )
+    max_parallel = max(1, min(max_parallel or settings.BATCH_MAX_PARALLEL, settings.BATCH_MAX_PARALLEL))
+    return StreamingResponse(_batch_lines(items, agent_id, max_parallel), media_type="application/x-ndjson")
+
+
 def _create_ai_message(parts: dict) -> AIMessage:
     sig = inspect.signature(AIMessage)
     valid_keys = set(sig.parameters)
@@ -309,53 +904,206 @@ def _sse_response_example() -> dict[int | str, Any]:
     }
 
 
+@router.get("/response_cache/stats")
+async def response_cache_stats() -> dict[str, Any]:
+    """
+    Hit, miss and eviction counters of the response cache.
+    """
+    return await asyncio.to_thread(response_cache.snapshot)
+
+
+@router.get("/admission/stats")
+async def admission_stats() -> dict[str, Any]:
+    """
+    Concurrency, queue depth, wait times and rejections of the LLM admission control, per provider/model.
+    """
+    return admission.snapshot()
+
+
+@router.get("/token_budget/stats")
+async def token_budget_stats() -> dict[str, Any]:
+    """
+    Tokens and requests of the current minute per provider/model, and the delays added to stay under the limits.
+    """
+    return await asyncio.to_thread(token_budget.snapshot)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """
+    Service metrics in the Prometheus text format: run latency, time to first token,
+    tokens per second, SSE bytes, graph node, LLM call, checkpoint and thread index latency.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/profiles/{run_id}")
+async def get_profile(run_id: str) -> dict[str, Any]:
+    """
+    CPU and/or memory profile of a run sent with the `X-Profile: cpu|mem` header.
+    The CPU profile has the top functions by samples and the stacks in the folded format of flame graph tools.
+    """
+    profile = await asyncio.to_thread(profile_store.get, run_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"No profile for run {run_id}")
+    return profile
+
+
+@router.get("/runs")
+async def list_runs() -> list[RunInfo]:
+    """
+    List the runs that are still streaming, oldest first.
+    """
+    return [RunInfo(**run.to_dict()) for run in run_registry.list()]
+
+
+@router.post("/runs/{run_id}/cancel")
+async def cancel_run(run_id: str) -> RunInfo:
+    """
+    Cancel a streaming run and its LLM calls.
+
+    The stream of the run ends with an error event and `[DONE]`.
+    """
+    run = run_registry.cancel(run_id, "cancelled by request")
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Run {run_id} not found or already finished.")
+    return RunInfo(**run.to_dict())
+
+
+@router.put("/workflows")
+async def put_workflow(workflow: dict[str, Any]) -> WorkflowUploadResponse:
+    """
+    Store a workflow once and return its reference.
+
+    Pass the returned `workflow_ref` to the explain chatbot or the config generator
+    instead of sending the whole workflow JSON on every turn.
+    """
+    workflow_ref, size = await asyncio.to_thread(workflow_store.put, workflow)
+    return WorkflowUploadResponse(workflow_ref=workflow_ref, size=size)
+
+
+@router.get("/workflows/{workflow_ref}")
+async def get_workflow(workflow_ref: str) -> dict[str, Any]:
+    """
+    Get a workflow stored with `PUT /workflows`.
+    """
+    return await _resolve_workflow_ref(workflow_ref)
+
+
+@router.post("/simple_chatbot/invoke")
+async def simple_chatbot_invoke(
+    user_input: UserInputSelectFeatureAgent,
+    request: Request,
+) -> ChatMessage:
+    """
+    Invoke the select feature agent and return its final message as one JSON body.
+    """
+    return await _invoke(user_input, "simple_chatbot", request)
+
+
 @router.post("/simple_chatbot/stream", response_class=StreamingResponse, responses=_sse_response_example())
 async def simple_chatbot(
     user_input: UserInputSelectFeatureAgent,
+    request: Request,
 ) -> StreamingResponse:
     """
     Stream the response from the select feature agent.
     """
-    return StreamingResponse(
-        message_generator(user_input, agent_id="simple_chatbot"),
-        media_type="text/event-stream",
-    )
+    return await _admitted_stream(user_input, "simple_chatbot", request)
     
+@router.post("/workflow_explain_chatbot/invoke")
+async def workflow_explain_chatbot_invoke(
+    user_input: UserInputExplainWorkflowAgent,
+    request: Request,
+) -> ChatMessage:
+    """
+    Invoke the workflow explain chatbot agent and return its final message as one JSON body.
+    """
+    return await _invoke(user_input, "workflow_explain_chatbot", request)
+
+
+@router.post("/workflow_explain_chatbot/batch", response_class=StreamingResponse)
+async def workflow_explain_chatbot_batch(batch: WorkflowExplainBatchInput) -> StreamingResponse:
+    """
+    Explain many workflows at once.
+
+    Returns one JSON line per item as soon as it completes, with its `index` in
+    `items`, then a `{"done": true}` summary line. Failed items are retried on their own.
+    """
+    return _batch_response(batch.items, "workflow_explain_chatbot", batch.max_parallel)
+
+
 @router.post("/workflow_explain_chatbot/stream", response_class=StreamingResponse, responses=_sse_response_example())
 async def workflow_explain_chatbot(
     user_input: UserInputExplainWorkflowAgent,
+    request: Request,
 ) -> StreamingResponse:
     """
     Stream the response from the workflow explain chatbot agent.
     """
-    return StreamingResponse(
-        message_generator(user_input, agent_id="workflow_explain_chatbot"),
-        media_type="text/event-stream",
-    )
+    return await _admitted_stream(user_input, "workflow_explain_chatbot", request)
+    
+@router.get("/workflow_explain_chatbot/fast_path_stats")
+async def workflow_explain_chatbot_fast_path_stats() -> dict[str, Any]:
+    """
+    Hit-rate counters of the structural questions answered without calling the LLM.
+    """
+    return get_fast_path_stats()
     
+@router.post("/workflow_planner_chatbot/invoke")
+async def workflow_planner_chatbot_invoke(
+    user_input: UserInput,
+    request: Request,
+) -> ChatMessage:
+    """
+    Invoke the workflow planner chatbot agent and return its final message as one JSON body,
+    the parsed plan is in `custom_data.workflow_plan`.
+    """
+    return await _invoke(user_input, "workflow_planner_chatbot", request)
+
+
 @router.post("/workflow_planner_chatbot/stream", response_class=StreamingResponse, responses=_sse_response_example())
 async def workflow_planner_chatbot(
     user_input: UserInput,
+    request: Request,
 ) -> StreamingResponse:
     """
     Stream the response from the workflow planner chatbot agent.
     """
-    return StreamingResponse(
-        message_generator(user_input, agent_id="workflow_planner_chatbot"),
-        media_type="text/event-stream",
-    )
+    return await _admitted_stream(user_input, "workflow_planner_chatbot", request)
+
+@router.post("/workflow_config_generator/invoke")
+async def workflow_config_generator_invoke(
+    user_input: UserInputWorkflowConfigGeneratorAgent,
+    request: Request,
+) -> ChatMessage:
+    """
+    Invoke the workflow config generator agent and return its final message as one JSON body,
+    the generated config is in `custom_data.generated_config`.
+    """
+    return await _invoke(user_input, "workflow_config_generator", request)
+
+
+@router.post("/workflow_config_generator/batch", response_class=StreamingResponse)
+async def workflow_config_generator_batch(batch: WorkflowConfigGeneratorBatchInput) -> StreamingResponse:
+    """
+    Generate many workflow configurations at once.
+
+    Returns one JSON line per item as soon as it completes, with its `index` in
+    `items`, then a `{"done": true}` summary line. Failed items are retried on their own.
+    """
+    return _batch_response(batch.items, "workflow_config_generator", batch.max_parallel)
+
 
 @router.post("/workflow_config_generator/stream", response_class=StreamingResponse, responses=_sse_response_example())
 async def workflow_config_generator(
     user_input: UserInputWorkflowConfigGeneratorAgent,
+    request: Request,
 ) -> StreamingResponse:
     """
     Stream the response from the workflow config generator agent.
     """
-    return StreamingResponse(
-        message_generator(user_input, agent_id="workflow_config_generator"),
-        media_type="text/event-stream",
-    )
+    return await _admitted_stream(user_input, "workflow_config_generator", request)
 
 @router.post("/feedback")
 async def feedback(feedback: Feedback) -> FeedbackResponse:
@@ -377,41 +1125,106 @@ async def feedback(feedback: Feedback) -> FeedbackResponse:
     return FeedbackResponse()
 
 
+def _history_window(total: int, input: ChatHistoryInput) -> tuple[int, int]:
+    """Slice `[start, end)` of the thread's messages selected by the cursors of `input`."""
+    end = total if input.before is None else min(input.before, total)
+    if input.since_message_index is not None or input.after is not None:
+        start = input.since_message_index if input.since_message_index is not None else input.after + 1
+        # `before` stays the end bound of the range
+        start = min(start, end)
+        if input.limit is not None:
+            end = min(end, start + input.limit)
+        return start, end
+    start = 0 if input.limit is None else max(0, end - input.limit)
+    return start, end
+
+
 @router.post("/history")
-def history(input: ChatHistoryInput) -> ChatHistory:
+async def history(input: ChatHistoryInput, request: Request, response: Response) -> ChatHistory:
     """
     Get chat history.
     Agent_id list: ["workflow_explain_chatbot"].
+
+    Pages are selected with `limit` and the `before`/`after` message index cursors,
+    and `since_message_index` returns only the messages added since an earlier call.
+    The response has an ETag; send it back as `If-None-Match` to get a 304 while
+    the thread has not changed.
     """
     try:
         agent: Pregel = get_agent(input.agent_id)
-        state_snapshot = agent.get_state(
+        state_snapshot = await agent.aget_state(
             config=RunnableConfig(configurable={"thread_id": input.thread_id})
         )
         messages: list[AnyMessage] = state_snapshot.values["messages"]
-        chat_messages: list[ChatMessage] = [langchain_to_chat_message(m) for m in messages]
-        return ChatHistory(messages=chat_messages)
     except Exception as e:
         logger.error(f"An exception occurred: {e}")
         raise HTTPException(status_code=404, detail="Thread not found or no messages available.")
 
+    # Every new turn writes a checkpoint, so its id versions the thread
+    checkpoint_id = (state_snapshot.config or {}).get("configurable", {}).get("checkpoint_id", "")
+    query = input.model_dump_json(exclude={"thread_id"})
+    etag = f'W/"{response_cache_key(thread_id=input.thread_id, checkpoint=checkpoint_id, query=query)[:32]}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    start, end = _history_window(len(messages), input)
+    chat_messages: list[ChatMessage] = [langchain_to_chat_message(m) for m in messages[start:end]]
+    response.headers["ETag"] = etag
+    return ChatHistory(messages=chat_messages, start_index=start, total_messages=len(messages))
+
+@router.get("/users")
+async def list_users(
+    limit: Annotated[int, Query(ge=1, le=200)] = 50,
+    cursor: str | None = None,
+) -> UserPage:
+    """
+    List users, most recently active first.
+
+    Pass the `next_cursor` of a page as `cursor` to get the next one.
+    """
+    try:
+        users, next_cursor = await thread_index.list_users(limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return UserPage(users=[UserInfo(**user) for user in users], next_cursor=next_cursor)
+
+
+@router.get("/users/{user_id}/threads")
+async def list_user_threads(
+    user_id: str,
+    limit: Annotated[int, Query(ge=1, le=200)] = 50,
+    cursor: str | None = None,
+) -> ThreadPage:
+    """
+    List the threads of a user, most recently active first, with their title,
+    agent, message count and latest generated workflow.
+
+    Pass the `next_cursor` of a page as `cursor` to get the next one.
+    """
+    try:
+        threads, next_cursor = await thread_index.list_threads(user_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return ThreadPage(threads=[ThreadInfo(**thread) for thread in threads], next_cursor=next_cursor)
+
+
 @router.get("/user_id/")
-def get_user_id(
+async def get_user_id(
 ) -> list[str]:
     """
     Get all thread IDs for a given user ID.
     """
-    user_id = inmem_store.keys()
+    user_id = await thread_index.user_ids()
     if not user_id:
         raise HTTPException(status_code=404, detail="Can not found any user ID.")
     return user_id
 
 @router.get("/thread_id/{user_id}")
-def get_thread_id(user_id: str) -> list[str]:
+async def get_thread_id(user_id: str) -> list[str]:
     """
     Get all thread IDs for a given user ID.
     """
-    thread_ids = inmem_store.get(user_id)
+    thread_ids = await thread_index.thread_ids(user_id)
     if not thread_ids:
         raise HTTPException(status_code=404, detail="Thread IDs not found for the given user ID.")
     return thread_ids
@@ -0,0 +1,213 @@
+import asyncio
+import json
+import time
+from collections.abc import AsyncGenerator, AsyncIterator
+from typing import Any
+
+
+def token_frame(content: str) -> str:
+    return f"data: {json.dumps({'type': 'token', 'content': content})}\n\n"
+
+
+class TokenCoalescer:
+    """Buffer streamed tokens and emit them as one SSE frame per time window or byte threshold.
+
+    A frame is due when the oldest buffered token is `window_ms` old or the buffer
+    reaches `flush_bytes`, so the buffer of a connection never holds more than
+    `flush_bytes` (plus one token). With `window_ms=0` every token is its own frame.
+    """
+
+    def __init__(self, window_ms: int, flush_bytes: int):
+        self.window = window_ms / 1000
+        self.flush_bytes = flush_bytes
+        self._parts: list[str] = []
+        self._size = 0
+        self._first_at = 0.0
+        self.tokens = 0
+        self.frames = 0
+
+    def add(self, token: str) -> str | None:
+        """Buffer a token, return a frame if one is due."""
+        if not self._parts:
+            self._first_at = time.monotonic()
+        self._parts.append(token)
+        self._size += len(token.encode("utf-8"))
+        self.tokens += 1
+        if self._size >= self.flush_bytes or self.due():
+            return self.flush()
+        return None
+
+    def due(self) -> bool:
+        return bool(self._parts) and time.monotonic() - self._first_at >= self.window
+
+    def timeout(self) -> float | None:
+        """Seconds until the buffered tokens are due, None if the buffer is empty."""
+        if not self._parts:
+            return None
+        return max(0.0, self.window - (time.monotonic() - self._first_at))
+
+    def flush(self) -> str | None:
+        if not self._parts:
+            return None
+        frame = token_frame("".join(self._parts))
+        self._parts.clear()
+        self._size = 0
+        self.frames += 1
+        return frame
+
+
+class _Marker:
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self) -> str:
+        return self.name
+
+
+# Yielded by `EventPump.events` when the coalescer's buffer falls due before the next event
+TICK = _Marker("TICK")
+# Yielded by `EventPump.events` once the pump is cancelled
+CANCELLED = _Marker("CANCELLED")
+_END = _Marker("END")
+
+
+class EventPump:
+    """Consume an async stream from a background task through a bounded queue.
+
+    The queue holds at most `max_pending` events, so a slow consumer holds back
+    the producer instead of buffering without limit. With a coalescer, a single
+    timer per buffered frame puts a `TICK` in the queue so tokens are flushed on
+    time even when the producer pauses. `cancel` stops the producer (and whatever
+    it awaits, e.g. a provider HTTP stream) from any task.
+    """
+
+    def __init__(self, stream: AsyncIterator[Any], max_pending: int, coalescer: TokenCoalescer | None = None):
+        self._stream = stream
+        self._coalescer = coalescer
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._timer: asyncio.TimerHandle | None = None
+        self._task: asyncio.Task | None = None
+        self.cancelled = False
+
+    async def _pump(self) -> None:
+        try:
+            async for event in self._stream:
+                await self._queue.put(event)
+        except Exception as e:
+            await self._queue.put(e)
+        else:
+            await self._queue.put(_END)
+
+    def _tick(self) -> None:
+        self._timer = None
+        # A full queue means events are pending anyway, they flush the buffer on arrival
+        if not self._queue.full():
+            self._queue.put_nowait(TICK)
+
+    def _schedule_tick(self) -> None:
+        timeout = self._coalescer.timeout() if self._coalescer else None
+        if timeout is None:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(timeout, self._tick)
+
+    def cancel(self) -> None:
+        if self.cancelled:
+            return
+        self.cancelled = True
+        if self._task is not None:
+            self._task.cancel()
+        # Pending events are dropped, the consumer only needs to learn it is over
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(CANCELLED)
+
+    async def events(self) -> AsyncGenerator[Any, None]:
+        self._task = asyncio.create_task(self._pump())
+        try:
+            while True:
+                item = await self._queue.get()
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+                if item is CANCELLED:
+                    break
+                self._schedule_tick()
+        finally:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._task.cancel()
+
+
+async def benchmark_token_coalescing(
+    response_chars: int = 20000, streams: int = 20, window_ms: int = 30, flush_bytes: int = 1024
+) -> dict[str, Any]:
+    """Frames, bytes and CPU time of per-token frames vs coalesced frames on concurrent fake-model streams.
+
+    The fake model streams its response one character per chunk, the worst case
+    for per-token frames. Frames are written to a local socket and drained, like
+    the writes of a StreamingResponse.
+    """
+    import socket
+
+    from langchain_community.chat_models import FakeListChatModel
+
+    text = ("Step 1 receives the CV through a webhook and step 2 extracts the text. " * (response_chars // 70 + 1))
+    text = text[:response_chars]
+
+    async def stream(coalesce: bool) -> tuple[int, int]:
+        client, server = socket.socketpair()
+        reader, client_writer = await asyncio.open_connection(sock=client)
+        _, writer = await asyncio.open_connection(sock=server)
+
+        async def consume() -> int:
+            received = 0
+            while chunk := await reader.read(65536):
+                received += len(chunk)
+            return received
+
+        consumer = asyncio.create_task(consume())
+        frames = 0
+
+        async def write(frame: str | None) -> None:
+            nonlocal frames
+            if frame:
+                frames += 1
+                writer.write(frame.encode("utf-8"))
+                await writer.drain()
+
+        llm = FakeListChatModel(responses=[text])
+        if coalesce:
+            coalescer = TokenCoalescer(window_ms, flush_bytes)
+            async for item in EventPump(llm.astream("explain"), max_pending=256, coalescer=coalescer).events():
+                await write(coalescer.flush() if item is TICK else coalescer.add(item.content))
+            await write(coalescer.flush())
+        else:
+            async for chunk in llm.astream("explain"):
+                await write(token_frame(chunk.content))
+        writer.close()
+        received = await consumer
+        client_writer.close()
+        return frames, received
+
+    results: dict[str, Any] = {"streams": streams, "tokens_per_stream": len(text)}
+    for label, coalesce in (("per_token", False), ("coalesced", True)):
+        cpu, wall = time.process_time(), time.perf_counter()
+        outcomes = await asyncio.gather(*(stream(coalesce) for _ in range(streams)))
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        results[label] = {
+            "frames": sum(f for f, _ in outcomes),
+            "bytes": sum(s for _, s in outcomes),
+            "cpu_s": round(cpu, 3),
+            "tokens_per_s": round(streams * len(text) / wall),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    print(asyncio.run(benchmark_token_coalescing()))